@@ -0,0 +1,61 @@
+"""Compilation of many schedules with few distinct ones:
+:func:`krolib.parser.compile_schedule` vs. :class:`krolib.cache.ScheduleCache`.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_cache.py
+"""
+import datetime
+import itertools
+import time
+
+import pytz
+
+from krolib.cache import ScheduleCache, schedule_hash
+from krolib.parser import compile_schedule
+from krolib.structs import PeriodicalUnits
+
+
+NUMBER = 50000
+TIMEZONES = ['UTC', 'Europe/Kiev', 'Asia/Jakarta', 'America/New_York']
+
+
+def make_schedules(number):
+    variants = itertools.cycle(itertools.product(TIMEZONES, range(24), range(0, 60, 15)))
+    for i, (timezone, hour, minute) in zip(range(number), variants):
+        start_on = datetime.datetime(2019, 1, 1)
+        if i % 2:
+            # the same instant as an aware datetime
+            start_on = pytz.timezone(timezone).localize(start_on).astimezone(pytz.UTC)
+        yield {
+            'start': {
+                'on': start_on,
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.DAILY,
+                'every': 1,
+                'hour': hour,
+                'minute': minute,
+            },
+            'timezone': timezone,
+        }
+
+
+def main():
+    schedules = list(make_schedules(NUMBER))
+    print('%d schedules, %d distinct' % (NUMBER, len({schedule_hash(s) for s in schedules})))
+
+    started = time.perf_counter()
+    for schedule in schedules:
+        compile_schedule(schedule)
+    print('compile_schedule: %.3fs' % (time.perf_counter() - started))
+
+    cache = ScheduleCache()
+    started = time.perf_counter()
+    for schedule in schedules:
+        cache.compile(schedule)
+    print('ScheduleCache.compile: %.3fs, %r' % (time.perf_counter() - started, cache.info()))
+
+
+if __name__ == '__main__':
+    main()
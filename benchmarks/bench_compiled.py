@@ -0,0 +1,81 @@
+"""Repeated evaluation of the same schedule: :func:`krolib.parser.schedule_delta`
+vs. :meth:`krolib.parser.CompiledSchedule.delta`.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_compiled.py
+"""
+import datetime
+import timeit
+
+import pytz
+
+from krolib.parser import compile_schedule, schedule_delta
+from krolib.structs import PeriodicalUnits, RelativeUnits, RelativeIndexUnits
+
+
+NOW = datetime.datetime(2019, 6, 1, 12, 30, tzinfo=pytz.UTC)
+SCHEDULES = {
+    'hourly': {
+        'start': {
+            'on': datetime.datetime(2018, 1, 1),
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.HOURLY,
+            'every': 1,
+            'minute': 15,
+        },
+        'timezone': 'Europe/Kiev',
+    },
+    'weekly': {
+        'start': {
+            'on': datetime.datetime(2018, 1, 1),
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.WEEKLY,
+            'every': 1,
+            'weekday': [0, 2, 4],
+            'hour': 9,
+        },
+        'stop': {
+            'never': False,
+            'after_num_repeats': 1000,
+        },
+    },
+    'monthly': {
+        'start': {
+            'on': datetime.datetime(2018, 1, 1),
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.MONTHLY,
+            'every': 1,
+            'day': 15,
+        },
+    },
+    'relative': {
+        'periodical': {
+            'repeats': PeriodicalUnits.MONTHLY,
+            'relative_day': RelativeUnits.FRIDAY,
+            'relative_day_index': RelativeIndexUnits.LAST,
+        },
+    },
+}
+
+
+def bench(func):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+def main():
+    print('%-10s%16s%16s' % ('schedule', 'schedule_delta', 'compiled'))
+    for name, schedule in SCHEDULES.items():
+        compiled = compile_schedule(schedule)
+        plain = bench(lambda: schedule_delta(schedule, now_dt=NOW))
+        fast = bench(lambda: compiled.delta(NOW))
+        print('%-10s%14.1fus%14.1fus' % (name, plain, fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Latency of :meth:`krolib.parser.CompiledSchedule.count_between`
+over a year compared with counting the generated occurrences.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_count.py
+"""
+import datetime
+import timeit
+
+import pytz
+
+from krolib.parser import compile_schedule
+from krolib.structs import PeriodicalUnits, WeekdayUnits
+
+
+START = datetime.datetime(2019, 1, 1, tzinfo=pytz.UTC)
+END = datetime.datetime(2020, 1, 1, tzinfo=pytz.UTC)
+SCHEDULES = [
+    ('secondly', {
+        'repeats': PeriodicalUnits.SECONDLY,
+        'every': 1,
+    }),
+    ('minutely', {
+        'repeats': PeriodicalUnits.MINUTELY,
+        'every': 1,
+    }),
+    ('hourly', {
+        'repeats': PeriodicalUnits.HOURLY,
+        'every': 1,
+    }),
+    ('monthly', {
+        'repeats': PeriodicalUnits.MONTHLY,
+        'every': 1,
+        'weekday': [WeekdayUnits.MONDAY, WeekdayUnits.FRIDAY],
+        'hour': 9,
+    }),
+]
+
+
+def measure(func):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+def main():
+    print('%-10s %12s %14s %14s' % ('schedule', 'count', 'count_between', 'iteration'))
+    for name, periodical in SCHEDULES:
+        compiled = compile_schedule({
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': periodical,
+        })
+        count = compiled.count_between(START, END)
+        closed = measure(lambda: compiled.count_between(START, END))
+        if count > 100000:
+            iterated = float('nan')
+        else:
+            iterated = measure(lambda: sum(1 for _ in compiled.occurrences_between(START, END)))
+        print('%-10s %12d %12.1fus %12.1fus' % (name, count, closed, iterated))
+
+
+if __name__ == '__main__':
+    main()
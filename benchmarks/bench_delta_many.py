@@ -0,0 +1,66 @@
+"""Bulk evaluation of compiled schedules with
+:func:`krolib.parser.schedule_delta_many`, compared with the schedule
+dicts which are validated and compiled on every call. The target of
+100k schedules per second is only met by the compiled ones.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_delta_many.py
+"""
+import datetime
+import itertools
+import time
+
+import pytz
+
+from krolib.parser import compile_schedule, schedule_delta_many
+from krolib.structs import PeriodicalUnits
+
+
+NOW = datetime.datetime(2019, 6, 1, 12, 30, tzinfo=pytz.UTC)
+NUMBER = 100000
+TIMEZONES = ['UTC', 'Europe/Kiev', 'Asia/Jakarta', 'America/New_York']
+REPEATS = [
+    PeriodicalUnits.SECONDLY,
+    PeriodicalUnits.MINUTELY,
+    PeriodicalUnits.HOURLY,
+    PeriodicalUnits.DAILY,
+    PeriodicalUnits.WEEKLY,
+]
+
+
+def make_schedules(number):
+    variants = itertools.cycle(itertools.product(TIMEZONES, REPEATS, range(1, 6)))
+    for i, (timezone, repeats, every) in zip(range(number), variants):
+        yield {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1) + datetime.timedelta(seconds=i),
+            },
+            'periodical': {
+                'repeats': repeats,
+                'every': every,
+            },
+            'timezone': timezone,
+        }
+
+
+def main():
+    started = time.perf_counter()
+    compiled = [compile_schedule(s) for s in make_schedules(NUMBER)]
+    print('compile %d schedules: %.2fs' % (NUMBER, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    schedule_delta_many(compiled, now_dt=NOW)
+    print('schedule_delta_many, compiled: %.3fs' % (time.perf_counter() - started))
+
+    schedules = list(make_schedules(NUMBER))
+    for trusted in [False, True]:
+        started = time.perf_counter()
+        schedule_delta_many(schedules, now_dt=NOW, trusted=trusted)
+        print('schedule_delta_many, dicts, trusted=%s: %.3fs' % (
+            trusted, time.perf_counter() - started,
+        ))
+
+
+if __name__ == '__main__':
+    main()
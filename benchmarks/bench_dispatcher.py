@@ -0,0 +1,59 @@
+"""Scheduling many jobs with :class:`krolib.asyncio.Dispatcher`:
+100k minutely jobs spread over the minute, a single timer handle.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_dispatcher.py
+"""
+import asyncio
+import datetime
+import time
+
+from krolib.asyncio import Dispatcher
+from krolib.parser import compile_schedule
+from krolib.structs import PeriodicalUnits
+from krolib.utils import just_now
+
+
+NUMBER = 100000
+DURATION = 5
+
+
+async def main():
+    dispatcher = Dispatcher()
+    fired = 0
+
+    async def job():
+        nonlocal fired
+        fired += 1
+
+    now = just_now()
+    schedules = [
+        compile_schedule({
+            'start': {
+                'on': now + datetime.timedelta(seconds=second),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': 1,
+            },
+        })
+        for second in range(60)
+    ]
+
+    started = time.perf_counter()
+    for num in range(NUMBER):
+        dispatcher.add_job(job, schedules[num % 60])
+    print('add %d jobs: %.2fs' % (NUMBER, time.perf_counter() - started))
+
+    dispatcher.start()
+    print('timer handles: %d' % len(asyncio.get_event_loop()._scheduled))
+    started = time.perf_counter()
+    await asyncio.sleep(DURATION)
+    dispatcher.stop()
+    elapsed = time.perf_counter() - started
+    print('%d fires in %.2fs' % (fired, elapsed))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""Evaluation of compiled schedules in unix timestamps with
+:mod:`krolib.engine` compared with :mod:`krolib.parser`.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_engine.py
+"""
+import datetime
+import itertools
+import time
+import timeit
+
+import pytz
+
+from krolib.engine import compile_epoch_schedule, next_epochs
+from krolib.parser import compile_schedule, schedule_delta_many
+from krolib.structs import PeriodicalUnits
+
+
+NOW = datetime.datetime(2019, 6, 1, 12, 30, tzinfo=pytz.UTC)
+NUMBER = 100000
+TIMEZONES = ['UTC', 'Europe/Kiev', 'Asia/Jakarta', 'America/New_York']
+REPEATS = [
+    PeriodicalUnits.SECONDLY,
+    PeriodicalUnits.MINUTELY,
+    PeriodicalUnits.HOURLY,
+    PeriodicalUnits.DAILY,
+    PeriodicalUnits.WEEKLY,
+]
+
+
+def make_schedules(number):
+    variants = itertools.cycle(itertools.product(TIMEZONES, REPEATS, range(1, 6)))
+    for i, (timezone, repeats, every) in zip(range(number), variants):
+        yield {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1) + datetime.timedelta(seconds=i),
+            },
+            'periodical': {
+                'repeats': repeats,
+                'every': every,
+            },
+            'timezone': timezone,
+        }
+
+
+def measure(func):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+def main():
+    compiled = [compile_schedule(s) for s in make_schedules(NUMBER)]
+    epoch_compiled = [compile_epoch_schedule(c) for c in compiled]
+
+    started = time.perf_counter()
+    schedule_delta_many(compiled, now_dt=NOW)
+    print('schedule_delta_many, %d schedules: %.3fs' % (NUMBER, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    next_epochs(epoch_compiled, int(NOW.timestamp()))
+    print('next_epochs, %d schedules: %.3fs' % (NUMBER, time.perf_counter() - started))
+
+    # without start.on, the parser rebuilds the rule phases on every evaluation
+    schedule = compile_schedule({
+        'periodical': {
+            'repeats': PeriodicalUnits.WEEKLY,
+            'every': 2,
+            'hour': 10,
+        },
+        'timezone': 'Europe/Kiev',
+    })
+    epoch_schedule = compile_epoch_schedule(schedule)
+    print('unanchored delta: parser %.1fus, engine %.1fus' % (
+        measure(lambda: schedule.delta(NOW)),
+        measure(lambda: epoch_schedule.delta(NOW)),
+    ))
+
+
+if __name__ == '__main__':
+    main()
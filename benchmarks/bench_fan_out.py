@@ -0,0 +1,71 @@
+"""Firing many jobs with few distinct schedules by
+:class:`krolib.asyncio.Dispatcher`: jobs grouped by schedule vs. the same
+jobs made distinct with unique ``misfire_grace`` values.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_fan_out.py
+"""
+import asyncio
+import datetime
+import time
+
+from krolib.asyncio import Dispatcher
+from krolib.structs import PeriodicalUnits
+from krolib.utils import just_now
+
+
+NUMBER = 200000
+DISTINCT = 2000
+
+
+async def measure(grouped):
+    dispatcher = Dispatcher()
+    dispatcher.loop = asyncio.get_event_loop()
+
+    async def job():
+        pass
+
+    # due at once for all the jobs restored with last_run
+    start_on = just_now() - datetime.timedelta(seconds=1)
+    last_run = start_on - datetime.timedelta(seconds=1)
+    schedules = [
+        {
+            'start': {
+                'on': start_on,
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': num + 1,
+            },
+        }
+        for num in range(DISTINCT)
+    ]
+
+    started = time.perf_counter()
+    for num in range(NUMBER):
+        grace = None if grouped else 3600.0 + num
+        dispatcher.add_job(
+            job, schedules[num % DISTINCT], misfire_grace=grace, last_run=last_run,
+        )
+    added = time.perf_counter() - started
+
+    started = time.perf_counter()
+    dispatcher._fire()
+    fired = time.perf_counter() - started
+
+    print('%s: %d heap entries, add %.2fs, fire %.2fs, %d runs' % (
+        'grouped' if grouped else 'distinct', len(dispatcher._heap), added, fired,
+        dispatcher.counters.started,
+    ))
+    await asyncio.sleep(0)
+
+
+async def main():
+    print('%d jobs, %d distinct schedules' % (NUMBER, DISTINCT))
+    await measure(grouped=False)
+    await measure(grouped=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""Resolution of getters with a simulated round trip for many schedules:
+one await per schedule and getter, compared with :class:`BatchGetter`
+calls, and with their results kept by :class:`GetterCache`. Also the
+application of the results of a few getters compared with chained
+``assoc_in`` calls.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_getters.py
+"""
+import asyncio
+import datetime
+import time
+import timeit
+
+from toolz.dicttoolz import assoc_in, get_in
+
+from krolib.asyncio import avalidated_schedules
+from krolib.getters import BatchGetter, GetterCache, resolve_getters
+from krolib.parser import validated_schedule
+from krolib.structs import TimeUnits, PeriodicalUnits
+
+
+NUMBER = 1000
+ROUND_TRIP = 0.001
+PATHS = [
+    ['start', 'relative_timeshift', 'delay'],
+    ['periodical', 'every'],
+    ['periodical', 'hour'],
+    ['periodical', 'minute'],
+]
+
+
+def make_schedules(number):
+    return [
+        {
+            'start': {
+                'on': datetime.datetime(2019, 1, 1),
+                'relative_timeshift': {
+                    'delay': i % 10 + 1,
+                    'time_units': TimeUnits.MINUTES,
+                },
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.DAILY,
+                'every': i % 3 + 1,
+                'hour': i % 24,
+                'minute': i % 60,
+            },
+        }
+        for i in range(number)
+    ]
+
+
+async def remote_getter(value, **params):
+    await asyncio.sleep(ROUND_TRIP)
+    return value
+
+
+@BatchGetter
+async def remote_batch_getter(values, **params):
+    await asyncio.sleep(ROUND_TRIP)
+    return values
+
+
+def make_getters(getter):
+    return [{'getter': getter, 'params': {'path': path}} for path in PATHS]
+
+
+async def sequential(schedules, getters):
+    validated = []
+    for schedule in schedules:
+        for getter in getters:
+            path = getter['params']['path']
+            value = await getter['getter'](get_in(path, schedule), **getter['params'])
+            schedule = assoc_in(schedule, path, value)
+        validated.append(validated_schedule(schedule))
+    return validated
+
+
+def measure(loop, coroutine_func):
+    started = time.perf_counter()
+    result = loop.run_until_complete(coroutine_func())
+    return time.perf_counter() - started, result
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    schedules = make_schedules(NUMBER)
+
+    elapsed, expected = measure(loop, lambda: sequential(schedules, make_getters(remote_getter)))
+    print('%d schedules, %d getters, await per call: %.3fs' % (NUMBER, len(PATHS), elapsed))
+
+    elapsed, result = measure(
+        loop, lambda: avalidated_schedules(schedules, make_getters(remote_getter)),
+    )
+    assert result == expected
+    print('concurrent calls: %.3fs' % elapsed)
+
+    elapsed, result = measure(
+        loop, lambda: avalidated_schedules(schedules, make_getters(remote_batch_getter)),
+    )
+    assert result == expected
+    print('batched calls: %.3fs' % elapsed)
+
+    cache = GetterCache(60)
+    getters = make_getters(remote_getter)
+    loop.run_until_complete(avalidated_schedules(schedules, getters, getter_cache=cache))
+    elapsed, result = measure(
+        loop, lambda: avalidated_schedules(schedules, getters, getter_cache=cache),
+    )
+    assert result == expected
+    print('cached results: %.3fs' % elapsed)
+    loop.close()
+
+    def chained(schedule, getters):
+        # getters applied one by one, as validated_schedule did before
+        for getter in getters:
+            params = getter['params']
+            value = get_in(params['path'], schedule)
+            if value is not None:
+                schedule = assoc_in(
+                    schedule, params['path'], getter['getter'](value, **params),
+                )
+        return schedule
+
+    getters = make_getters(lambda value, **params: value)
+    timer = timeit.Timer(lambda: [chained(x, getters) for x in schedules])
+    print('application, chained assoc_in: %.1fus' % (min(timer.repeat(10, 1)) / NUMBER * 1e6))
+    timer = timeit.Timer(lambda: resolve_getters(schedules, getters))
+    print('application, single copy: %.1fus' % (min(timer.repeat(10, 1)) / NUMBER * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Expansion of a schedule catalog over 30 days with
+:func:`krolib.parallel.expand_many` compared with the datetimes of
+:func:`krolib.parser.occurrences_between`, and the size of the results
+sent back by the workers.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_parallel.py
+"""
+import datetime
+import itertools
+import os
+import pickle
+import time
+
+import pytz
+
+from krolib.parallel import expand_many
+from krolib.parser import occurrences_between
+from krolib.structs import PeriodicalUnits
+
+
+NUMBER = 5000
+START = datetime.datetime(2019, 6, 1, tzinfo=pytz.UTC)
+END = START + datetime.timedelta(days=30)
+TIMEZONES = ['UTC', 'Europe/Kiev', 'Asia/Jakarta', 'America/New_York']
+REPEATS = [
+    PeriodicalUnits.HOURLY,
+    PeriodicalUnits.DAILY,
+    PeriodicalUnits.WEEKLY,
+    PeriodicalUnits.MONTHLY,
+]
+
+
+def make_schedules(number):
+    variants = itertools.cycle(itertools.product(TIMEZONES, REPEATS, range(1, 4)))
+    for i, (timezone, repeats, every) in zip(range(number), variants):
+        yield {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1) + datetime.timedelta(seconds=i * 7),
+            },
+            'periodical': {
+                'repeats': repeats,
+                'every': every,
+            },
+            'timezone': timezone,
+        }
+
+
+def main():
+    schedules = list(make_schedules(NUMBER))
+
+    started = time.perf_counter()
+    datetimes = [list(occurrences_between(s, START, END)) for s in schedules]
+    print('occurrences_between, %d schedules: %.3fs' % (NUMBER, time.perf_counter() - started))
+
+    for workers in sorted({1, 4, os.cpu_count() or 1}):
+        started = time.perf_counter()
+        epochs = list(expand_many(schedules, START, END, workers=workers))
+        print('expand_many, %d workers: %.3fs' % (workers, time.perf_counter() - started))
+
+    assert [[int(dt.timestamp()) for dt in x] for x in datetimes] == [list(x) for x in epochs]
+    print('results pickled: datetimes %d bytes, epochs %d bytes' % (
+        len(pickle.dumps(datetimes, pickle.HIGHEST_PROTOCOL)),
+        len(pickle.dumps(epochs, pickle.HIGHEST_PROTOCOL)),
+    ))
+
+
+if __name__ == '__main__':
+    main()
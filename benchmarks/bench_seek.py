@@ -0,0 +1,59 @@
+"""First occurrence latency of :func:`krolib.parser.schedule_parser`
+depending on the schedule age.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_seek.py
+"""
+import datetime
+import timeit
+
+import pytz
+
+from krolib.parser import schedule_parser
+from krolib.structs import PeriodicalUnits
+
+
+NOW = datetime.datetime(2019, 6, 1, tzinfo=pytz.UTC)
+AGES = [
+    datetime.timedelta(minutes=1),
+    datetime.timedelta(days=1),
+    datetime.timedelta(days=30),
+    datetime.timedelta(days=365),
+    datetime.timedelta(days=365 * 10),
+]
+REPEATS = [
+    PeriodicalUnits.SECONDLY,
+    PeriodicalUnits.MINUTELY,
+    PeriodicalUnits.HOURLY,
+    PeriodicalUnits.DAILY,
+    PeriodicalUnits.MONTHLY,
+]
+
+
+def first_occurrence(repeats, age):
+    schedule = {
+        'start': {
+            'on': NOW - age,
+        },
+        'periodical': {
+            'repeats': repeats,
+            'every': 1,
+        },
+    }
+    return next(schedule_parser(schedule, now_dt=NOW))
+
+
+def main():
+    print('%-10s' % 'age', ''.join('%12s' % x for x in REPEATS))
+    for age in AGES:
+        row = []
+        for repeats in REPEATS:
+            timer = timeit.Timer(lambda: first_occurrence(repeats, age))
+            number, _ = timer.autorange()
+            row.append(min(timer.repeat(3, number)) / number * 1e6)
+        print('%-10s' % age.days, ''.join('%10.1fus' % x for x in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Loading of stored schedules from the binary format of
+:mod:`krolib.serialization` compared with JSON documents, which need
+their datetimes parsed and the schedule validated again.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_serialization.py
+"""
+import datetime
+import itertools
+import json
+import timeit
+
+from krolib.parser import validated_schedule
+from krolib.serialization import dumps, loads
+from krolib.structs import PeriodicalUnits
+from krolib.utils import normalize_isoformat
+
+
+NUMBER = 1000
+TIMEZONES = ['UTC', 'Europe/Kiev', 'Asia/Jakarta', 'America/New_York']
+REPEATS = [
+    PeriodicalUnits.HOURLY,
+    PeriodicalUnits.DAILY,
+    PeriodicalUnits.WEEKLY,
+    PeriodicalUnits.MONTHLY,
+]
+
+
+def make_schedules(number):
+    variants = itertools.cycle(itertools.product(TIMEZONES, REPEATS, range(1, 4)))
+    for i, (timezone, repeats, every) in zip(range(number), variants):
+        start_on = datetime.datetime(2018, 1, 1) + datetime.timedelta(seconds=i * 7)
+        yield {
+            'start': {
+                'on': start_on,
+            },
+            'stop': {
+                'never': False,
+                'on': start_on + datetime.timedelta(days=365),
+            },
+            'periodical': {
+                'repeats': repeats,
+                'every': every,
+                'hour': i % 24,
+                'minute': i % 60,
+            },
+            'timezone': timezone,
+        }
+
+
+def json_loads(text):
+    schedule = json.loads(text)
+    timezone = schedule.get('timezone') or 'UTC'
+    for section in ('start', 'stop'):
+        if schedule.get(section, {}).get('on'):
+            schedule[section]['on'] = normalize_isoformat(schedule[section]['on'], timezone)
+    return validated_schedule(schedule)
+
+
+def measure(func, items):
+    timer = timeit.Timer(lambda: [func(x) for x in items])
+    return min(timer.repeat(3, 1)) / len(items) * 1e6
+
+
+def main():
+    schedules = list(make_schedules(NUMBER))
+    texts = [json.dumps(s, default=datetime.datetime.isoformat) for s in schedules]
+    binaries = [dumps(s) for s in schedules]
+    assert [loads(x) for x in binaries] == [validated_schedule(s) for s in schedules]
+
+    print('size: json %.1f bytes, binary %.1f bytes' % (
+        sum(map(len, texts)) / NUMBER,
+        sum(map(len, binaries)) / NUMBER,
+    ))
+    print('load: json + validation %.1fus, binary %.1fus' % (
+        measure(json_loads, texts),
+        measure(loads, binaries),
+    ))
+
+
+if __name__ == '__main__':
+    main()
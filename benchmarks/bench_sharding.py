@@ -0,0 +1,86 @@
+"""Firing of the same jobs by :class:`krolib.sharding.ShardedDispatcher`
+worker processes sharing a SQLite lease store, compared by the number
+of workers. Every job is run every second, the fire lateness shows if
+the workers keep up.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_sharding.py
+"""
+import asyncio
+import datetime
+import multiprocessing
+import os.path
+import tempfile
+import time
+
+from krolib.sharding import ShardedDispatcher, SQLiteLeaseStore
+from krolib.structs import PeriodicalUnits
+
+
+JOBS = 20000
+SECONDS = 5
+# time to register the jobs and balance the shards
+WARMUP = 8
+TTL = 3.0
+WORKERS = [1, 2, 4]
+
+
+def worker(path, start_on, results):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runs = []
+
+    async def tick():
+        runs.append(None)
+
+    dispatcher = ShardedDispatcher(SQLiteLeaseStore(path), ttl=TTL, loop=loop)
+    schedule = {
+        'start': {
+            'on': datetime.datetime.fromtimestamp(start_on, datetime.timezone.utc),
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+        'stop': {
+            'never': False,
+            'after_num_repeats': SECONDS,
+        },
+    }
+    for num in range(JOBS):
+        dispatcher.add_job(tick, schedule, job_id=num)
+
+    dispatcher.start()
+    loop.run_until_complete(asyncio.sleep(start_on + SECONDS - time.time()))
+    results.put((len(runs), len(dispatcher.owned), dispatcher.lateness.mean))
+    dispatcher.stop()
+    loop.close()
+
+
+def main():
+    for workers in WORKERS:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'leases.sqlite')
+            start_on = int(time.time()) + WARMUP
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=worker, args=(path, start_on, results))
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            stats = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+        print('%d workers: %d runs, shards %s, mean lateness %.3fs' % (
+            workers,
+            sum(runs for runs, _, _ in stats),
+            sorted(shards for _, shards, _ in stats),
+            max(lateness for _, _, lateness in stats),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Startup of :class:`krolib.asyncio.Dispatcher` restored from
+:class:`krolib.stores.SQLiteJobStore` with the same number of jobs due
+soon and a growing number of the later ones.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_store.py
+"""
+import asyncio
+import datetime
+import time
+
+from krolib.asyncio import Dispatcher
+from krolib.parser import compile_schedule
+from krolib.serialization import dumps
+from krolib.stores import STORED_JOB_COLUMNS, SQLiteJobStore
+from krolib.structs import MisfirePolicies, PeriodicalUnits
+
+
+DUE_SOON = 1000
+TOTALS = [10000, 100000, 1000000]
+
+
+async def some_coroutine():
+    pass
+
+
+def populate(store, total, now):
+    start_on = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+    schedule = dumps(compile_schedule({
+        'start': {
+            'on': start_on,
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.DAILY,
+            'every': 1,
+        },
+    }))
+
+    # due ones within a minute, the rest during the day
+    rows = (
+        (
+            num,
+            '__main__:some_coroutine',
+            schedule,
+            now + (60 * num / DUE_SOON if num < DUE_SOON else 3600 + num % 80000),
+            now,
+            MisfirePolicies.REPLAY,
+            None,
+        )
+        for num in range(total)
+    )
+    with store.connection:
+        store.connection.executemany(
+            'INSERT INTO %s (%s) VALUES (?, ?, ?, ?, ?, ?, ?)' % (
+                store.table, STORED_JOB_COLUMNS,
+            ),
+            rows,
+        )
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    now = time.time()
+    for total in TOTALS:
+        store = SQLiteJobStore()
+        populate(store, total, now)
+
+        dispatcher = Dispatcher(loop=loop, store=store)
+        started = time.perf_counter()
+        dispatcher.start()
+        elapsed = time.perf_counter() - started
+        dispatcher.stop()
+
+        print('startup, %d stored jobs: %.3fs, %d loaded' % (
+            total, elapsed, len(dispatcher.jobs),
+        ))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Latency of :func:`krolib.utils.normalize_datetime` and
+:func:`krolib.utils.just_now` compared with the plain pytz conversion.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_timezone.py
+"""
+import datetime
+import timeit
+
+import pytz
+
+from krolib.utils import just_now, normalize_datetime
+
+
+ZONES = ['UTC', 'Europe/Kiev', 'America/New_York', 'Australia/Lord_Howe']
+DT = datetime.datetime(2019, 6, 1, 12, 30, 15, 500, tzinfo=pytz.UTC)
+
+
+def pytz_normalize(dt, tz):
+    return dt.astimezone(pytz.timezone(tz)).replace(microsecond=0)
+
+
+def pytz_now(tz):
+    return datetime.datetime.now(tz=pytz.timezone(tz)).replace(microsecond=0)
+
+
+def measure(func):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+def main():
+    print('%-20s %12s %12s %12s %12s' % ('zone', 'normalize', 'pytz', 'just_now', 'pytz'))
+    for zone in ZONES:
+        print('%-20s %10.2fus %10.2fus %10.2fus %10.2fus' % (
+            zone,
+            measure(lambda: normalize_datetime(DT, zone)),
+            measure(lambda: pytz_normalize(DT, zone)),
+            measure(lambda: just_now(zone)),
+            measure(lambda: pytz_now(zone)),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Validation of schedules with the schemas compared with the trusted
+validation of :func:`krolib.structs.fast_validated_schedule`.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_validation.py
+"""
+import datetime
+import timeit
+
+from krolib.parser import validated_schedule
+from krolib.structs import (
+    PeriodicalUnits,
+    RelativeIndexUnits,
+    RelativeUnits,
+    TimeUnits,
+)
+
+
+START_ON = datetime.datetime(2019, 1, 1, 10, 30)
+
+VARIANTS = {
+    'one-shot': {
+        'start': {
+            'on': START_ON,
+        },
+        'timezone': 'Europe/Kiev',
+    },
+    'timeshift': {
+        'start': {
+            'relative_timeshift': {
+                'delay': 3,
+                'time_units': TimeUnits.HOURS,
+            },
+        },
+        'stop': {
+            'never': True,
+        },
+    },
+    'periodical': {
+        'start': {
+            'on': START_ON,
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.WEEKLY,
+            'every': 2,
+            'weekday': [0, 2, 4],
+            'hour': 10,
+            'minute': 30,
+        },
+        'stop': {
+            'never': False,
+            'after_num_repeats': 10,
+        },
+        'timezone': 'America/New_York',
+    },
+    'relative': {
+        'start': {
+            'on': START_ON,
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.MONTHLY,
+            'relative_day': RelativeUnits.WEEKDAY,
+            'relative_day_index': RelativeIndexUnits.LAST,
+            'hour': 18,
+        },
+        'stop': {
+            'never': False,
+            'on': START_ON + datetime.timedelta(days=365),
+        },
+        'timezone': 'Asia/Jakarta',
+    },
+}
+
+
+def measure(func):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+def main():
+    for name, schedule in VARIANTS.items():
+        schemas = measure(lambda: validated_schedule(schedule))
+        trusted = measure(lambda: validated_schedule(schedule, trusted=True))
+        print('%-12s schemas %6.1fus, trusted %5.1fus, x%.0f' % (
+            name, schemas, trusted, schemas / trusted,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Expansion of a schedule over a window: Python datetimes from
+:meth:`krolib.parser.CompiledSchedule.iter_from` vs. NumPy array from
+:func:`krolib.vectorized.expand_epochs`.
+
+Run it with::
+
+    $ PYTHONPATH=. python benchmarks/bench_vectorized.py
+"""
+import datetime
+import itertools
+import time
+
+import pytz
+
+from krolib.parser import compile_schedule
+from krolib.structs import PeriodicalUnits
+from krolib.vectorized import expand_epochs
+
+
+START = datetime.datetime(2019, 6, 1, tzinfo=pytz.UTC)
+END = START + datetime.timedelta(days=30)
+SCHEDULE = {
+    'start': {
+        'on': datetime.datetime(2019, 1, 1),
+    },
+    'periodical': {
+        'repeats': PeriodicalUnits.SECONDLY,
+        'every': 1,
+    },
+}
+
+
+def main():
+    compiled = compile_schedule(SCHEDULE)
+
+    started = time.perf_counter()
+    occurrences = list(itertools.takewhile(lambda dt: dt <= END, compiled.iter_from(START)))
+    print('iter_from: %d occurrences, %.2fs' % (len(occurrences), time.perf_counter() - started))
+
+    started = time.perf_counter()
+    occurrences = expand_epochs(compiled, START, END)
+    print('expand_epochs: %d occurrences, %.3fs' % (
+        len(occurrences), time.perf_counter() - started,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,783 @@
 import asyncio
-import math
+import time
+import heapq
+import datetime
 import functools
+import itertools
+import typing as t
 
-from krolib.parser import schedule_delta, schedule_parser
-from krolib.utils import just_now
+from krolib.cache import ScheduleCache
+from krolib.getters import GetterCache, aresolve_getters
+from krolib.parser import SKIP_GRACE, CompiledSchedule, compile_schedule, validated_schedule
+from krolib.stores import JobStore, StoredJob, func_reference, resolve_func
+from krolib.structs import OverlapPolicies, MisfirePolicies
 
 
-def scheduler(schedule=None):
+# timers may fire earlier by the clock resolution, see BaseEventLoop
+CLOCK_RESOLUTION = time.get_clock_info('monotonic').resolution
+
+
+class LatenessStats:
+    """Measured fire lateness in seconds."""
+
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def __repr__(self):
+        return '<LatenessStats count=%d mean=%.6f max=%.6f>' % (
+            self.count, self.mean, self.max,
+        )
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, lateness: float):
+        self.count += 1
+        self.total += lateness
+        self.last = lateness
+        if lateness > self.max:
+            self.max = lateness
+
+
+class RunCounters:
+    """Counters of the scheduled runs. Every change is propagated
+    to the ``parent`` counters, if any.
+    """
+
+    __slots__ = ('started', 'skipped', 'queued', 'cancelled', 'parent')
+
+    def __init__(self, parent: t.Optional['RunCounters'] = None):
+        self.started = 0
+        self.skipped = 0
+        self.queued = 0
+        self.cancelled = 0
+        self.parent = parent
+
+    def __repr__(self):
+        return '<RunCounters started=%d skipped=%d queued=%d cancelled=%d>' % (
+            self.started, self.skipped, self.queued, self.cancelled,
+        )
+
+    def incr(self, counter: str):
+        setattr(self, counter, getattr(self, counter) + 1)
+        if self.parent is not None:
+            self.parent.incr(counter)
+
+
+def loop_deadline(
+    loop: asyncio.AbstractEventLoop,
+    timestamp: float,
+) -> float:
+    """Converts unix ``timestamp`` into the absolute ``loop.time()`` based
+    deadline, so the error of one wait never shifts the next ones.
+    """
+    return loop.time() + (timestamp - time.time())
+
+
+async def sleep_until(
+    deadline: float,
+    loop: t.Optional[asyncio.AbstractEventLoop] = None,
+):
+    """Sleeps until ``loop.time()`` based ``deadline``."""
+    loop = loop or asyncio.get_event_loop()
+    future = loop.create_future()
+    handle = loop.call_at(deadline, lambda: future.done() or future.set_result(None))
+    try:
+        await future
+    finally:
+        handle.cancel()
+
+
+def scheduler(
+    schedule=None,
+    max_instances: t.Optional[int] = None,
+    overlap: str = OverlapPolicies.SKIP,
+    max_queued: t.Optional[int] = None,
+    misfire: str = MisfirePolicies.REPLAY,
+    misfire_grace: t.Optional[float] = None,
+):
+    """Decorated coroutine function, when awaited, runs itself by
+    ``schedule`` until the schedule is over. Every run is started at
+    the absolute deadline of the occurrence, with sub-second precision.
+
+    Concurrent runs can be limited with ``max_instances``, ``overlap``
+    and ``max_queued``, see :meth:`Job.run`. Occurrences missed while
+    the loop was blocked are handled by ``misfire`` policy within
+    ``misfire_grace`` seconds, see :meth:`Job.fire`.
+
+    Measured fire lateness and runs counters are available as
+    ``lateness`` and ``counters`` attributes of the decorated function,
+    see :class:`LatenessStats` and :class:`RunCounters`.
+    """
     def wrapper(func):
+        lateness = LatenessStats()
+        counters = RunCounters()
+
         @functools.wraps(func)
         async def wrapped(*args, **kwargs):
             if schedule:
-                for dt in schedule_parser(schedule):
-                    now = just_now()
-                    delay_seconds = math.ceil((dt - now).total_seconds())
-                    await asyncio.sleep(delay_seconds)
-                    asyncio.create_task(func(*args, **kwargs))
+                job = Job(
+                    None,
+                    func,
+                    compile_schedule(schedule),
+                    args=args,
+                    kwargs=kwargs,
+                    max_instances=max_instances,
+                    overlap=overlap,
+                    max_queued=max_queued,
+                    misfire=misfire,
+                    misfire_grace=misfire_grace,
+                    counters=RunCounters(parent=counters),
+                )
+                loop = asyncio.get_event_loop()
+                job.advance()
+                while job.next_dt:
+                    deadline = loop_deadline(loop, job.next_dt.timestamp())
+                    await sleep_until(deadline, loop=loop)
+                    lateness.add(max(loop.time() - deadline, 0.0))
+                    job.fire(time.time())
             else:
                 asyncio.create_task(func(*args, **kwargs))
+
+        wrapped.lateness = lateness
+        wrapped.counters = counters
         return wrapped
     return wrapper
+
+
+async def aschedule(
+    schedule: t.Union[dict, CompiledSchedule],
+    getters: t.Optional[t.List[dict]] = None,
+    loop: t.Optional[asyncio.AbstractEventLoop] = None,
+) -> t.AsyncGenerator[datetime.datetime, None]:
+    """Generates occurrences of ``schedule`` (the same ones as
+    :func:`krolib.parser.schedule_parser` does), each one at its
+    absolute deadline::
+
+        async for fire_dt in aschedule(schedule):
+            await process(fire_dt)
+
+    Occurrences already due when the consumer asks for them (e.g. after
+    a long processing) are generated at once, so the consumer can batch
+    them. Cancellation of the consumer or closing of the generator
+    cancels the pending timer.
+    """
+    if not isinstance(schedule, CompiledSchedule):
+        schedule = compile_schedule(schedule, getters=getters)
+
+    loop = loop or asyncio.get_event_loop()
+    for fire_dt in schedule.iter_from():
+        await sleep_until(loop_deadline(loop, fire_dt.timestamp()), loop=loop)
+        yield fire_dt
+
+
+async def avalidated_schedules(
+    schedules: t.Iterable[dict],
+    getters: t.Optional[t.List[dict]] = None,
+    trusted: bool = False,
+    getter_cache: t.Optional[GetterCache] = None,
+) -> t.List[dict]:
+    """Same as :func:`krolib.parser.validated_schedules` with getters
+    which can be coroutine functions, the calls of the getters of
+    independent paths are awaited concurrently::
+
+        schedules = await avalidated_schedules(stored, getters)
+    """
+    schedules = list(schedules)
+    if getters:
+        schedules = await aresolve_getters(schedules, getters, getter_cache)
+    return [validated_schedule(x, trusted=trusted) for x in schedules]
+
+
+class Job:
+    """Coroutine function registered in :class:`Dispatcher` with its
+    schedule. Occurrences are pulled from the schedule lazily, one at
+    a time.
+
+    Schedules without ``start.on`` are anchored at ``last_run`` or at
+    the moment of the registration, so occurrences missed since
+    ``last_run`` (e.g. before a restart) are due immediately.
+    """
+
+    __slots__ = (
+        'id',
+        'func',
+        'args',
+        'kwargs',
+        'schedule',
+        'occurrences',
+        'next_dt',
+        'active',
+        'tasks',
+        'max_instances',
+        'overlap',
+        'max_queued',
+        'pending',
+        'semaphore',
+        'counters',
+        'misfire',
+        'misfire_grace',
+        'last_dt',
+        'group',
+    )
+
+    def __init__(
+        self,
+        job_id: t.Hashable,
+        func: t.Callable[..., t.Awaitable],
+        schedule: CompiledSchedule,
+        args: tuple = (),
+        kwargs: t.Optional[dict] = None,
+        max_instances: t.Optional[int] = None,
+        overlap: str = OverlapPolicies.SKIP,
+        max_queued: t.Optional[int] = None,
+        semaphore: t.Optional[asyncio.Semaphore] = None,
+        counters: t.Optional[RunCounters] = None,
+        misfire: str = MisfirePolicies.REPLAY,
+        misfire_grace: t.Optional[float] = None,
+        last_run: t.Optional[datetime.datetime] = None,
+    ):
+        if overlap not in OverlapPolicies:
+            raise ValueError('Invalid overlap policy, one of %s expected' % (
+                ', '.join('"%s"' % x for x in OverlapPolicies)
+            ))
+        if misfire not in MisfirePolicies:
+            raise ValueError('Invalid misfire policy, one of %s expected' % (
+                ', '.join('"%s"' % x for x in MisfirePolicies)
+            ))
+
+        self.id = job_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.last_dt = schedule.normalized_now(last_run)
+        self.schedule = schedule.anchored(self.last_dt)
+        self.occurrences = self.schedule.iter_from(self.last_dt)
+        self.next_dt = None
+        self.active = True
+        self.tasks = set()
+        self.max_instances = max_instances
+        self.overlap = overlap
+        self.max_queued = max_queued
+        self.pending = 0
+        self.semaphore = semaphore
+        self.counters = RunCounters() if counters is None else counters
+        self.misfire = misfire
+        self.misfire_grace = misfire_grace
+        self.group = None
+
+    def __repr__(self):
+        return '<Job %r next=%s>' % (self.id, self.next_dt)
+
+    def advance(self) -> t.Optional[datetime.datetime]:
+        self.next_dt = next(self.occurrences, None)
+        return self.next_dt
+
+    def fire(self, now: float) -> t.Optional[datetime.datetime]:
+        """Runs the job for the due ``next_dt`` occurrence and advances
+        it, ``now`` is the current unix timestamp. Runs of the late
+        occurrences are decided by ``misfire`` policy:
+
+        - ``skip`` — only the latest due occurrence is run, if it's
+          late by not more than ``misfire_grace`` seconds. If it's
+          ``None``, missed occurrences are dropped: only the occurrence
+          which isn't late (see :data:`krolib.parser.SKIP_GRACE`) is run;
+        - ``coalesce`` — all the due occurrences are run once;
+        - ``replay`` — every due occurrence late by not more than
+          ``misfire_grace`` seconds is run.
+
+        When several occurrences are due, the schedule is sought past
+        ``now`` instead of replaying them one by one.
+        """
+        for _ in range(self.due_runs(now)):
+            self.run()
+        return self.next_dt
+
+    def due_runs(self, now: float) -> int:
+        """Advances the job past ``now`` and returns the number of runs
+        of the due occurrences, see :meth:`fire`.
+        """
+        misfire_grace = self.misfire_grace
+        if self.misfire == MisfirePolicies.SKIP and misfire_grace is None:
+            misfire_grace = SKIP_GRACE
+
+        due_dt = self.next_dt
+        lateness = now - due_dt.timestamp()
+        if self.advance() is None or self.next_dt.timestamp() > now:
+            self.last_dt = due_dt
+            return int(
+                misfire_grace is None or
+                self.misfire == MisfirePolicies.COALESCE or
+                lateness <= misfire_grace
+            )
+
+        now_dt = self.schedule.normalized_now(
+            datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+        )
+        runs = sum(1 for _ in self.schedule.due_occurrences(
+            self.last_dt, now_dt, self.misfire, self.misfire_grace,
+        ))
+        self.last_dt = now_dt
+        self.occurrences = self.schedule.iter_from(now_dt)
+        self.advance()
+        return runs
+
+    def run(self) -> t.Optional[asyncio.Task]:
+        """Starts a new run of the job, unless ``max_instances`` runs
+        are active already. In this case ``overlap`` policy decides:
+
+        - ``skip`` — the new run is dropped;
+        - ``queue`` — the new run is started when one of the active
+          runs is over, up to ``max_queued`` runs wait for that;
+        - ``cancel`` — the active runs are cancelled.
+        """
+        if self.max_instances and len(self.tasks) >= self.max_instances:
+            if self.overlap == OverlapPolicies.QUEUE:
+                if self.max_queued is None or self.pending < self.max_queued:
+                    self.pending += 1
+                    self.counters.incr('queued')
+                    return None
+            elif self.overlap == OverlapPolicies.CANCEL:
+                for task in list(self.tasks):
+                    task.cancel()
+                    self.tasks.discard(task)
+                    self.counters.incr('cancelled')
+                return self.start()
+
+            self.counters.incr('skipped')
+            return None
+
+        return self.start()
+
+    def start(self) -> asyncio.Task:
+        task = asyncio.ensure_future(self.call())
+        self.tasks.add(task)
+        task.add_done_callback(self.done)
+        self.counters.incr('started')
+        return task
+
+    def done(self, task: asyncio.Task):
+        if task not in self.tasks:
+            return
+
+        self.tasks.discard(task)
+        if self.pending:
+            self.pending -= 1
+            self.start()
+
+    async def call(self):
+        if self.semaphore is None:
+            return await self.func(*self.args, **self.kwargs)
+
+        async with self.semaphore:
+            return await self.func(*self.args, **self.kwargs)
+
+
+class JobGroup:
+    """Jobs of :class:`Dispatcher` with the same schedule, misfire
+    policy and next occurrence, fired together. Occurrences of the
+    group are pulled once from the schedule of its ``clock`` job (the
+    first one), and the due runs are fanned out to all the ``jobs``.
+    """
+
+    __slots__ = ('key', 'clock', 'jobs')
+
+    def __init__(self, key: t.Hashable, clock: Job):
+        self.key = key
+        self.clock = clock
+        self.jobs = {}
+
+    def __repr__(self):
+        return '<JobGroup jobs=%d next=%s>' % (len(self.jobs), self.next_dt)
+
+    @property
+    def next_dt(self) -> t.Optional[datetime.datetime]:
+        return self.clock.next_dt
+
+    def add(self, job: Job):
+        self.jobs[job.id] = job
+        job.group = self
+
+    def discard(self, job: Job):
+        self.jobs.pop(job.id, None)
+        job.group = None
+
+    def fire(self, now: float) -> t.Optional[datetime.datetime]:
+        """Same as :meth:`Job.fire` for all the jobs of the group."""
+        runs = self.clock.due_runs(now)
+        for job in list(self.jobs.values()):
+            job.next_dt = self.clock.next_dt
+            job.last_dt = self.clock.last_dt
+            for _ in range(runs):
+                job.run()
+        return self.clock.next_dt
+
+
+class Dispatcher:
+    """Runs many scheduled coroutine functions with a single timer.
+
+    All jobs are kept in one min-heap keyed by their next fire time and
+    only the earliest one is armed with ``loop.call_at``. After firing,
+    the next occurrence of the job is pulled from its schedule and
+    pushed back, so every fire costs O(log n). Measured fire lateness
+    is available as :attr:`lateness`::
+
+        dispatcher = Dispatcher()
+
+        @dispatcher.scheduled({
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': 1,
+            },
+        })
+        async def some_coroutine():
+            print('PING')
+
+        dispatcher.start()
+
+    Concurrency of every job can be limited with ``max_instances``,
+    ``overlap`` and ``max_queued`` options (see :meth:`Job.run`),
+    ``max_concurrency`` limits the number of the runs executed at once
+    by all the jobs. Counters of all the runs are available as
+    :attr:`counters`.
+
+    Occurrences missed while the loop was blocked, or since ``last_run``
+    of a job restored after a restart, are handled by its ``misfire``
+    policy within ``misfire_grace`` seconds (see :meth:`Job.fire`)::
+
+        dispatcher.add_job(
+            some_coroutine,
+            schedule,
+            misfire=MisfirePolicies.COALESCE,
+            last_run=last_run_dt,
+        )
+
+    Jobs with equal schedules (see :func:`krolib.cache.schedule_hash`,
+    the ones without ``start.on`` have to be anchored at the same
+    second), misfire options and next occurrence share a single
+    :class:`JobGroup` in the heap, so the schedule is evaluated once
+    per group and the runs are fanned out to its jobs. Dict schedules
+    are compiled once by the ``cache``.
+
+    Jobs added by :meth:`add_stored_job` are kept in the ``store`` (see
+    :mod:`krolib.stores`) with their next fire times, so they survive
+    restarts. Only the stored jobs due within ``horizon`` seconds are
+    loaded, ``page_size`` of them at a time, and the later ones are
+    paged in when the half of the horizon is passed, so the startup
+    doesn't depend on the number of the stored jobs::
+
+        dispatcher = Dispatcher(store=SQLiteJobStore('jobs.sqlite'))
+        dispatcher.start()
+    """
+
+    def __init__(
+        self,
+        loop: t.Optional[asyncio.AbstractEventLoop] = None,
+        max_concurrency: t.Optional[int] = None,
+        cache: t.Optional[ScheduleCache] = None,
+        store: t.Optional[JobStore] = None,
+        horizon: float = 300.0,
+        page_size: int = 1000,
+    ):
+        if horizon <= 0:
+            raise ValueError('Invalid horizon, a positive number expected')
+        if page_size < 1:
+            raise ValueError('Invalid page size, a positive integer expected')
+
+        self.loop = loop
+        self.jobs = {}
+        self.cache = ScheduleCache() if cache is None else cache
+        self.lateness = LatenessStats()
+        self.counters = RunCounters()
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.store = store
+        self.horizon = horizon
+        self.page_size = page_size
+        self._heap = []
+        self._groups = {}
+        self._counter = itertools.count()
+        self._job_ids = itertools.count()
+        self._timer = None
+        self._timer_ts = None
+        self._running = False
+        # ids of the loaded stored jobs, paging position and its time
+        self._stored = set()
+        self._cursor = None
+        self._loaded_until = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def add_job(
+        self,
+        func: t.Callable[..., t.Awaitable],
+        schedule: t.Union[dict, CompiledSchedule],
+        args: tuple = (),
+        kwargs: t.Optional[dict] = None,
+        job_id: t.Optional[t.Hashable] = None,
+        getters: t.Optional[t.List[dict]] = None,
+        max_instances: t.Optional[int] = None,
+        overlap: str = OverlapPolicies.SKIP,
+        max_queued: t.Optional[int] = None,
+        misfire: str = MisfirePolicies.REPLAY,
+        misfire_grace: t.Optional[float] = None,
+        last_run: t.Optional[datetime.datetime] = None,
+    ) -> Job:
+        if not isinstance(schedule, CompiledSchedule):
+            schedule = self.cache.compile(schedule, getters=getters)
+
+        if job_id is None:
+            job_id = next(self._job_ids)
+        if job_id in self.jobs:
+            raise KeyError('Job %r is already registered' % (job_id,))
+
+        job = Job(
+            job_id,
+            func,
+            schedule,
+            args=args,
+            kwargs=kwargs,
+            max_instances=max_instances,
+            overlap=overlap,
+            max_queued=max_queued,
+            semaphore=self.semaphore,
+            counters=RunCounters(parent=self.counters),
+            misfire=misfire,
+            misfire_grace=misfire_grace,
+            last_run=last_run,
+        )
+        # the job of the schedule which is over isn't registered
+        if job.advance():
+            self.jobs[job_id] = job
+            self._subscribe(job)
+        return job
+
+    def add_stored_job(
+        self,
+        func: t.Callable[..., t.Awaitable],
+        schedule: t.Union[dict, CompiledSchedule],
+        job_id: t.Hashable,
+        getters: t.Optional[t.List[dict]] = None,
+        misfire: str = MisfirePolicies.REPLAY,
+        misfire_grace: t.Optional[float] = None,
+        last_run: t.Optional[datetime.datetime] = None,
+    ) -> t.Optional[Job]:
+        """Same as :meth:`add_job` for the job kept in the ``store``,
+        ``func`` has to be defined at the module level. Returns the job
+        if it's due within the loaded part of the store, the later ones
+        are loaded when they're due soon.
+        """
+        if self.store is None:
+            raise ValueError('Invalid dispatcher, a job store expected')
+
+        reference = func_reference(func)
+        if not isinstance(schedule, CompiledSchedule):
+            schedule = self.cache.compile(schedule, getters=getters)
+        if job_id in self.jobs or self.store.get(job_id) is not None:
+            raise KeyError('Job %r is already registered' % (job_id,))
+
+        job = Job(
+            job_id,
+            func,
+            schedule,
+            semaphore=self.semaphore,
+            counters=RunCounters(parent=self.counters),
+            misfire=misfire,
+            misfire_grace=misfire_grace,
+            last_run=last_run,
+        )
+        if job.advance() is None:
+            return None
+
+        next_ts = job.next_dt.timestamp()
+        self.store.add(StoredJob(
+            job_id,
+            reference,
+            job.schedule.schedule,
+            next_ts,
+            job.last_dt.timestamp(),
+            misfire,
+            misfire_grace,
+        ))
+        if self._loaded_until is None or next_ts > self._loaded_until:
+            return None
+
+        self.jobs[job_id] = job
+        self._stored.add(job_id)
+        self._subscribe(job)
+        return job
+
+    def remove_job(self, job_id: t.Hashable) -> t.Optional[Job]:
+        """Removes the job, stored ones are removed from the ``store``
+        too. Returns the job if it was loaded.
+        """
+        if self.store is not None and job_id not in self.jobs:
+            if self.store.get(job_id) is None:
+                raise KeyError(job_id)
+            self.store.remove(job_id)
+            return None
+
+        job = self.jobs.pop(job_id)
+        if job_id in self._stored:
+            self._stored.discard(job_id)
+            self.store.remove(job_id)
+
+        # empty groups are dropped from the heap lazily
+        job.active = False
+        group = job.group
+        if group is not None:
+            group.discard(job)
+            if not group.jobs and self._groups.get(group.key) is group:
+                del self._groups[group.key]
+        return job
+
+    def scheduled(
+        self,
+        schedule: t.Union[dict, CompiledSchedule],
+        **params,
+    ) -> t.Callable:
+        """Decorator form of :meth:`add_job`."""
+        def wrapper(func):
+            self.add_job(func, schedule, **params)
+            return func
+        return wrapper
+
+    def start(self):
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        if self.store is not None:
+            self._refill(time.time())
+        self._running = True
+        self._arm()
+
+    def stop(self):
+        self._running = False
+        if self._timer:
+            self._timer.cancel()
+        self._timer = self._timer_ts = None
+
+    def _subscribe(self, job: Job):
+        key = (self.cache.digest(job.schedule), job.misfire, job.misfire_grace)
+        group = self._groups.get(key)
+        if group is None or not group.jobs or group.next_dt != job.next_dt:
+            group = self._groups[key] = JobGroup(key, job)
+            group.add(job)
+            self._push(group)
+            self._arm()
+        else:
+            group.add(job)
+
+    def _refill(self, now: float):
+        """Loads the stored jobs due within the horizon, if the half of
+        it is passed since the last loading.
+        """
+        while self._loaded_until is None or self._loaded_until - self.horizon / 2 <= now:
+            until = now + self.horizon
+            rows = self.store.due(until, after=self._cursor, limit=self.page_size)
+            for row in rows:
+                if row.job_id not in self.jobs:
+                    self._load(row)
+
+            if rows:
+                self._cursor = (rows[-1].next_fire_at, rows[-1].job_id)
+            # later jobs with the same time as the last one may be left
+            self._loaded_until = rows[-1].next_fire_at if len(rows) == self.page_size else until
+
+    def _load(self, row: StoredJob):
+        job = Job(
+            row.job_id,
+            resolve_func(row.func),
+            self.cache.compile(row.schedule, trusted=True),
+            semaphore=self.semaphore,
+            counters=RunCounters(parent=self.counters),
+            misfire=row.misfire,
+            misfire_grace=row.misfire_grace,
+            last_run=datetime.datetime.fromtimestamp(row.last_run, datetime.timezone.utc),
+        )
+        if job.advance() is None:
+            self.store.remove(row.job_id)
+            return
+
+        self.jobs[job.id] = job
+        self._stored.add(job.id)
+        self._subscribe(job)
+
+    def _persist(self, group: JobGroup, next_dt: t.Optional[datetime.datetime]):
+        """Saves the fired stored jobs of ``group``, the ones due later
+        than the loaded part of the store are unloaded.
+        """
+        stored = [job for job in group.jobs.values() if job.id in self._stored]
+        if not stored:
+            return
+
+        if next_dt is None:
+            for job in stored:
+                self.store.remove(job.id)
+                self._stored.discard(job.id)
+            return
+
+        next_ts = next_dt.timestamp()
+        self.store.update_many((job.id, next_ts, job.last_dt.timestamp()) for job in stored)
+        if next_ts > self._loaded_until:
+            for job in stored:
+                group.discard(job)
+                del self.jobs[job.id]
+                self._stored.discard(job.id)
+
+    def _push(self, group: JobGroup):
+        heapq.heappush(self._heap, (group.next_dt.timestamp(), next(self._counter), group))
+
+    def _arm(self):
+        if not self._running:
+            return
+
+        while self._heap and not self._heap[0][2].jobs:
+            heapq.heappop(self._heap)
+
+        timestamp = self._heap[0][0] if self._heap else None
+        if self._loaded_until is not None:
+            refill_ts = self._loaded_until - self.horizon / 2
+            timestamp = refill_ts if timestamp is None else min(timestamp, refill_ts)
+        if timestamp is None:
+            return
+
+        if self._timer and self._timer_ts == timestamp:
+            return
+
+        if self._timer:
+            self._timer.cancel()
+        self._timer = self.loop.call_at(loop_deadline(self.loop, timestamp), self._fire)
+        self._timer_ts = timestamp
+
+    def _fire(self):
+        self._timer = self._timer_ts = None
+        now = time.time()
+        if self.store is not None:
+            self._refill(now)
+
+        while self._heap and self._heap[0][0] <= now + CLOCK_RESOLUTION:
+            timestamp, _, group = heapq.heappop(self._heap)
+            if not group.jobs:
+                continue
+
+            self.lateness.add(max(now - timestamp, 0.0))
+            next_dt = group.fire(now)
+            if self.store is not None:
+                self._persist(group, next_dt)
+            if next_dt and group.jobs:
+                self._push(group)
+                continue
+
+            for job_id in group.jobs:
+                self.jobs.pop(job_id, None)
+            if self._groups.get(group.key) is group:
+                del self._groups[group.key]
+
+        self._arm()
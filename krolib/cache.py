@@ -0,0 +1,182 @@
+"""Memoization of compiled schedules by their content.
+
+Equal schedule dicts are compiled once by :class:`ScheduleCache`::
+
+    cache = ScheduleCache(maxsize=10000)
+    for stored in stored_schedules:
+        compiled = cache.compile(stored)
+        seconds, next_dt = compiled.delta()
+
+    hits, misses, evictions, maxsize, currsize = cache.info()
+
+Schedules are keyed by :func:`schedule_hash`, which doesn't depend on
+the order of keys and treats datetimes of the same instant (aware ones
+in any timezone or naive ones in the schedule timezone) as equal.
+"""
+import collections
+import datetime
+import functools
+import hashlib
+import marshal
+import math
+import typing as t
+
+from .parser import CompiledSchedule, compile_schedule
+from .utils import normalize_datetime, resolve_timezone
+
+
+DEFAULT_CACHE_SIZE = 4096
+
+# values kept as is in the canonical form of schedules
+PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', [
+        'hits',
+        'misses',
+        'evictions',
+        'maxsize',
+        'currsize',
+    ]
+)
+
+
+@functools.lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def naive_timestamp(dt: datetime.datetime, tzinfo: datetime.tzinfo) -> int:
+    return math.floor(normalize_datetime(dt, tzinfo).timestamp())
+
+
+def canonical_datetime(dt: datetime.datetime, tzinfo: t.Optional[datetime.tzinfo]):
+    """Returns unix timestamp of ``dt`` in whole seconds the same way
+    as :class:`krolib.parser.CompiledSchedule` normalizes it.
+    """
+    if dt.tzinfo is not None:
+        return math.floor(dt.timestamp())
+    if tzinfo is None:
+        return dt.replace(microsecond=0).isoformat()
+    return naive_timestamp(dt, tzinfo)
+
+
+def canonical_value(value, tzinfo: t.Optional[datetime.tzinfo]):
+    """Returns ``value`` made of tuples and plain values which can be
+    serialized by :mod:`marshal`, dicts with items sorted by keys.
+    """
+    value_type = type(value)
+    if value_type in PLAIN_TYPES:
+        return value
+    if value_type is dict:
+        items = [(key, canonical_value(x, tzinfo)) for key, x in value.items()]
+        try:
+            items.sort()
+        except TypeError:
+            items.sort(key=repr)
+        return ('dict', tuple(items))
+    if value_type is list or value_type is tuple:
+        return (value_type.__name__, tuple(canonical_value(x, tzinfo) for x in value))
+    if isinstance(value, datetime.datetime):
+        return ('datetime', canonical_datetime(value, tzinfo))
+    return (value_type.__name__, repr(value))
+
+
+def schedule_hash(schedule: dict) -> str:
+    """Returns hex digest of the canonical form of ``schedule``, equal
+    for the schedules evaluated the same way by
+    :class:`krolib.parser.CompiledSchedule`.
+    """
+    timezone = schedule.get('timezone', 'UTC') if type(schedule) is dict else None
+    try:
+        tzinfo = resolve_timezone(timezone) if timezone else None
+    except Exception:
+        # invalid schedules are hashed as is, the validation rejects them
+        tzinfo = None
+
+    # version 0 doesn't depend on strings interning
+    canonical = marshal.dumps(canonical_value(schedule, tzinfo), 0)
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+class ScheduleCache:
+    """LRU cache of :class:`krolib.parser.CompiledSchedule` objects
+    keyed by :func:`schedule_hash`, at most ``maxsize`` of them (no
+    limit if ``None``).
+
+    Schedules with getters aren't cached, their values depend on the
+    getters results.
+    """
+
+    __slots__ = (
+        'maxsize',
+        'trusted',
+        'entries',
+        'digests',
+        'hits',
+        'misses',
+        'evictions',
+    )
+
+    def __init__(self, maxsize: t.Optional[int] = DEFAULT_CACHE_SIZE, trusted: bool = False):
+        if maxsize is not None and maxsize < 1:
+            raise ValueError('Invalid cache size, a positive integer or None expected')
+        self.maxsize = maxsize
+        self.trusted = trusted
+        self.entries = collections.OrderedDict()
+        # schedule_hash of the validated schedules by compiled ones
+        self.digests = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, schedule: dict):
+        return schedule_hash(schedule) in self.entries
+
+    def compile(
+        self,
+        schedule: dict,
+        getters: t.Optional[t.List[dict]] = None,
+        trusted: t.Optional[bool] = None,
+    ) -> CompiledSchedule:
+        """Same as :func:`krolib.parser.compile_schedule`, returns the
+        cached compiled schedule if an equal one was compiled before.
+        ``trusted`` is the one of the cache by default.
+        """
+        if trusted is None:
+            trusted = self.trusted
+        if getters:
+            return compile_schedule(schedule, getters=getters, trusted=trusted)
+
+        key = schedule_hash(schedule)
+        compiled = self.entries.get(key)
+        if compiled is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return compiled
+
+        self.misses += 1
+        compiled = compile_schedule(schedule, trusted=trusted)
+        self.entries[key] = compiled
+        if self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return compiled
+
+    def digest(self, compiled: CompiledSchedule) -> str:
+        """Returns :func:`schedule_hash` of the validated schedule of
+        ``compiled``, remembered for at most ``maxsize`` latest ones.
+        """
+        digest = self.digests.get(compiled)
+        if digest is None:
+            digest = self.digests[compiled] = schedule_hash(compiled.schedule)
+            if self.maxsize is not None and len(self.digests) > self.maxsize:
+                del self.digests[next(iter(self.digests))]
+        return digest
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.entries))
+
+    def clear(self):
+        self.entries.clear()
+        self.digests.clear()
+        self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,283 @@
+"""Evaluation of schedules in integer unix timestamps.
+
+:class:`EpochSchedule` keeps instants as ``int`` seconds and looks UTC
+offsets up in the offset tables of :mod:`krolib.utils`, so fixed-length
+rules (weekly and shorter, without relative days) are evaluated without
+creating datetime objects. Datetimes are created only when they're
+returned, and they're the same as the ones :mod:`krolib.parser` returns::
+
+    compiled = compile_epoch_schedule(schedule)
+    next_ts = compiled.next_epoch(int(time.time()))
+    seconds, next_dt = compiled.delta()  # same as parser.schedule_delta
+
+Calendar and relative-day rules are evaluated by
+:class:`krolib.parser.CompiledSchedule`.
+"""
+import math
+import time
+import datetime
+import typing as t
+
+from .parser import (
+    CompiledSchedule,
+    compile_schedule,
+    rule_period,
+    rrule_phases,
+    progression_index,
+    progression_offset,
+    FIXED_PERIOD_MAP,
+)
+from .utils import localize_epoch, offset_table
+
+
+# epoch is thursday, weeks of rrule start on monday
+WEEK_ORIGIN = -3 * 86400
+
+# phases of schedules without start.on kept by EpochSchedule
+PHASES_CACHE_SIZE = 1024
+
+
+class EpochSchedule:
+    """Compiled schedule evaluated in unix timestamps.
+
+    Phases of schedules without ``start.on`` depend only on the wall
+    time position of the start within the rule unit (e.g. the weekday
+    and the time of day for weekly rules), so they're cached by it
+    instead of being rebuilt on every evaluation.
+    """
+
+    __slots__ = (
+        'compiled',
+        'offsets',
+        'period',
+        'unit',
+        'count',
+        'until',
+        'shift',
+        'epoch',
+        'phases',
+        'tzinfos',
+        'phases_cache',
+    )
+
+    def __init__(self, compiled: CompiledSchedule):
+        self.compiled = compiled
+        self.offsets = offset_table(compiled.tzinfo) if compiled.tzinfo else None
+        self.period = None
+        self.unit = None
+        self.count = None
+        self.until = None
+        self.shift = 0
+        self.epoch = None
+        self.phases = None
+        self.tzinfos = None
+        self.phases_cache = {}
+
+        template = compiled.rrule_template
+        if self.offsets is None or not compiled.repeats or compiled.relative:
+            return
+
+        self.period = rule_period(template)
+        if not self.period:
+            return
+
+        self.unit = FIXED_PERIOD_MAP[template['freq']]
+        self.count = template.get('count')
+        if template.get('until'):
+            self.until = int(template['until'].timestamp())
+        if compiled.timeshift:
+            self.shift = int(compiled.timeshift.total_seconds())
+
+        if compiled.rrule_params is not None:
+            dtstart = compiled.rrule_params['dtstart']
+            self.epoch = compiled.epoch
+            self.phases = compiled.phases
+            self.tzinfos = (datetime.timezone(dtstart.utcoffset()), dtstart.tzinfo)
+
+    def __repr__(self):
+        return '<EpochSchedule %r>' % (self.compiled.schedule,)
+
+    def now_epoch(self, now_dt: t.Optional[datetime.datetime] = None) -> int:
+        if now_dt is None:
+            return int(time.time())
+        if now_dt.tzinfo is None:
+            now_dt = self.compiled.normalized_now(now_dt)
+        return math.floor(now_dt.timestamp())
+
+    def now_datetime(self, now_epoch: int) -> datetime.datetime:
+        """Returns ``now_epoch`` the same way as
+        :meth:`CompiledSchedule.normalized_now` does.
+        """
+        return localize_epoch(now_epoch, self.compiled.tzinfo)
+
+    def progression(
+        self,
+        now_epoch: int,
+    ) -> t.Tuple[int, t.List[int], t.Tuple[datetime.tzinfo, datetime.tzinfo]]:
+        """Returns ``dtstart`` timestamp, phases and tzinfos (fixed offset
+        and pytz ones) of the rule evaluated at ``now_epoch``.
+        """
+        if self.epoch is not None:
+            return self.epoch, self.phases, self.tzinfos
+
+        index = self.offsets.index(now_epoch)
+        tzinfos = (self.offsets.fixed_tzinfos[index], self.offsets.tzinfos[index])
+        dtstart = now_epoch + self.shift
+        position = (dtstart + self.offsets.offsets[index] - WEEK_ORIGIN) % self.unit
+        phases = self.phases_cache.get(position)
+        if phases is None:
+            if len(self.phases_cache) >= PHASES_CACHE_SIZE:
+                self.phases_cache.clear()
+            rrule_params = self.compiled.build_rrule_params(materialize(dtstart, tzinfos))
+            phases = self.phases_cache[position] = rrule_phases(rrule_params, self.period)
+
+        return dtstart, phases, tzinfos
+
+    def epochs_from(self, now_epoch: int) -> t.Generator[int, None, None]:
+        """Generates timestamps of the same occurrences as
+        :meth:`CompiledSchedule.iter_from` does for ``now_epoch``.
+        """
+        if self.period is None:
+            for dt in self.compiled.occurrences(self.now_datetime(now_epoch)):
+                yield int(dt.timestamp())
+            return
+
+        dtstart, phases, _ = self.progression(now_epoch)
+        if not phases:
+            return
+
+        index = progression_index(self.period, phases, now_epoch - dtstart)
+        while self.count is None or index < self.count:
+            timestamp = dtstart + progression_offset(self.period, phases, index)
+            if self.until is not None and timestamp > self.until:
+                return
+
+            index += 1
+            yield timestamp
+
+    def next_epoch(self, now_epoch: int) -> t.Optional[int]:
+        """Returns the timestamp of the first occurrence later than
+        ``now_epoch`` or ``None`` if the schedule is over.
+        """
+        if self.period is None:
+            for timestamp in self.epochs_from(now_epoch):
+                if timestamp > now_epoch:
+                    return timestamp
+            return None
+
+        dtstart, phases, _ = self.progression(now_epoch)
+        if not phases:
+            return None
+
+        index = progression_index(self.period, phases, now_epoch - dtstart)
+        if self.count is not None and index >= self.count:
+            return None
+
+        timestamp = dtstart + progression_offset(self.period, phases, index)
+        if self.until is not None and timestamp > self.until:
+            return None
+        return timestamp
+
+    def delta_epoch(self, now_epoch: int) -> t.Tuple[int, int]:
+        """Same as :meth:`delta` with the timestamps."""
+        if self.period is None:
+            seconds, dt = self.compiled.delta_from(self.now_datetime(now_epoch))
+            return seconds, int(dt.timestamp())
+
+        timestamp = self.next_epoch(now_epoch)
+        if timestamp is None:
+            return 0, now_epoch
+        return timestamp - now_epoch, timestamp
+
+    def iter_from(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> t.Generator[datetime.datetime, None, None]:
+        """Generates the same datetime objects as
+        :func:`krolib.parser.schedule_parser` does for ``now_dt``.
+        """
+        if self.period is None:
+            yield from self.compiled.iter_from(now_dt)
+            return
+
+        now_epoch = self.now_epoch(now_dt)
+        _, _, tzinfos = self.progression(now_epoch)
+        for timestamp in self.epochs_from(now_epoch):
+            yield materialize(timestamp, tzinfos)
+
+    def delta(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> t.Tuple[int, datetime.datetime]:
+        """Same as :func:`krolib.parser.schedule_delta`."""
+        if self.period is None:
+            return self.compiled.delta(now_dt)
+
+        now_epoch = self.now_epoch(now_dt)
+        seconds, timestamp = self.delta_epoch(now_epoch)
+        if timestamp == now_epoch:
+            return 0, self.now_datetime(now_epoch)
+
+        _, _, tzinfos = self.progression(now_epoch)
+        return seconds, materialize(timestamp, tzinfos)
+
+
+def materialize(
+    timestamp: int,
+    tzinfos: t.Tuple[datetime.tzinfo, datetime.tzinfo],
+) -> datetime.datetime:
+    """Returns ``timestamp`` as a datetime with the pytz tzinfo of
+    ``tzinfos``, converted with the fixed offset one.
+    """
+    fixed_tzinfo, tzinfo = tzinfos
+    return datetime.datetime.fromtimestamp(timestamp, fixed_tzinfo).replace(tzinfo=tzinfo)
+
+
+def compile_epoch_schedule(
+    schedule: t.Union[dict, CompiledSchedule],
+    getters: t.Optional[t.List[dict]] = None,
+    trusted: bool = False,
+) -> EpochSchedule:
+    if not isinstance(schedule, CompiledSchedule):
+        schedule = compile_schedule(schedule, getters=getters, trusted=trusted)
+    return EpochSchedule(schedule)
+
+
+def schedule_parser(
+    schedule: dict,
+    now_dt: t.Optional[datetime.datetime] = None,
+    getters: t.Optional[t.List[dict]] = None,
+) -> t.Generator[datetime.datetime, None, None]:
+    """Same as :func:`krolib.parser.schedule_parser`."""
+    yield from compile_epoch_schedule(schedule, getters=getters).iter_from(now_dt)
+
+
+def schedule_delta(
+    schedule: dict,
+    now_dt: t.Optional[datetime.datetime] = None,
+    getters: t.Optional[t.List[dict]] = None,
+) -> t.Tuple[int, datetime.datetime]:
+    """Same as :func:`krolib.parser.schedule_delta`."""
+    return compile_epoch_schedule(schedule, getters=getters).delta(now_dt)
+
+
+def next_epochs(
+    schedules: t.Iterable[t.Union[dict, CompiledSchedule, EpochSchedule]],
+    now_epoch: t.Optional[int] = None,
+) -> t.List[t.Optional[int]]:
+    """Returns timestamps of the next occurrences of all ``schedules``
+    after ``now_epoch`` (or now), ``None`` for the finished ones::
+
+        compiled = [compile_epoch_schedule(s) for s in stored_schedules]
+        for next_ts in next_epochs(compiled):
+            ...
+    """
+    if now_epoch is None:
+        now_epoch = int(time.time())
+
+    results = []
+    for compiled in schedules:
+        if not isinstance(compiled, EpochSchedule):
+            compiled = compile_epoch_schedule(compiled)
+        results.append(compiled.next_epoch(now_epoch))
+    return results
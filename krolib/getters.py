@@ -0,0 +1,360 @@
+"""Resolution of schedule getters, see :func:`krolib.parser.validated_schedule`.
+
+Getters of many schedules are resolved together: a :class:`BatchGetter`
+is called once with the values of all the schedules, results can be
+kept by :class:`GetterCache` for ``ttl`` seconds, and all the results
+of a schedule are applied at once, copying only the dicts on the
+changed paths::
+
+    @BatchGetter
+    async def delays_getter(values, **params):
+        return await service.fetch_delays(values)
+
+    schedules = await avalidated_schedules(stored, getters, getter_cache=GetterCache(60))
+
+Getters can be regular or coroutine functions in the async resolution.
+Getters are applied in order, so a getter sees the results of the
+previous ones; the ones of the independent paths are awaited
+concurrently.
+"""
+import asyncio
+import collections
+import functools
+import inspect
+import time
+import typing as t
+
+from toolz.dicttoolz import get_in
+
+from .structs import GettersSchema
+
+
+DEFAULT_GETTER_CACHE_SIZE = 4096
+
+Path = t.Tuple[t.Hashable, ...]
+# (getter, params, path, frozen params) of getters
+Spec = t.Tuple[t.Callable, dict, Path, t.Optional[t.Hashable]]
+
+MISSING = object()
+
+
+class BatchGetter:
+    """Getter resolving ``path`` values of many schedules by a single
+    call of ``func(values, **params)``, which returns the results in the
+    same order. Can be used as a regular getter too.
+    """
+
+    __slots__ = ('func',)
+
+    def __init__(self, func: t.Callable[..., t.Union[list, t.Awaitable[list]]]):
+        self.func = func
+
+    def __repr__(self):
+        return '<BatchGetter %r>' % (self.func,)
+
+    def __call__(self, value, **params):
+        results = self.func([value], **params)
+        if inspect.isawaitable(results):
+            return first_result(results)
+        return results[0]
+
+
+async def first_result(results: t.Awaitable[list]):
+    return (await results)[0]
+
+
+def frozen(value) -> t.Hashable:
+    """Returns hashable form of ``value`` made of tuples, raises
+    ``TypeError`` for unhashable values other than dicts, lists and sets.
+    """
+    if isinstance(value, dict):
+        items = [(key, frozen(x)) for key, x in value.items()]
+        try:
+            items.sort()
+        except TypeError:
+            items.sort(key=repr)
+        return ('dict', tuple(items))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(frozen(x) for x in value))
+    if isinstance(value, (set, frozenset)):
+        return ('set', frozenset(frozen(x) for x in value))
+    hash(value)
+    return value
+
+
+class GetterCache:
+    """Results of getters by the getter, its params and the value, kept
+    for ``ttl`` seconds, at most ``maxsize`` of them (no limit if
+    ``None``). Calls with unhashable params aren't cached.
+    """
+
+    __slots__ = ('ttl', 'maxsize', 'entries', 'hits', 'misses')
+
+    def __init__(self, ttl: float, maxsize: t.Optional[int] = DEFAULT_GETTER_CACHE_SIZE):
+        if ttl <= 0:
+            raise ValueError('Invalid getter cache ttl, a positive number expected')
+        if maxsize is not None and maxsize < 1:
+            raise ValueError('Invalid cache size, a positive integer or None expected')
+
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(
+        getter: t.Callable,
+        frozen_params: t.Optional[t.Hashable],
+        value,
+    ) -> t.Optional[t.Hashable]:
+        """Returns key of the call with the params frozen by
+        :func:`frozen` once per getter, ``None`` if it can't be cached.
+        """
+        if frozen_params is None:
+            return None
+        try:
+            return (getter, frozen_params, frozen(value))
+        except TypeError:
+            return None
+
+    def get(self, key: t.Hashable):
+        """Returns the result kept for ``key`` or :data:`MISSING`."""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return MISSING
+
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: t.Hashable, result):
+        self.entries[key] = (time.monotonic() + self.ttl, result)
+        self.entries.move_to_end(key)
+        if self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+@functools.lru_cache(maxsize=1024)
+def path_steps(path: Path) -> t.Tuple[t.Tuple[Path, t.Hashable], ...]:
+    """Returns ``(prefix, key)`` of the sections on ``path``."""
+    return tuple((path[:depth], path[depth - 1]) for depth in range(1, len(path)))
+
+
+def assoc_copied(schedule: dict, copies: t.Dict[Path, dict], path: Path, value) -> dict:
+    """Returns copy of ``schedule`` with ``value`` by ``path``, the same
+    as ``toolz.assoc_in``. ``copies`` keeps the dicts copied by previous
+    calls by their paths and the copy of ``schedule`` itself, they are
+    changed in place, so each dict on the updated paths is copied once.
+    """
+    root = copies.get(())
+    if root is None:
+        root = copies[()] = dict(schedule)
+    elif path in copies:
+        # copies of the replaced value and its sections are dropped
+        for prefix in [x for x in copies if x[:len(path)] == path]:
+            del copies[prefix]
+
+    node = root
+    for prefix, key in path_steps(path):
+        copy = copies.get(prefix)
+        if copy is None:
+            child = node.get(key)
+            copy = copies[prefix] = dict(child) if child is not None else {}
+            node[key] = copy
+        node = copy
+
+    node[path[-1]] = value
+    return root
+
+
+def getter_specs(getters: t.List[dict], freeze: bool = False) -> t.List[Spec]:
+    """Returns ``(getter, params, path, frozen_params)`` of the validated
+    ``getters`` with paths, in order. The params are frozen for
+    :meth:`GetterCache.key` if ``freeze``, ``None`` if they are unhashable.
+    """
+    specs = []
+    for getter in GettersSchema(getters):
+        params = getter.get('params', {})
+        path = params.get('path')
+        if not path:
+            continue
+
+        frozen_params = None
+        if freeze:
+            try:
+                frozen_params = frozen(params)
+            except TypeError:
+                pass
+        specs.append((getter['getter'], params, tuple(path), frozen_params))
+    return specs
+
+
+def getter_stages(specs: t.List[Spec]) -> t.List[t.List[Spec]]:
+    """Returns getter ``specs`` split to the stages of the getters of
+    independent paths (none is a prefix of another), in order.
+    """
+    stages = []
+    stage_paths = set()
+    # the paths and all their prefixes
+    stage_prefixes = set()
+    for spec in specs:
+        path = spec[2]
+        steps = path_steps(path)
+        if not stages or path in stage_prefixes or any(x in stage_paths for x, _ in steps):
+            stages.append([])
+            stage_paths = set()
+            stage_prefixes = set()
+        stages[-1].append(spec)
+        stage_paths.add(path)
+        stage_prefixes.add(path)
+        stage_prefixes.update(x for x, _ in steps)
+    return stages
+
+
+def apply_getters(schedule: dict, specs: t.List[Spec]) -> dict:
+    """Returns ``schedule`` with the results of the regular getters of
+    ``specs`` applied, each one sees the results of the previous ones.
+    """
+    copies = {}
+    for getter, params, path, _ in specs:
+        value = get_in(path, schedule)
+        if value is not None:
+            schedule = assoc_copied(schedule, copies, path, getter(value, **params))
+    return schedule
+
+
+class Resolution:
+    """Schedules with the results of getters applied so far."""
+
+    __slots__ = ('schedules', 'copies', 'cache')
+
+    def __init__(self, schedules: t.List[dict], cache: t.Optional[GetterCache]):
+        self.schedules = list(schedules)
+        self.copies = [{} for _ in self.schedules]
+        self.cache = cache
+
+    def set(self, index: int, path: Path, result):
+        self.schedules[index] = assoc_copied(
+            self.schedules[index], self.copies[index], path, result,
+        )
+
+    def pending_calls(
+        self,
+        spec: Spec,
+    ) -> t.Tuple[t.List[t.Tuple[t.Optional[t.Hashable], t.Any]], t.List[t.List[int]]]:
+        """Applies cached results of ``getter`` and returns ``(key, value)``
+        of the calls to make, and the indexes of the schedules waiting for
+        the result of each call.
+        """
+        getter, _, path, frozen_params = spec
+        cache = self.cache
+        calls = []
+        waiting = []
+        keys = {}
+        for index, schedule in enumerate(self.schedules):
+            value = get_in(path, schedule)
+            if value is None:
+                continue
+
+            key = cache.key(getter, frozen_params, value) if cache is not None else None
+            if key is not None:
+                result = cache.get(key)
+                if result is not MISSING:
+                    self.set(index, path, result)
+                    continue
+                if key in keys:
+                    waiting[keys[key]].append(index)
+                    continue
+                keys[key] = len(calls)
+            calls.append((key, value))
+            waiting.append([index])
+        return calls, waiting
+
+    def apply_results(
+        self,
+        path: Path,
+        calls: t.List[t.Tuple[t.Optional[t.Hashable], t.Any]],
+        waiting: t.List[t.List[int]],
+        results: t.List,
+    ):
+        for (key, _), indexes, result in zip(calls, waiting, results):
+            if key is not None:
+                self.cache.set(key, result)
+            for index in indexes:
+                self.set(index, path, result)
+
+
+def resolve_getters(
+    schedules: t.List[dict],
+    getters: t.List[dict],
+    cache: t.Optional[GetterCache] = None,
+) -> t.List[dict]:
+    """Returns ``schedules`` with the results of ``getters`` applied."""
+    specs = getter_specs(getters, freeze=cache is not None)
+    if cache is None and not any(isinstance(x[0], BatchGetter) for x in specs):
+        return [apply_getters(x, specs) for x in schedules]
+
+    resolution = Resolution(schedules, cache)
+    for spec in specs:
+        getter, params, path, _ = spec
+        calls, waiting = resolution.pending_calls(spec)
+        if not calls:
+            continue
+
+        if isinstance(getter, BatchGetter):
+            results = getter.func([value for _, value in calls], **params)
+        else:
+            results = [getter(value, **params) for _, value in calls]
+        resolution.apply_results(path, calls, waiting, results)
+
+    return resolution.schedules
+
+
+async def awaited(result):
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+async def aresolve_getters(
+    schedules: t.List[dict],
+    getters: t.List[dict],
+    cache: t.Optional[GetterCache] = None,
+) -> t.List[dict]:
+    """Same as :func:`resolve_getters` with getters which may return
+    awaitables, all the calls of a stage are awaited concurrently.
+    """
+    resolution = Resolution(schedules, cache)
+    for stage in getter_stages(getter_specs(getters, freeze=cache is not None)):
+        batches = []
+        awaitables = []
+        for spec in stage:
+            getter, params, path, _ = spec
+            calls, waiting = resolution.pending_calls(spec)
+            if not calls:
+                continue
+
+            batch = isinstance(getter, BatchGetter)
+            if batch:
+                awaitables.append(awaited(getter.func([value for _, value in calls], **params)))
+            else:
+                awaitables.extend(awaited(getter(value, **params)) for _, value in calls)
+            batches.append((batch, path, calls, waiting))
+
+        results = iter(await asyncio.gather(*awaitables))
+        for batch, path, calls, waiting in batches:
+            if batch:
+                batch_results = next(results)
+            else:
+                batch_results = [next(results) for _ in calls]
+            resolution.apply_results(path, calls, waiting, batch_results)
+
+    return resolution.schedules
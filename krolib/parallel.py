@@ -0,0 +1,123 @@
+"""Expansion of large schedule catalogs in worker processes.
+
+Schedules are sent to a :class:`concurrent.futures.ProcessPoolExecutor`
+in chunks, and the occurrences come back as compact ``array('q')`` of
+unix timestamps instead of lists of datetimes. Only a few chunks are in
+flight at once, so the memory doesn't depend on the catalog size::
+
+    for schedule, epochs in zip(catalog, expand_many(catalog, now, now + month)):
+        ...
+"""
+import array
+import collections
+import datetime
+import os
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+
+from .engine import compile_epoch_schedule
+from .parser import CompiledSchedule
+
+
+DEFAULT_CHUNK_SIZE = 64
+
+# chunks submitted ahead per worker
+CHUNKS_AHEAD = 2
+
+
+def _expand_chunk_epochs(
+    schedule: t.Union[dict, CompiledSchedule],
+    start_dt: datetime.datetime,
+    end_dt: datetime.datetime,
+    trusted: bool = False,
+) -> array.array:
+    """Returns ``array('q')`` of unix timestamps of the occurrences later
+    than ``start_dt`` and not later than ``end_dt``, the same as
+    :func:`krolib.parser.occurrences_between` returns.
+    """
+    compiled = compile_epoch_schedule(schedule, trusted=trusted)
+    start = compiled.now_epoch(start_dt)
+    end = compiled.now_epoch(end_dt)
+
+    epochs = array.array('q')
+    for timestamp in compiled.epochs_from(start):
+        if timestamp > end:
+            break
+        if timestamp > start:
+            epochs.append(timestamp)
+    return epochs
+
+
+def expand_chunk(
+    chunk: t.List[t.Tuple[dict, bool]],
+    start_dt: datetime.datetime,
+    end_dt: datetime.datetime,
+) -> t.List[array.array]:
+    """Expands ``(schedule, trusted)`` pairs in a worker process."""
+    return [
+        _expand_chunk_epochs(schedule, start_dt, end_dt, trusted) for schedule, trusted in chunk
+    ]
+
+
+def iter_chunks(
+    schedules: t.Iterable[t.Union[dict, CompiledSchedule]],
+    chunk_size: int,
+) -> t.Generator[t.List[t.Tuple[dict, bool]], None, None]:
+    """Generates chunks of schedules to send, compiled ones are sent as
+    their validated schedules which aren't validated again.
+    """
+    chunk = []
+    for schedule in schedules:
+        if isinstance(schedule, CompiledSchedule):
+            chunk.append((schedule.schedule, True))
+        else:
+            chunk.append((schedule, False))
+
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def expand_many(
+    schedules: t.Iterable[t.Union[dict, CompiledSchedule]],
+    start_dt: datetime.datetime,
+    end_dt: datetime.datetime,
+    workers: t.Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> t.Generator[array.array, None, None]:
+    """Generates ``array('q')`` of unix timestamps of the occurrences later
+    than ``start_dt`` and not later than ``end_dt`` for all ``schedules``
+    in the same order, expanded by ``workers`` processes (the number of
+    CPUs by default, in the current process if ``1``) in chunks of
+    ``chunk_size`` schedules.
+
+    Schedules are sent to the workers pickled, the ones without
+    ``start.on`` are anchored at ``start_dt``.
+    """
+    if chunk_size < 1:
+        raise ValueError('Invalid chunk size, a positive integer expected')
+
+    workers = workers or os.cpu_count() or 1
+    chunks = iter_chunks(schedules, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from expand_chunk(chunk, start_dt, end_dt)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = collections.deque()
+        try:
+            for chunk in chunks:
+                futures.append(executor.submit(expand_chunk, chunk, start_dt, end_dt))
+                if len(futures) >= workers * CHUNKS_AHEAD:
+                    yield from futures.popleft().result()
+
+            while futures:
+                yield from futures.popleft().result()
+        finally:
+            # the generator may be closed before the end
+            for future in futures:
+                future.cancel()
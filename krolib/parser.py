@@ -1,9 +1,14 @@
 import math
+import heapq
+import bisect
+import functools
+import itertools
 import calendar
 import datetime
+import operator
 import typing as t
 
-from toolz.dicttoolz import get_in, assoc_in
+from toolz.dicttoolz import get_in, assoc_in, dissoc
 from dateutil.relativedelta import (
     relativedelta,
     MO,
@@ -28,17 +33,18 @@ from dateutil.rrule import (
 from .structs import (
     TimeUnits,
     PeriodicalUnits,
+    MisfirePolicies,
     RelativeUnits,
     RelativeIndexUnits,
     ScheduleSchema,
     RelativeScheduleSchema,
-    GettersSchema,
+    fast_validated_schedule,
 )
+from .getters import GetterCache, resolve_getters
 from .utils import (
     just_now,
-    is_weekday,
-    is_weekend,
     normalize_datetime,
+    resolve_timezone,
 )
 
 
@@ -71,6 +77,20 @@ PERIODICAL_ATTRS_MAP = {
     'second': 'bysecond',
 }
 
+FIXED_PERIOD_MAP = {
+    WEEKLY: 604800,
+    DAILY: 86400,
+    HOURLY: 3600,
+    MINUTELY: 60,
+    SECONDLY: 1,
+}
+
+# number of distinct month (length, first weekday) and year (leap, first weekday) shapes
+CALENDAR_SHAPES_MAP = {
+    MONTHLY: 28,
+    YEARLY: 14,
+}
+
 SENSITIVE_ATTRS_MAP = {
     PeriodicalUnits.YEARLY: {'every', 'weekday', 'month', 'day', 'hour', 'minute', 'second'},
     PeriodicalUnits.MONTHLY: {'every', 'weekday', 'day', 'hour', 'minute', 'second'},
@@ -91,10 +111,26 @@ RELATIVE_DAY_MAP = {
     RelativeUnits.SATURDAY: SA,
 }
 
+RELATIVE_INDEX_MAP = {
+    RelativeIndexUnits.FIRST: 1,
+    RelativeIndexUnits.SECOND: 2,
+    RelativeIndexUnits.THIRD: 3,
+    RelativeIndexUnits.FOURTH: 4,
+}
+
+# (year, month) tables of relative days kept by relative_days_table
+RELATIVE_DAYS_CACHE_SIZE = 1024
+
+# lateness of the occurrences run on time (timers, whole-second datetimes),
+# the later ones are missed for the skip misfire policy without grace
+SKIP_GRACE = 1.0
+
 
 def validated_schedule(
         schedule: dict,
         getters: t.Optional[t.List[dict]] = None,
+        trusted: bool = False,
+        getter_cache: t.Optional[GetterCache] = None,
 ) -> dict:
     """Validates ``schedule`` with schemas and returns modified
     schedule dict if some getters provided.
@@ -114,19 +150,23 @@ def validated_schedule(
 
     In this case, :func:`payload_getter` will receive value by ``path``
     from the ``payload_source``. And ``schedule`` will be modified with
-    the result from ``payload_getter`` by the same path.
+    the result from ``payload_getter`` by the same path. Results of all
+    the getters are applied at once, results of the same calls can be
+    reused for ``getter_cache.ttl`` seconds, see :mod:`krolib.getters`.
+
+    Schedules which were already validated before (e.g. on saving to
+    a storage) can be checked with ``trusted=True`` by the hand-written
+    :func:`krolib.structs.fast_validated_schedule`, the schemas are used
+    only for the ones it can't return as is, so the result and errors
+    are the same.
     """
     if getters:
-        getters = GettersSchema(getters)
-        for getter in getters:
-            modifier = getter['getter']
-            params = getter.get('params', {})
-            path_to_value = params.get('path')
-            if path_to_value:
-                path_value = get_in(path_to_value, schedule)
-                if path_value is not None:
-                    val = modifier(path_value, **params)
-                    schedule = assoc_in(schedule, path_to_value, val)
+        schedule, = resolve_getters([schedule], getters, getter_cache)
+
+    if trusted:
+        validated = fast_validated_schedule(schedule)
+        if validated is not None:
+            return validated
 
     relative_params = (
         get_in(['periodical', 'relative_day'], schedule) and
@@ -140,6 +180,472 @@ def validated_schedule(
     return schedule
 
 
+def validated_schedules(
+    schedules: t.Iterable[dict],
+    getters: t.Optional[t.List[dict]] = None,
+    trusted: bool = False,
+    getter_cache: t.Optional[GetterCache] = None,
+) -> t.List[dict]:
+    """Same as :func:`validated_schedule` for many ``schedules``, each
+    :class:`krolib.getters.BatchGetter` is called once for all of them.
+    """
+    schedules = list(schedules)
+    if getters:
+        schedules = resolve_getters(schedules, getters, getter_cache)
+    return [validated_schedule(x, trusted=trusted) for x in schedules]
+
+
+def compile_schedule(
+    schedule: dict,
+    getters: t.Optional[t.List[dict]] = None,
+    trusted: bool = False,
+) -> 'CompiledSchedule':
+    """Validates ``schedule`` once and returns :class:`CompiledSchedule`
+    which can be evaluated many times without the validation cost::
+
+        compiled = compile_schedule(schedule)
+        for dt in compiled.iter_from(now_dt):
+            ...
+
+        seconds, next_dt = compiled.delta()
+
+    See :func:`validated_schedule` for ``trusted``.
+    """
+    return CompiledSchedule(validated_schedule(schedule, getters=getters, trusted=trusted))
+
+
+class CompiledSchedule:
+    """Validated and normalized schedule with everything that doesn't
+    depend on the evaluation time prepared in advance: timezone, start
+    and stop dates, rrule params and, for fixed-length frequencies,
+    the occurrences pattern of a single period.
+
+    Schedules without ``start.on`` are anchored to the evaluation time,
+    so only their rrule params template is prepared.
+    """
+
+    __slots__ = (
+        'schedule',
+        'timezone',
+        'tzinfo',
+        'start_on',
+        'timeshift',
+        'repeats',
+        'relative',
+        'relative_day',
+        'relative_day_index',
+        'rrule_template',
+        'rrule_params',
+        'epoch',
+        'period',
+        'phases',
+    )
+
+    def __init__(self, schedule: dict):
+        self.schedule = schedule
+        self.timezone = schedule.get('timezone', 'UTC')
+        self.tzinfo = resolve_timezone(self.timezone) if self.timezone else None
+
+        start_on = get_in(['start', 'on'], schedule)
+        if start_on:
+            start_on = normalize_datetime(start_on, self.tzinfo)
+        self.start_on = start_on
+
+        timeshift_delay = get_in(['start', 'relative_timeshift', 'delay'], schedule)
+        timeshift_type = get_in(['start', 'relative_timeshift', 'time_units'], schedule)
+        if timeshift_delay and timeshift_type:
+            self.timeshift = TIMESHIFT_MAP[timeshift_type](timeshift_delay)
+        else:
+            self.timeshift = None
+
+        self.repeats = get_in(['periodical', 'repeats'], schedule)
+        self.relative_day = get_in(['periodical', 'relative_day'], schedule)
+        self.relative_day_index = get_in(['periodical', 'relative_day_index'], schedule)
+        self.relative = bool(self.relative_day and self.relative_day_index)
+
+        rrule_template = {}
+        stop_dt = get_in(['stop', 'on'], schedule)
+        if stop_dt:
+            rrule_template['until'] = normalize_datetime(stop_dt, self.tzinfo)
+
+        num_repeats = get_in(['stop', 'after_num_repeats'], schedule)
+        is_infinite = get_in(['stop', 'never'], schedule)
+        if num_repeats and not is_infinite:
+            rrule_template['count'] = num_repeats
+
+        if self.repeats:
+            rrule_template['freq'] = PERIODICAL_MAP[self.repeats]
+            for param in SENSITIVE_ATTRS_MAP[self.repeats]:
+                mapped_param = PERIODICAL_ATTRS_MAP[param]
+                rrule_template[mapped_param] = get_in(['periodical', param], schedule)
+        self.rrule_template = rrule_template
+
+        self.rrule_params = None
+        self.epoch = None
+        self.period = None
+        self.phases = None
+        if self.start_on and self.repeats:
+            self.rrule_params = self.build_rrule_params(self.start_date(self.start_on))
+            self.epoch = int(self.rrule_params['dtstart'].timestamp())
+            self.period = rule_period(self.rrule_params)
+            self.phases = self.build_phases(self.rrule_params)
+
+    def __repr__(self):
+        return '<CompiledSchedule %r>' % (self.schedule,)
+
+    def anchored(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> 'CompiledSchedule':
+        """Returns the schedule with ``start.on`` fixed at ``now_dt``
+        (or now), so it's evaluated the same way at any later moment.
+        Schedules with ``start.on`` are returned as is.
+        """
+        if self.start_on:
+            return self
+        return CompiledSchedule(
+            assoc_in(self.schedule, ['start', 'on'], self.normalized_now(now_dt))
+        )
+
+    def normalized_now(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> datetime.datetime:
+        if now_dt:
+            return normalize_datetime(now_dt, self.tzinfo)
+        return just_now(self.tzinfo)
+
+    def start_date(self, now: datetime.datetime) -> datetime.datetime:
+        schedule_date = self.start_on or now
+        if self.timeshift:
+            schedule_date = schedule_date + self.timeshift
+        return schedule_date
+
+    def build_rrule_params(self, schedule_date: datetime.datetime) -> dict:
+        return dict(self.rrule_template, dtstart=schedule_date)
+
+    def build_phases(self, rrule_params: dict) -> t.Optional[t.List[int]]:
+        period = rule_period(rrule_params)
+        if self.relative or not period:
+            return None
+        return rrule_phases(rrule_params, period)
+
+    def progression(
+        self,
+        now: datetime.datetime,
+    ) -> t.Optional[t.Tuple[dict, int, t.List[int]]]:
+        """Returns rrule params, period and phases (see :func:`rrule_phases`)
+        of the rule evaluated for already normalized ``now`` or ``None``
+        if the schedule occurrences are not an arithmetic progression.
+        """
+        if not self.repeats or self.relative:
+            return None
+
+        rrule_params = self.rrule_params
+        phases = self.phases
+        if rrule_params is None:
+            rrule_params = self.build_rrule_params(self.start_date(now))
+            phases = self.build_phases(rrule_params)
+
+        if phases is None:
+            return None
+        return rrule_params, rule_period(rrule_params), phases
+
+    def iter_from(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> t.Generator[datetime.datetime, None, None]:
+        """Generates the same datetime objects as :func:`schedule_parser`
+        does for ``now_dt``.
+        """
+        yield from self.occurrences(self.normalized_now(now_dt))
+
+    def occurrences(
+        self,
+        now: datetime.datetime,
+    ) -> t.Generator[datetime.datetime, None, None]:
+        """Same as :meth:`iter_from` for already normalized ``now``."""
+        schedule_date = self.start_date(now)
+        if not self.repeats:
+            yield schedule_date
+            return
+
+        rrule_params = self.rrule_params
+        phases = self.phases
+        if rrule_params is None:
+            rrule_params = self.build_rrule_params(schedule_date)
+            phases = self.build_phases(rrule_params)
+
+        if not self.relative:
+            yield from seek_occurrences(rrule_params, now, phases=phases)
+            return
+
+        # relative day is resolved within the period of the base occurrence,
+        # so the base rule starts from the period containing ``now``
+        for dt in rrule(**seek_rrule_params(rrule_params, now)):
+            # basic case for the next planned time shift
+            next_dt = resolve_relative_day(
+                dt, self.repeats, self.relative_day, self.relative_day_index,
+            )
+            if next_dt <= schedule_date or next_dt <= now:
+                continue
+
+            yield next_dt
+
+    def reversed_occurrences(
+        self,
+        now: datetime.datetime,
+    ) -> t.Generator[datetime.datetime, None, None]:
+        """Generates occurrences earlier than already normalized ``now``
+        in the descending order.
+        """
+        schedule_date = self.start_date(now)
+        if not self.repeats:
+            if schedule_date < now:
+                yield schedule_date
+            return
+
+        rrule_params = self.rrule_params
+        phases = self.phases
+        if rrule_params is None:
+            rrule_params = self.build_rrule_params(schedule_date)
+            phases = self.build_phases(rrule_params)
+
+        if not self.relative:
+            yield from reverse_seek_occurrences(rrule_params, now, phases=phases)
+            return
+
+        # relative day is resolved within the period of the base occurrence,
+        # so base occurrences of the period containing ``now`` are needed too
+        if self.repeats == PeriodicalUnits.MONTHLY:
+            bound = now + relativedelta(months=1)
+        else:
+            bound = now + relativedelta(years=1)
+
+        for dt in reverse_seek_occurrences(rrule_params, bound):
+            prev_dt = resolve_relative_day(
+                dt, self.repeats, self.relative_day, self.relative_day_index,
+            )
+            if prev_dt <= schedule_date:
+                return
+            if prev_dt < now:
+                yield prev_dt
+
+    def iter_before(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> t.Generator[datetime.datetime, None, None]:
+        """Generates occurrences earlier than ``now_dt`` (or now) in the
+        descending order. They are calculated backwards from ``now_dt``,
+        the schedule is never replayed from its start (except for the
+        count-limited calendar rules, see :func:`reverse_seek_occurrences`).
+        """
+        yield from self.reversed_occurrences(self.normalized_now(now_dt))
+
+    def previous_before(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> t.Optional[datetime.datetime]:
+        """Returns the latest occurrence earlier than ``now_dt``
+        or ``None`` if there is no such.
+        """
+        return next(self.iter_before(now_dt), None)
+
+    def occurrences_between(
+        self,
+        start_dt: datetime.datetime,
+        end_dt: datetime.datetime,
+    ) -> t.Generator[datetime.datetime, None, None]:
+        """Generates occurrences later than ``start_dt`` and not later
+        than ``end_dt``. Schedules without ``start.on`` are evaluated
+        as anchored at ``start_dt``.
+        """
+        start = self.normalized_now(start_dt)
+        end = self.normalized_now(end_dt)
+        for dt in self.occurrences(start):
+            if dt > end:
+                return
+            if dt > start:
+                yield dt
+
+    def count_between(
+        self,
+        start_dt: datetime.datetime,
+        end_dt: datetime.datetime,
+    ) -> int:
+        """Returns the number of occurrences later than ``start_dt`` and
+        not later than ``end_dt`` without generating them: in closed form
+        for fixed-length frequencies and by the per-period counts for
+        calendar ones (see :func:`count_calendar_occurrences`).
+        Relative-day and count-limited calendar rules are iterated.
+        """
+        start = self.normalized_now(start_dt)
+        end = self.normalized_now(end_dt)
+        if end <= start:
+            return 0
+
+        progression = self.progression(start)
+        if progression is not None:
+            rrule_params, period, phases = progression
+            if not phases:
+                return 0
+            first, last = progression_bounds(rrule_params, period, phases, start, end)
+            return last - first
+
+        if self.repeats and not self.relative and 'count' not in self.rrule_template:
+            rrule_params = self.rrule_params or self.build_rrule_params(self.start_date(start))
+            return count_calendar_occurrences(rrule_params, start, end)
+
+        return sum(1 for _ in self.occurrences_between(start, end))
+
+    def latest_between(
+        self,
+        since: datetime.datetime,
+        now: datetime.datetime,
+    ) -> t.Optional[datetime.datetime]:
+        """Returns the latest occurrence later than ``since`` and not later
+        than ``now`` (both already normalized) or ``None``.
+        """
+        until = now + datetime.timedelta(seconds=1)
+        for dt in self.anchored(since).reversed_occurrences(until):
+            return dt if dt > since else None
+        return None
+
+    def due_occurrences(
+        self,
+        since: datetime.datetime,
+        now_dt: t.Optional[datetime.datetime] = None,
+        misfire: str = MisfirePolicies.REPLAY,
+        misfire_grace: t.Optional[float] = None,
+    ) -> t.Iterator[datetime.datetime]:
+        """Returns occurrences later than ``since`` and not later than
+        ``now_dt`` (or now) which should be run according to the
+        ``misfire`` policy:
+
+        - ``skip`` — the latest one only, if it's late by not more
+          than ``misfire_grace`` seconds. If it's ``None``, missed
+          occurrences are dropped: the only due one is returned if it
+          isn't late (by more than :data:`SKIP_GRACE`);
+        - ``coalesce`` — the latest one only, however late it is;
+        - ``replay`` — every one late by not more than ``misfire_grace``
+          seconds, or all of them if it's ``None``.
+
+        The schedule is sought directly to the grace window, earlier
+        occurrences are never iterated. Schedules without ``start.on``
+        are evaluated as anchored at ``since``.
+        """
+        if misfire not in MisfirePolicies:
+            raise ValueError('Invalid misfire policy, one of %s expected' % (
+                ', '.join('"%s"' % x for x in MisfirePolicies)
+            ))
+
+        now = self.normalized_now(now_dt)
+        since = self.normalized_now(since)
+        schedule = self.anchored(since)
+
+        if misfire == MisfirePolicies.SKIP and misfire_grace is None:
+            due = list(itertools.islice(itertools.takewhile(
+                lambda dt: dt <= now,
+                (dt for dt in schedule.occurrences(since) if dt > since),
+            ), 2))
+            if len(due) == 1 and (now - due[0]).total_seconds() <= SKIP_GRACE:
+                return iter(due)
+            return iter([])
+
+        window_start = since
+        if misfire_grace is not None and misfire != MisfirePolicies.COALESCE:
+            grace_start = now - datetime.timedelta(seconds=math.floor(misfire_grace) + 1)
+            window_start = max(since, grace_start)
+
+        if misfire != MisfirePolicies.REPLAY:
+            latest = schedule.latest_between(window_start, now)
+            if latest and (
+                misfire_grace is None or
+                misfire == MisfirePolicies.COALESCE or
+                (now - latest).total_seconds() <= misfire_grace
+            ):
+                return iter([latest])
+            return iter([])
+
+        return (
+            dt for dt in itertools.takewhile(
+                lambda dt: dt <= now, schedule.occurrences(window_start),
+            )
+            if dt > window_start and (
+                misfire_grace is None or (now - dt).total_seconds() <= misfire_grace
+            )
+        )
+
+    def next_after(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> t.Optional[datetime.datetime]:
+        """Returns the first occurrence later than ``now_dt``
+        or ``None`` if the schedule is over.
+        """
+        now = self.normalized_now(now_dt)
+        for dt in self.occurrences(now):
+            if dt > now:
+                return dt
+        return None
+
+    def delta(
+        self,
+        now_dt: t.Optional[datetime.datetime] = None,
+    ) -> t.Tuple[int, datetime.datetime]:
+        """Same as :func:`schedule_delta`."""
+        return self.delta_from(self.normalized_now(now_dt))
+
+    def delta_from(
+        self,
+        now: datetime.datetime,
+        now_epoch: t.Optional[int] = None,
+    ) -> t.Tuple[int, datetime.datetime]:
+        """Same as :meth:`delta` for already normalized ``now``.
+
+        ``now_epoch`` is ``now`` as a unix timestamp, it can be passed
+        when evaluating many schedules at the same moment.
+        """
+        if self.phases:
+            # the first occurrence of the anchored fixed-length rule is
+            # always later than ``now``, no need to start the generator
+            if now_epoch is None:
+                now_epoch = int(now.timestamp())
+            elapsed = now_epoch - self.epoch
+            index = progression_index(self.period, self.phases, elapsed)
+            rrule_params = self.rrule_params
+            count = rrule_params.get('count')
+            if count and index >= count:
+                return 0, now
+
+            offset = progression_offset(self.period, self.phases, index)
+            schedule_dt_base = rrule_params['dtstart'] + datetime.timedelta(seconds=offset)
+            until = rrule_params.get('until')
+            if until and schedule_dt_base > until:
+                return 0, now
+
+            return offset - elapsed, schedule_dt_base
+
+        schedule_gen = self.occurrences(now)
+
+        try:
+            schedule_dt_base = next(schedule_gen)
+        except StopIteration:
+            return 0, now
+
+        schedule_seconds = (schedule_dt_base - now).total_seconds()
+
+        if schedule_seconds <= 0:
+            try:
+                schedule_dt_base = next(schedule_gen)
+            except StopIteration:
+                return schedule_seconds, now
+
+        schedule_seconds = (schedule_dt_base - now).total_seconds()
+
+        return math.ceil(schedule_seconds), schedule_dt_base
+
+
 def schedule_parser(
     schedule: dict,
     now_dt: t.Optional[datetime.datetime] = None,
@@ -216,162 +722,475 @@ def schedule_parser(
     If datetime objects are naive, they will be signed with timezone.
     If there is no ``timezone`` — UTC is the default one.
     """
-    schedule = validated_schedule(schedule, getters=getters)
+    yield from compile_schedule(schedule, getters=getters).iter_from(now_dt)
 
-    explicit_tz = schedule.get('timezone', 'UTC')
-    if now_dt:
-        now = normalize_datetime(now_dt, explicit_tz)
-    else:
-        now = just_now(explicit_tz)
 
-    schedule_date = get_in(['start', 'on'], schedule)
-    if schedule_date:
-        schedule_date = normalize_datetime(schedule_date, explicit_tz)
+def rule_period(rrule_params: dict) -> t.Optional[int]:
+    """Returns the length of the rule period in seconds for fixed-length
+    frequencies (weekly and shorter), ``None`` for the calendar ones.
+    """
+    period = FIXED_PERIOD_MAP.get(rrule_params.get('freq'))
+    if period:
+        return period * (rrule_params.get('interval') or 1)
+    return None
+
+
+def progression_index(period: int, phases: t.List[int], elapsed: int) -> int:
+    """Returns the index of the first occurrence of the fixed-length rule
+    described with ``period`` and ``phases`` that is later than
+    ``elapsed`` seconds since ``dtstart``.
+    """
+    if elapsed < 0:
+        return 0
+    cycle, offset = divmod(elapsed, period)
+    return cycle * len(phases) + bisect.bisect_right(phases, offset)
+
+
+def progression_offset(period: int, phases: t.List[int], index: int) -> int:
+    """Returns the occurrence with ``index`` of the fixed-length rule
+    in seconds since ``dtstart``.
+    """
+    cycle, phase = divmod(index, len(phases))
+    return cycle * period + phases[phase]
+
+
+def progression_bounds(
+    rrule_params: dict,
+    period: int,
+    phases: t.List[int],
+    start: datetime.datetime,
+    end: datetime.datetime,
+) -> t.Tuple[int, int]:
+    """Returns the range of indices of the fixed-length rule occurrences
+    later than ``start`` and not later than ``end``, respecting
+    ``count`` and ``until``.
+    """
+    dtstart = rrule_params['dtstart']
+    first = progression_index(period, phases, int((start - dtstart).total_seconds()))
+    last = progression_index(period, phases, int((end - dtstart).total_seconds()))
+
+    until = rrule_params.get('until')
+    if until:
+        last = min(last, progression_index(
+            period, phases, int((until - dtstart).total_seconds()),
+        ))
+
+    count = rrule_params.get('count')
+    if count:
+        last = min(last, count)
+
+    return first, max(first, last)
+
+
+def rrule_phases(rrule_params: dict, period: int) -> t.List[int]:
+    """Returns offsets (in seconds from ``dtstart``) of all occurrences
+    within the first ``period`` seconds of the rule.
+
+    For the fixed-length frequencies every next period repeats the same
+    pattern, so these offsets describe the whole rule.
+    """
+    dtstart = rrule_params['dtstart']
+    params = dissoc(rrule_params, 'count')
+    params['until'] = dtstart + datetime.timedelta(seconds=period - 1)
+    return [int((dt - dtstart).total_seconds()) for dt in rrule(**params)]
+
+
+def frozen_rrule_params(rrule_params: dict) -> dict:
+    """Returns rrule params with all implicit ``dtstart``-based defaults
+    set explicitly, so ``dtstart`` can be moved without changing the rule.
+    """
+    params = dict(rrule_params)
+    dtstart = params['dtstart']
+    freq = params['freq']
+    if params.get('bymonthday') is None and params.get('byweekday') is None:
+        if freq == YEARLY:
+            if params.get('bymonth') is None:
+                params['bymonth'] = dtstart.month
+            params['bymonthday'] = dtstart.day
+        elif freq == MONTHLY:
+            params['bymonthday'] = dtstart.day
+        elif freq == WEEKLY:
+            params['byweekday'] = dtstart.weekday()
+
+    for param, attr, freqs in (
+        ('byhour', 'hour', {YEARLY, MONTHLY, WEEKLY, DAILY}),
+        ('byminute', 'minute', {YEARLY, MONTHLY, WEEKLY, DAILY, HOURLY}),
+        ('bysecond', 'second', {YEARLY, MONTHLY, WEEKLY, DAILY, HOURLY, MINUTELY}),
+    ):
+        if freq in freqs and params.get(param) is None:
+            params[param] = getattr(dtstart, attr)
+
+    return params
+
+
+def seek_rrule_params(
+    rrule_params: dict,
+    now: datetime.datetime,
+) -> dict:
+    """Moves ``dtstart`` of a calendar (monthly or yearly) rule to the
+    beginning of the period containing ``now``.
+
+    Count-limited rules are returned as is: the number of occurrences
+    in the skipped periods is not constant, and replaying them is
+    bounded by ``count`` anyway.
+    """
+    dtstart = rrule_params['dtstart']
+    if rrule_params.get('count') or now <= dtstart:
+        return rrule_params
+
+    # rrule works with the wall time of ``dtstart``
+    wall_now = now.astimezone(datetime.timezone(dtstart.utcoffset()))
+    interval = rrule_params.get('interval') or 1
+    period_start = dtstart.replace(day=1, hour=0, minute=0, second=0)
+    if rrule_params['freq'] == MONTHLY:
+        months = (wall_now.year - dtstart.year) * 12 + wall_now.month - dtstart.month
+        shift = relativedelta(months=months // interval * interval)
+    elif rrule_params['freq'] == YEARLY:
+        years = wall_now.year - dtstart.year
+        shift = relativedelta(years=years // interval * interval)
+        period_start = period_start.replace(month=1)
     else:
-        schedule_date = now
-
-    timeshift_delay = get_in(['start', 'relative_timeshift', 'delay'], schedule)
-    timeshift_type = get_in(['start', 'relative_timeshift', 'time_units'], schedule)
-    if timeshift_delay and timeshift_type:
-        timeshift_modifier = TIMESHIFT_MAP[timeshift_type]
-        schedule_date = schedule_date + timeshift_modifier(timeshift_delay)
-
-    periodical_type = get_in(['periodical', 'repeats'], schedule)
-    if not periodical_type:
-        yield schedule_date
-
-    rrule_params = {'dtstart': schedule_date}
-
-    stop_dt = get_in(['stop', 'on'], schedule)
-    if stop_dt:
-        stop_dt = normalize_datetime(stop_dt, explicit_tz)
-        rrule_params['until'] = stop_dt
-
-    num_repeats = get_in(['stop', 'after_num_repeats'], schedule)
-    is_infinite = get_in(['stop', 'never'], schedule)
-    if num_repeats and not is_infinite:
-        rrule_params['count'] = num_repeats
-
-    if periodical_type:
-        rrule_params['freq'] = PERIODICAL_MAP[periodical_type]
-        context_params = SENSITIVE_ATTRS_MAP[periodical_type]
-        for param in context_params:
-            mapped_param = PERIODICAL_ATTRS_MAP[param]
-            related_param = get_in(['periodical', param], schedule)
-            rrule_params[mapped_param] = related_param
-
-        relative_params = (
-            get_in(['periodical', 'relative_day'], schedule) and
-            get_in(['periodical', 'relative_day_index'], schedule)
+        return rrule_params
+
+    if not shift:
+        return rrule_params
+
+    params = frozen_rrule_params(rrule_params)
+    params['dtstart'] = period_start + shift
+    return params
+
+
+def calendar_period_grid(
+    rrule_params: dict,
+) -> t.Tuple[datetime.datetime, relativedelta]:
+    """Returns the beginning of the first period of a calendar (monthly
+    or yearly) rule and the period length, so the period with ``index``
+    starts at ``base + step * index``.
+    """
+    dtstart = rrule_params['dtstart']
+    interval = rrule_params.get('interval') or 1
+    base = dtstart.replace(day=1, hour=0, minute=0, second=0)
+    if rrule_params['freq'] == MONTHLY:
+        return base, relativedelta(months=interval)
+    return base.replace(month=1), relativedelta(years=interval)
+
+
+def calendar_period_index(rrule_params: dict, dt: datetime.datetime) -> int:
+    """Returns the index of the calendar rule period containing ``dt``,
+    the period containing ``dtstart`` is the first one.
+    """
+    dtstart = rrule_params['dtstart']
+    # rrule works with the wall time of ``dtstart``
+    wall_dt = dt.astimezone(datetime.timezone(dtstart.utcoffset()))
+    interval = rrule_params.get('interval') or 1
+    if rrule_params['freq'] == MONTHLY:
+        months = (wall_dt.year - dtstart.year) * 12 + wall_dt.month - dtstart.month
+        return months // interval
+    return (wall_dt.year - dtstart.year) // interval
+
+
+def calendar_period_occurrences(
+    rrule_params: dict,
+    frozen_params: dict,
+    index: int,
+) -> t.List[datetime.datetime]:
+    """Returns occurrences of the calendar rule within the period with
+    ``index``, ``frozen_params`` are the rule params with implicit
+    defaults set (see :func:`frozen_rrule_params`).
+    """
+    dtstart = rrule_params['dtstart']
+    until = rrule_params.get('until')
+    base, step = calendar_period_grid(rrule_params)
+    period_until = base + step * (index + 1) - datetime.timedelta(seconds=1)
+    if until:
+        period_until = min(period_until, until)
+
+    period_start = max(base + step * index, dtstart)
+    return list(rrule(**dict(frozen_params, dtstart=period_start, until=period_until)))
+
+
+def count_calendar_occurrences(
+    rrule_params: dict,
+    start: datetime.datetime,
+    end: datetime.datetime,
+) -> int:
+    """Returns the number of occurrences of the calendar rule (without
+    ``count``) later than ``start`` and not later than ``end``.
+
+    The number of occurrences within a period depends only on its
+    shape: the length and the weekday of the first day of the month
+    for monthly rules, leap year and its first weekday for yearly ones.
+    So only the boundary periods and one period of every shape are
+    evaluated, the rest are stepped over month by month (or year by
+    year). Windows shorter than the number of the shapes are counted
+    with a single rule started from the first period instead.
+    """
+    dtstart = rrule_params['dtstart']
+    until = rrule_params.get('until')
+    if until and until < end:
+        end = until
+    if end < dtstart or end <= start:
+        return 0
+
+    first = calendar_period_index(rrule_params, max(start, dtstart))
+    last = calendar_period_index(rrule_params, end)
+    frozen_params = frozen_rrule_params(rrule_params)
+    base, step = calendar_period_grid(rrule_params)
+    if last - first < CALENDAR_SHAPES_MAP[rrule_params['freq']]:
+        period_start = max(base + step * first, dtstart)
+        return sum(
+            1 for dt in rrule(**dict(frozen_params, dtstart=period_start, until=end))
+            if dt > start
         )
 
-        schedule_gen = rrule(**rrule_params)
-        for dt in schedule_gen:
-            if dt <= now and not relative_params:
-                continue
+    total = 0
+    for index in {first, last}:
+        total += sum(
+            1 for dt in calendar_period_occurrences(rrule_params, frozen_params, index)
+            if start < dt <= end
+        )
+
+    interval = rrule_params.get('interval') or 1
+    shape_counts = {}
+    for index in range(max(first + 1, 1), last):
+        if rrule_params['freq'] == MONTHLY:
+            year, month = divmod(base.year * 12 + base.month - 1 + index * interval, 12)
+            shape = calendar.monthrange(year, month + 1)
+        else:
+            year = base.year + index * interval
+            shape = (calendar.isleap(year), calendar.weekday(year, 1, 1))
+
+        if shape not in shape_counts:
+            shape_counts[shape] = len(
+                calendar_period_occurrences(rrule_params, frozen_params, index)
+            )
+        total += shape_counts[shape]
+
+    return total
+
+
+def seek_occurrences(
+    rrule_params: dict,
+    now: datetime.datetime,
+    phases: t.Optional[t.List[int]] = None,
+) -> t.Generator[datetime.datetime, None, None]:
+    """Generates occurrences of the rule which are later than ``now``.
+
+    Fixed-length frequencies (weekly and shorter) are an arithmetic
+    progression of the occurrences found in the first period, so
+    the first one after ``now`` is calculated directly, respecting
+    ``count`` and ``until``. Calendar frequencies start from
+    the period containing ``now``.
+
+    Precalculated ``phases`` (see :func:`rrule_phases`) can be passed
+    to avoid building them on every call.
+    """
+    period = rule_period(rrule_params)
+    if not period:
+        for dt in rrule(**seek_rrule_params(rrule_params, now)):
+            if dt > now:
+                yield dt
+        return
+
+    if phases is None:
+        phases = rrule_phases(rrule_params, period)
+    if not phases:
+        return
+
+    dtstart = rrule_params['dtstart']
+    count = rrule_params.get('count')
+    until = rrule_params.get('until')
+    index = progression_index(period, phases, int((now - dtstart).total_seconds()))
+    while count is None or index < count:
+        offset = progression_offset(period, phases, index)
+        dt = dtstart + datetime.timedelta(seconds=offset)
+        if until and dt > until:
+            return
+
+        index += 1
+        yield dt
+
+
+def reverse_seek_occurrences(
+    rrule_params: dict,
+    now: datetime.datetime,
+    phases: t.Optional[t.List[int]] = None,
+) -> t.Generator[datetime.datetime, None, None]:
+    """Generates occurrences of the rule which are earlier than ``now``
+    in the descending order.
+
+    For fixed-length frequencies the index of the last occurrence before
+    ``now`` is calculated directly (see :func:`seek_occurrences`).
+    Calendar frequencies are stepped back period by period, starting
+    from the one containing ``now``. Count-limited calendar rules are
+    replayed forward, which is bounded by ``count``.
+    """
+    dtstart = rrule_params['dtstart']
+    if now <= dtstart:
+        return
+
+    count = rrule_params.get('count')
+    until = rrule_params.get('until')
+    period = rule_period(rrule_params)
+    if period:
+        if phases is None:
+            phases = rrule_phases(rrule_params, period)
+        if not phases:
+            return
+
+        elapsed = math.ceil((now - dtstart).total_seconds()) - 1
+        index = progression_index(period, phases, elapsed)
+        if until:
+            index = min(index, progression_index(
+                period, phases, int((until - dtstart).total_seconds()),
+            ))
+        if count:
+            index = min(index, count)
 
-            if not relative_params:
+        for index in range(index - 1, -1, -1):
+            offset = progression_offset(period, phases, index)
+            yield dtstart + datetime.timedelta(seconds=offset)
+        return
+
+    if count:
+        yield from reversed(list(
+            itertools.takewhile(lambda dt: dt < now, rrule(**rrule_params))
+        ))
+        return
+
+    if until and until < now:
+        now = until + datetime.timedelta(seconds=1)
+
+    frozen_params = frozen_rrule_params(rrule_params)
+    for index in range(calendar_period_index(rrule_params, now), -1, -1):
+        for dt in reversed(calendar_period_occurrences(rrule_params, frozen_params, index)):
+            if dt < now:
                 yield dt
 
-            if relative_params:
-                # basic case for the next planned time shift
-                next_dt = relative_datetime_schedule(dt, schedule)
-                if next_dt <= schedule_date:
-                    continue
 
-                yield next_dt
+def schedule_delta_many(
+    schedules: t.Iterable[t.Union[dict, CompiledSchedule]],
+    now_dt: t.Optional[datetime.datetime] = None,
+    trusted: bool = False,
+) -> t.List[t.Tuple[int, datetime.datetime]]:
+    """Returns the list of :func:`schedule_delta` results for all
+    ``schedules`` evaluated at the same moment, in the same order.
+
+    ``schedules`` can be mixed with already compiled ones. Only these
+    are evaluated faster than 100k per second, schedule dicts are
+    validated and compiled on every call, which is 30-50 times slower
+    (see :func:`validated_schedule` for ``trusted``). The stored
+    schedules evaluated again and again should be compiled once, or by
+    :class:`krolib.cache.ScheduleCache`::
+
+        compiled = [compile_schedule(s) for s in stored_schedules]
+        for seconds, next_dt in schedule_delta_many(compiled):
+            ...
+
+    ``now`` is normalized only once per timezone.
+    """
+    if not now_dt:
+        now_dt = just_now()
+
+    # (now, its epoch) by timezone, a naive ``now_dt`` is a different
+    # moment in each one
+    nows = {}
+    results = []
+    for compiled in schedules:
+        if not isinstance(compiled, CompiledSchedule):
+            compiled = compile_schedule(compiled, trusted=trusted)
+
+        normalized = nows.get(compiled.timezone)
+        if normalized is None:
+            now = compiled.normalized_now(now_dt)
+            now_epoch = int(now.timestamp()) if now.tzinfo else None
+            normalized = nows[compiled.timezone] = (now, now_epoch)
+
+        results.append(compiled.delta_from(*normalized))
+
+    return results
 
 
 def relative_datetime_schedule(schedule_date, schedule_struct):
-    relative_day = get_in(['periodical', 'relative_day'], schedule_struct)
-    relative_day_index = get_in(['periodical', 'relative_day_index'], schedule_struct)
-    repeats_type = get_in(['periodical', 'repeats'], schedule_struct)
-
-    if repeats_type == PeriodicalUnits.MONTHLY:
-        this_month_range = calendar.monthrange(schedule_date.year, schedule_date.month)
-        first_day = schedule_date + relativedelta(day=1)
-        _, last_day = this_month_range
-        last_day = schedule_date + relativedelta(day=last_day)
-    elif repeats_type == PeriodicalUnits.YEARLY:
-        last_month_range = calendar.monthrange(schedule_date.year, 12)
-        first_day = schedule_date + relativedelta(day=1, month=1)
-        _, last_day = last_month_range
-        last_day = schedule_date + relativedelta(day=last_day, month=12)
-
-    if relative_day == RelativeUnits.DAY:
-        if relative_day_index == RelativeIndexUnits.FIRST:
-            schedule_date = first_day
-        elif relative_day_index == RelativeIndexUnits.SECOND:
-            schedule_date = first_day + relativedelta(day=2)
-        elif relative_day_index == RelativeIndexUnits.THIRD:
-            schedule_date = first_day + relativedelta(day=3)
-        elif relative_day_index == RelativeIndexUnits.FOURTH:
-            schedule_date = first_day + relativedelta(day=4)
-        elif relative_day_index == RelativeIndexUnits.LAST:
-            schedule_date = last_day
-
-    elif relative_day in RELATIVE_DAY_MAP:
-        weekday_modifier = RELATIVE_DAY_MAP[relative_day]
-        if relative_day_index in {
-            RelativeIndexUnits.FIRST,
-            RelativeIndexUnits.SECOND,
-            RelativeIndexUnits.THIRD,
-            RelativeIndexUnits.FOURTH,
-        }:
-            modifier_shift_map = {
-                RelativeIndexUnits.FIRST: +1,
-                RelativeIndexUnits.SECOND: +2,
-                RelativeIndexUnits.THIRD: +3,
-                RelativeIndexUnits.FOURTH: +4,
-            }
-            base_date = first_day
-        elif relative_day_index in {RelativeIndexUnits.LAST}:
-            modifier_shift_map = {
-                RelativeIndexUnits.LAST: -1,
-            }
-            base_date = last_day
+    return resolve_relative_day(
+        schedule_date,
+        get_in(['periodical', 'repeats'], schedule_struct),
+        get_in(['periodical', 'relative_day'], schedule_struct),
+        get_in(['periodical', 'relative_day_index'], schedule_struct),
+    )
 
-        schedule_date = base_date + relativedelta(
-            weekday=weekday_modifier(modifier_shift_map[relative_day_index])
-        )
 
-    elif relative_day in {RelativeUnits.WEEKDAY, RelativeUnits.WEEKEND}:
-        if relative_day == RelativeUnits.WEEKDAY:
-            is_proper_daytype = is_weekday
-        elif relative_day == RelativeUnits.WEEKEND:
-            is_proper_daytype = is_weekend
-
-        if relative_day_index in {
-            RelativeIndexUnits.FIRST,
-            RelativeIndexUnits.SECOND,
-            RelativeIndexUnits.THIRD,
-            RelativeIndexUnits.FOURTH,
-        }:
-            days_range = range(1, last_day.day + 1)
-            index_unit_slice_map = {
-                RelativeIndexUnits.FIRST: 1,
-                RelativeIndexUnits.SECOND: 2,
-                RelativeIndexUnits.THIRD: 3,
-                RelativeIndexUnits.FOURTH: 4,
-            }
-            base_date = first_day
-        elif relative_day_index in {RelativeIndexUnits.LAST}:
-            days_range = range(last_day.day, 0, -1)
-            index_unit_slice_map = {
-                RelativeIndexUnits.LAST: 1,
-            }
-            base_date = last_day
+def resolve_relative_day(
+    schedule_date: datetime.datetime,
+    repeats: str,
+    relative_day: str,
+    relative_day_index: str,
+) -> datetime.datetime:
+    """Moves ``schedule_date`` to the relative day of its month for
+    monthly schedules, of its year for yearly ones (the first ones are
+    looked up in January, the last ones in December), keeping the time.
+    """
+    if repeats == PeriodicalUnits.MONTHLY:
+        month = schedule_date.month
+    elif repeats == PeriodicalUnits.YEARLY:
+        month = 12 if relative_day_index == RelativeIndexUnits.LAST else 1
+    else:
+        return schedule_date
+
+    day = relative_days_table(schedule_date.year, month).get((relative_day, relative_day_index))
+    if day is None:
+        return schedule_date
+    return schedule_date.replace(month=month, day=day)
 
-        weekday_pos = 0
-        for day_num in days_range:
-            maybe_this_dt = base_date + relativedelta(day=day_num)
-            if is_proper_daytype(maybe_this_dt):
-                weekday_pos += 1
-            if index_unit_slice_map[relative_day_index] == weekday_pos:
-                schedule_date = maybe_this_dt
-                break
 
-    return schedule_date
+@functools.lru_cache(maxsize=RELATIVE_DAYS_CACHE_SIZE)
+def relative_days_table(year: int, month: int) -> t.Dict[t.Tuple[str, str], int]:
+    """Returns day numbers of all the relative days of the month by
+    ``(relative_day, relative_day_index)``, calculated directly from
+    the weekday of its first day and its length.
+    """
+    first_weekday, days = calendar.monthrange(year, month)
+    last_weekday = (first_weekday + days - 1) % 7
+    first_saturday = 1 + (SA.weekday - first_weekday) % 7
+    table = {}
+    for relative_day_index, position in RELATIVE_INDEX_MAP.items():
+        table[RelativeUnits.DAY, relative_day_index] = position
+
+        for relative_day, weekday in RELATIVE_DAY_MAP.items():
+            table[relative_day, relative_day_index] = (
+                1 + (weekday.weekday - first_weekday) % 7 + 7 * (position - 1)
+            )
+
+        if first_weekday < SA.weekday:
+            # the rest of the first week days, then a weekend is skipped
+            first_week_days = SA.weekday - first_weekday
+            day = position if position <= first_week_days else position + 2
+        else:
+            first_monday = 1 + 7 - first_weekday
+            day = first_monday + position - 1
+        table[RelativeUnits.WEEKDAY, relative_day_index] = day
+
+        weekend_position = position - 1
+        if first_weekday == SU.weekday:
+            # the month starts with a lone sunday
+            weekend_position -= 1
+        if weekend_position < 0:
+            day = 1
+        else:
+            day = first_saturday + 7 * (weekend_position // 2) + weekend_position % 2
+        table[RelativeUnits.WEEKEND, relative_day_index] = day
+
+    last = RelativeIndexUnits.LAST
+    table[RelativeUnits.DAY, last] = days
+    for relative_day, weekday in RELATIVE_DAY_MAP.items():
+        table[relative_day, last] = days - (last_weekday - weekday.weekday) % 7
+    table[RelativeUnits.WEEKDAY, last] = days - max(last_weekday - FR.weekday, 0)
+    if last_weekday >= SA.weekday:
+        table[RelativeUnits.WEEKEND, last] = days
+    else:
+        table[RelativeUnits.WEEKEND, last] = days - last_weekday - 1
+
+    return table
 
 
 def schedule_delta(
@@ -379,26 +1198,74 @@ def schedule_delta(
     now_dt: t.Optional[datetime.datetime] = None,
     getters: t.Optional[t.List[dict]] = None,
 ) -> t.Tuple[int, datetime.datetime]:
-    schedule_gen = schedule_parser(schedule, now_dt=now_dt, getters=getters)
-    explicit_tz = schedule.get('timezone', 'UTC')
-    if now_dt:
-        now = normalize_datetime(now_dt, explicit_tz)
-    else:
-        now = just_now(explicit_tz)
+    return compile_schedule(schedule, getters=getters).delta(now_dt)
 
-    try:
-        schedule_dt_base = next(schedule_gen)
-    except StopIteration:
-        return 0, now
 
-    schedule_seconds = (schedule_dt_base - now).total_seconds()
+def previous_before(
+    schedule: dict,
+    now_dt: t.Optional[datetime.datetime] = None,
+    getters: t.Optional[t.List[dict]] = None,
+) -> t.Optional[datetime.datetime]:
+    """Returns the latest occurrence of ``schedule`` earlier than
+    ``now_dt`` (or now) or ``None`` if there is no such::
 
-    if schedule_seconds <= 0:
-        try:
-            schedule_dt_base = next(schedule_gen)
-        except StopIteration:
-            return schedule_seconds, now
+        last_fired = previous_before(schedule)
+
+    Use :meth:`CompiledSchedule.iter_before` to iterate backwards.
+    """
+    return compile_schedule(schedule, getters=getters).previous_before(now_dt)
+
+
+def occurrences_between(
+    schedule: dict,
+    start_dt: datetime.datetime,
+    end_dt: datetime.datetime,
+    getters: t.Optional[t.List[dict]] = None,
+) -> t.Generator[datetime.datetime, None, None]:
+    """Generates occurrences of ``schedule`` later than ``start_dt`` and
+    not later than ``end_dt``::
+
+        for dt in occurrences_between(schedule, month_start, month_end):
+            ...
+    """
+    yield from compile_schedule(schedule, getters=getters).occurrences_between(start_dt, end_dt)
 
-    schedule_seconds = (schedule_dt_base - now).total_seconds()
 
-    return math.ceil(schedule_seconds), schedule_dt_base
+def count_between(
+    schedule: dict,
+    start_dt: datetime.datetime,
+    end_dt: datetime.datetime,
+    getters: t.Optional[t.List[dict]] = None,
+) -> int:
+    """Returns the number of occurrences of ``schedule`` later than
+    ``start_dt`` and not later than ``end_dt``, see
+    :meth:`CompiledSchedule.count_between`.
+    """
+    return compile_schedule(schedule, getters=getters).count_between(start_dt, end_dt)
+
+
+def merge_schedules(
+    schedules: t.Mapping[t.Hashable, t.Union[dict, CompiledSchedule]],
+    start_dt: datetime.datetime,
+    end_dt: datetime.datetime,
+) -> t.Iterator[t.Tuple[datetime.datetime, t.Hashable]]:
+    """Returns a single stream of ``(fire_dt, schedule_id)`` of all
+    ``schedules`` (by their ids) occurrences later than ``start_dt``
+    and not later than ``end_dt``, sorted by the fire time::
+
+        timeline = merge_schedules(stored_schedules, day_start, day_end)
+        for fire_dt, schedule_id in itertools.islice(timeline, 100):
+            ...
+
+    Occurrences are pulled from the schedules as far as the stream is
+    read, only the next one of every schedule is kept. Simultaneous
+    occurrences come in the order of ``schedules``.
+    """
+    streams = []
+    for schedule_id, compiled in schedules.items():
+        if not isinstance(compiled, CompiledSchedule):
+            compiled = compile_schedule(compiled)
+        occurrences = compiled.occurrences_between(start_dt, end_dt)
+        streams.append(zip(occurrences, itertools.repeat(schedule_id)))
+
+    return heapq.merge(*streams, key=operator.itemgetter(0))
@@ -0,0 +1,271 @@
+"""Compact binary encoding of validated schedules.
+
+:func:`dumps` validates a schedule and packs it into a versioned struct
+layout: enum values are one byte codes, integers are fixed width and
+datetimes are int64 microseconds since the epoch with their tzinfo.
+:func:`loads` returns the same validated schedule without validating
+it again, so it can be compiled as trusted::
+
+    data = dumps(schedule)  # tens of bytes
+    compiled = compile_schedule(loads(data), trusted=True)
+
+Layout of the version 1 (little-endian): ``b'KS'``, version byte, masks
+of the present fields and of the ``None`` ones (``uint32`` each, bits in
+:data:`FIELDS` order), fixed-width values of the present fields which
+aren't ``None``, then the variable-length parts (weekday lists, timezone
+names and fixed UTC offsets) in the same order.
+
+Timezones are kept as names, the indexes of the pytz zones list aren't
+stable between pytz releases.
+"""
+import datetime
+import functools
+import struct
+import typing as t
+
+import pytz
+
+from .parser import CompiledSchedule, validated_schedule
+from .structs import TimeUnits, PeriodicalUnits, RelativeUnits, RelativeIndexUnits
+from .utils import cached_timezone, zone_offset_table
+
+
+MAGIC = b'KS'
+VERSION = 1
+
+HEADER = struct.Struct('<2sBII')
+LENGTH = struct.Struct('<B')
+OFFSET = struct.Struct('<i')
+
+NAIVE_EPOCH = datetime.datetime(1970, 1, 1)
+UTC_EPOCH = pytz.utc.localize(NAIVE_EPOCH)
+
+# kinds of datetimes, with their tzinfo kept in the variable-length part
+NAIVE, PYTZ_LOCALIZED, PYTZ_ZONE, FIXED_OFFSET = range(4)
+
+# codes are the indexes, new units have to be appended
+ENUM_UNITS = {
+    'time_units': tuple(TimeUnits),
+    'repeats': tuple(PeriodicalUnits),
+    'relative_day': tuple(RelativeUnits),
+    'relative_day_index': tuple(RelativeIndexUnits),
+}
+ENUM_CODES = {
+    key: {unit: code for code, unit in enumerate(units)}
+    for key, units in ENUM_UNITS.items()
+}
+
+# paths of the schedule values and their kinds, sections are dicts
+FIELDS = (
+    (('start',), 'section'),
+    (('start', 'on'), 'datetime'),
+    (('start', 'relative_timeshift'), 'section'),
+    (('start', 'relative_timeshift', 'delay'), 'uint'),
+    (('start', 'relative_timeshift', 'time_units'), 'enum'),
+    (('stop',), 'section'),
+    (('stop', 'never'), 'bool'),
+    (('stop', 'on'), 'datetime'),
+    (('stop', 'after_num_repeats'), 'uint'),
+    (('periodical',), 'section'),
+    (('periodical', 'repeats'), 'enum'),
+    (('periodical', 'every'), 'uint'),
+    (('periodical', 'month'), 'byte'),
+    (('periodical', 'day'), 'byte'),
+    (('periodical', 'weekday'), 'list'),
+    (('periodical', 'hour'), 'byte'),
+    (('periodical', 'minute'), 'byte'),
+    (('periodical', 'second'), 'byte'),
+    (('periodical', 'relative_day'), 'enum'),
+    (('periodical', 'relative_day_index'), 'enum'),
+    (('timezone',), 'str'),
+)
+
+KIND_FORMATS = {
+    'section': '',
+    'datetime': 'qB',
+    'uint': 'I',
+    'enum': 'B',
+    'bool': '?',
+    'byte': 'B',
+    'list': 'B',
+    'str': 'B',
+}
+
+
+@functools.lru_cache(maxsize=None)
+def decoding_plan(present: int, nulls: int) -> t.Tuple[struct.Struct, tuple]:
+    """Returns the struct of the fixed-width values of the ``present``
+    fields which aren't ``nulls``, and ``(parent, key, kind)`` steps of
+    decoding them. Parents are indexes of the decoded sections, the
+    schedule itself is the first one.
+    """
+    formats = []
+    steps = []
+    sections = {(): 0}
+    for bit, (path, kind) in enumerate(FIELDS):
+        if not present >> bit & 1:
+            continue
+
+        if kind == 'section':
+            sections[path] = len(sections)
+        elif nulls >> bit & 1:
+            kind = None
+        else:
+            formats.append(KIND_FORMATS[kind])
+        steps.append((sections[path[:-1]], path[-1], kind))
+
+    return struct.Struct('<' + ''.join(formats)), tuple(steps)
+
+
+def epoch_micros(dt: datetime.datetime, epoch: datetime.datetime) -> int:
+    delta = dt - epoch
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def encode_datetime(dt: datetime.datetime) -> t.Tuple[int, int, bytes]:
+    """Returns microseconds, kind and the variable-length part of ``dt``
+    which is decoded to the equal datetime with the same tzinfo.
+    """
+    tzinfo = dt.tzinfo
+    if tzinfo is None:
+        return epoch_micros(dt, NAIVE_EPOCH), NAIVE, b''
+
+    wall = epoch_micros(dt.replace(tzinfo=None), NAIVE_EPOCH)
+    if isinstance(tzinfo, pytz.BaseTzInfo):
+        zone = encode_str(tzinfo.zone)
+        micros = epoch_micros(dt, UTC_EPOCH)
+        if decode_datetime(micros, PYTZ_LOCALIZED, tzinfo.zone).tzinfo is tzinfo:
+            return micros, PYTZ_LOCALIZED, zone
+        # not localized, e.g. the zone passed to the datetime constructor
+        if pytz.timezone(tzinfo.zone) is tzinfo:
+            return wall, PYTZ_ZONE, zone
+    elif type(tzinfo) is datetime.timezone:
+        offset = tzinfo.utcoffset(None)
+        if not offset.microseconds and tzinfo == datetime.timezone(offset):
+            return wall, FIXED_OFFSET, OFFSET.pack(int(offset.total_seconds()))
+
+    raise ValueError('Invalid datetime timezone, pytz or fixed offset one expected')
+
+
+def decode_datetime(micros: int, kind: int, extra) -> datetime.datetime:
+    if kind == PYTZ_LOCALIZED:
+        # same as astimezone, the offset is looked up in the table
+        table = zone_offset_table(extra)
+        index = table.index(micros // 1000000)
+        micros += table.offsets[index] * 1000000
+        return (NAIVE_EPOCH + datetime.timedelta(microseconds=micros)).replace(
+            tzinfo=table.tzinfos[index],
+        )
+
+    dt = NAIVE_EPOCH + datetime.timedelta(microseconds=micros)
+    if kind == PYTZ_ZONE:
+        return dt.replace(tzinfo=cached_timezone(extra))
+    if kind == FIXED_OFFSET:
+        return dt.replace(tzinfo=datetime.timezone(datetime.timedelta(seconds=extra)))
+    return dt
+
+
+def encode_str(value: str) -> bytes:
+    data = value.encode()
+    return LENGTH.pack(len(data)) + data
+
+
+def dumps(schedule: t.Union[dict, CompiledSchedule]) -> bytes:
+    """Returns the binary form of the validated ``schedule``."""
+    if isinstance(schedule, CompiledSchedule):
+        schedule = schedule.schedule
+    else:
+        schedule = validated_schedule(schedule, trusted=True)
+
+    present = nulls = 0
+    values = []
+    tail = []
+    for bit, (path, kind) in enumerate(FIELDS):
+        parent = schedule
+        for key in path[:-1]:
+            parent = parent.get(key)
+            if parent is None:
+                break
+        if parent is None or path[-1] not in parent:
+            continue
+
+        present |= 1 << bit
+        value = parent[path[-1]]
+        if value is None:
+            nulls |= 1 << bit
+        elif kind == 'datetime':
+            micros, dt_kind, extra = encode_datetime(value)
+            values.extend((micros, dt_kind))
+            tail.append(extra)
+        elif kind == 'enum':
+            values.append(ENUM_CODES[path[-1]][value])
+        elif kind == 'list':
+            values.append(len(value))
+            tail.append(bytes(value))
+        elif kind == 'str':
+            data = value.encode()
+            values.append(len(data))
+            tail.append(data)
+        elif kind != 'section':
+            values.append(value)
+
+    try:
+        body = decoding_plan(present, nulls)[0].pack(*values)
+    except struct.error:
+        raise ValueError('Invalid schedule value, out of the binary format range')
+    return HEADER.pack(MAGIC, VERSION, present, nulls) + body + b''.join(tail)
+
+
+def loads(data: bytes) -> dict:
+    """Returns the validated schedule encoded by :func:`dumps`."""
+    try:
+        return decode_schedule(data)
+    except (struct.error, IndexError, KeyError, OverflowError, UnicodeDecodeError):
+        raise ValueError('Invalid schedule data, truncated or corrupted')
+
+
+def decode_schedule(data: bytes) -> dict:
+    magic, version, present, nulls = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Invalid schedule data, version %d expected' % VERSION)
+
+    body, steps = decoding_plan(present, nulls)
+    values = iter(body.unpack_from(data, HEADER.size))
+    offset = HEADER.size + body.size
+
+    schedule = {}
+    sections = [schedule]
+    for parent, key, kind in steps:
+        if kind is None:
+            value = None
+        elif kind == 'section':
+            value = {}
+            sections.append(value)
+        elif kind == 'datetime':
+            micros, dt_kind = next(values), next(values)
+            extra = None
+            if dt_kind == FIXED_OFFSET:
+                extra, = OFFSET.unpack_from(data, offset)
+                offset += OFFSET.size
+            elif dt_kind != NAIVE:
+                length = data[offset]
+                extra = data[offset + 1:offset + 1 + length].decode()
+                offset += 1 + length
+            value = decode_datetime(micros, dt_kind, extra)
+        elif kind == 'enum':
+            value = ENUM_UNITS[key][next(values)]
+        elif kind == 'list':
+            length = next(values)
+            value = list(data[offset:offset + length])
+            offset += length
+        elif kind == 'str':
+            length = next(values)
+            value = data[offset:offset + length].decode()
+            offset += length
+        else:
+            value = next(values)
+        sections[parent][key] = value
+
+    if offset != len(data):
+        raise ValueError('Invalid schedule data, truncated or corrupted')
+    return schedule
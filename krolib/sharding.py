@@ -0,0 +1,371 @@
+"""Dispatching of jobs partitioned across processes and nodes.
+
+Jobs are mapped to a fixed number of shards by a consistent
+:class:`HashRing` of their ids, and every :class:`ShardedDispatcher`
+fires only the jobs of the shards it holds leases on. Leases are kept
+in a shared :class:`LeaseStore` and renewed every third of their
+``ttl``, so the shards of a dead worker are taken over by the live
+ones within ``ttl`` and a third of it. Shards are balanced evenly
+between the live workers::
+
+    dispatcher = ShardedDispatcher(SQLiteLeaseStore('/shared/leases.sqlite'))
+    dispatcher.add_job(some_coroutine, schedule, job_id='report')
+    dispatcher.start()
+
+Every worker registers the same jobs, with the ids which are the same
+in all of them (import paths of the functions by default). Schedules
+have to be anchored with ``start.on`` to fire at the same moments in
+all the workers. Occurrences since the last lease renewal of a taken
+over shard are handled by the misfire policies of its jobs, so they
+may be run twice.
+"""
+import asyncio
+import bisect
+import datetime
+import hashlib
+import math
+import os
+import socket
+import sqlite3
+import time
+import typing as t
+import uuid
+
+from krolib.asyncio import Dispatcher, Job
+from krolib.cache import ScheduleCache
+from krolib.parser import CompiledSchedule
+from krolib.stores import func_reference
+
+
+DEFAULT_SHARDS = 64
+DEFAULT_REPLICAS = 64
+
+
+def stable_hash(value: t.Hashable) -> int:
+    """Returns 64-bit hash of ``repr(value)``, the same in all processes
+    unlike the builtin :func:`hash` of strings.
+    """
+    digest = hashlib.blake2b(repr(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def default_owner() -> str:
+    return '%s:%d:%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+
+class HashRing:
+    """Consistent hashing of keys to ``nodes``, each one placed at
+    ``replicas`` points of the ring, so adding or removing a node moves
+    only the keys of its neighbours.
+    """
+
+    __slots__ = ('nodes', 'points', 'owners')
+
+    def __init__(self, nodes: t.Iterable[t.Hashable], replicas: int = DEFAULT_REPLICAS):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError('Invalid ring, at least one node expected')
+
+        ring = sorted(
+            (stable_hash((node, replica)), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self.points = [point for point, _ in ring]
+        self.owners = [node for _, node in ring]
+
+    def __repr__(self):
+        return '<HashRing nodes=%d>' % len(self.nodes)
+
+    def node(self, key: t.Hashable) -> t.Hashable:
+        index = bisect.bisect(self.points, stable_hash(key))
+        return self.owners[index % len(self.owners)]
+
+
+class LeaseStore:
+    """Interface of the shared stores of shard leases. Timestamps are
+    unix ones, leases are valid until their ``expires_at``.
+    """
+
+    def state(self, now: float) -> t.Tuple[t.Dict[int, str], t.Set[str]]:
+        """Returns owners of the valid leases by shards and the live
+        owners (renewed their membership within the ttl).
+        """
+        raise NotImplementedError
+
+    def acquire(
+        self,
+        owner: str,
+        shards: t.Iterable[int],
+        ttl: float,
+        now: float,
+    ) -> t.Dict[int, t.Optional[float]]:
+        """Atomically renews the membership of ``owner`` and the leases
+        of ``shards`` it holds or which are free (never held, expired or
+        released). Returns the acquired shards with the time of their
+        last renewal before (``None`` if they were never held).
+        """
+        raise NotImplementedError
+
+    def release(self, owner: str, shards: t.Iterable[int], now: float):
+        """Makes the leases of ``shards`` held by ``owner`` free."""
+        raise NotImplementedError
+
+    def leave(self, owner: str, now: float):
+        """Releases all the leases of ``owner`` and drops its membership."""
+        raise NotImplementedError
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """Reference :class:`LeaseStore` in the SQLite ``table`` of
+    ``database``, shared by the processes of a single host (or by the
+    nodes of a network filesystem with working locks). Acquiring locks
+    the database for writing for the whole transaction.
+    """
+
+    def __init__(self, database: str = ':memory:', table: str = 'krolib_leases'):
+        if not table.isidentifier():
+            raise ValueError('Invalid table name, an identifier expected')
+
+        self.table = table
+        # transactions are managed explicitly
+        self.connection = sqlite3.connect(database, timeout=30.0, isolation_level=None)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS %s ('
+            'shard INTEGER PRIMARY KEY, '
+            'owner TEXT NOT NULL, '
+            'renewed_at REAL NOT NULL, '
+            'expires_at REAL NOT NULL)' % table
+        )
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS %s_owners ('
+            'owner TEXT PRIMARY KEY, '
+            'expires_at REAL NOT NULL)' % table
+        )
+
+    def state(self, now: float) -> t.Tuple[t.Dict[int, str], t.Set[str]]:
+        leases = self.connection.execute(
+            'SELECT shard, owner FROM %s WHERE expires_at > ?' % self.table, (now,),
+        ).fetchall()
+        owners = self.connection.execute(
+            'SELECT owner FROM %s_owners WHERE expires_at > ?' % self.table, (now,),
+        ).fetchall()
+        return dict(leases), {owner for owner, in owners}
+
+    def acquire(
+        self,
+        owner: str,
+        shards: t.Iterable[int],
+        ttl: float,
+        now: float,
+    ) -> t.Dict[int, t.Optional[float]]:
+        shards = set(shards)
+        acquired = {}
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = self.connection.execute(
+                'SELECT shard, owner, renewed_at, expires_at FROM %s' % self.table,
+            ).fetchall()
+            for shard, holder, renewed_at, expires_at in rows:
+                if shard in shards:
+                    shards.discard(shard)
+                    if holder == owner or expires_at <= now:
+                        acquired[shard] = renewed_at
+            acquired.update(dict.fromkeys(shards))
+
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO %s VALUES (?, ?, ?, ?)' % self.table,
+                ((shard, owner, now, now + ttl) for shard in acquired),
+            )
+            self.connection.execute(
+                'INSERT OR REPLACE INTO %s_owners VALUES (?, ?)' % self.table,
+                (owner, now + ttl),
+            )
+            self.connection.execute(
+                'DELETE FROM %s_owners WHERE expires_at <= ?' % self.table, (now,),
+            )
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+        return acquired
+
+    def release(self, owner: str, shards: t.Iterable[int], now: float):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany(
+                'UPDATE %s SET renewed_at = ?, expires_at = ? '
+                'WHERE shard = ? AND owner = ?' % self.table,
+                ((now, now, shard, owner) for shard in shards),
+            )
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def leave(self, owner: str, now: float):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.execute(
+                'UPDATE %s SET renewed_at = ?, expires_at = ? '
+                'WHERE owner = ? AND expires_at > ?' % self.table,
+                (now, now, owner, now),
+            )
+            self.connection.execute(
+                'DELETE FROM %s_owners WHERE owner = ?' % self.table, (owner,),
+            )
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+
+class ShardedDispatcher(Dispatcher):
+    """:class:`krolib.asyncio.Dispatcher` firing only the jobs of the
+    shards leased by its ``owner`` in ``lease_store``, out of ``shards``
+    ones. Jobs of the other shards are kept registered and loaded when
+    their shards are acquired, see :mod:`krolib.sharding`.
+
+    Shards are balanced every third of ``ttl`` seconds: the ones over
+    the fair share (the number of shards divided by the number of live
+    workers) are released and the free ones are acquired up to it.
+    """
+
+    def __init__(
+        self,
+        lease_store: LeaseStore,
+        owner: t.Optional[str] = None,
+        shards: int = DEFAULT_SHARDS,
+        ttl: float = 15.0,
+        loop: t.Optional[asyncio.AbstractEventLoop] = None,
+        max_concurrency: t.Optional[int] = None,
+        cache: t.Optional[ScheduleCache] = None,
+    ):
+        if shards < 1:
+            raise ValueError('Invalid number of shards, a positive integer expected')
+        if ttl <= 0:
+            raise ValueError('Invalid lease ttl, a positive number expected')
+
+        super().__init__(loop=loop, max_concurrency=max_concurrency, cache=cache)
+        self.lease_store = lease_store
+        self.owner = owner or default_owner()
+        self.shards = shards
+        self.ttl = ttl
+        self.ring = HashRing(range(shards))
+        # registered jobs params by shards and ids
+        self.specs = {}
+        self.owned = set()
+        self._balance_timer = None
+        self._leased_until = 0.0
+
+    def add_job(
+        self,
+        func: t.Callable[..., t.Awaitable],
+        schedule: t.Union[dict, CompiledSchedule],
+        args: tuple = (),
+        kwargs: t.Optional[dict] = None,
+        job_id: t.Optional[t.Hashable] = None,
+        getters: t.Optional[t.List[dict]] = None,
+        **params,
+    ) -> t.Optional[Job]:
+        """Same as :meth:`krolib.asyncio.Dispatcher.add_job`, returns the
+        job if its shard is owned. ``job_id`` is the import path of
+        ``func`` by default.
+        """
+        if job_id is None:
+            job_id = func_reference(func)
+        if not isinstance(schedule, CompiledSchedule):
+            schedule = self.cache.compile(schedule, getters=getters)
+
+        shard = self.ring.node(job_id)
+        jobs = self.specs.setdefault(shard, {})
+        if job_id in jobs:
+            raise KeyError('Job %r is already registered' % (job_id,))
+
+        jobs[job_id] = (func, schedule, dict(params, args=args, kwargs=kwargs))
+        if shard in self.owned:
+            return super().add_job(func, schedule, job_id=job_id, **jobs[job_id][2])
+        return None
+
+    def remove_job(self, job_id: t.Hashable) -> t.Optional[Job]:
+        """Removes the job, returns it if its shard is owned."""
+        self.specs.get(self.ring.node(job_id), {}).pop(job_id)
+        if job_id in self.jobs:
+            return super().remove_job(job_id)
+        return None
+
+    def start(self):
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        self.balance()
+        super().start()
+        self._balance_timer = self.loop.call_later(self.ttl / 3, self._rebalance)
+
+    def stop(self):
+        """Stops firing and releases the owned shards for the other
+        workers.
+        """
+        super().stop()
+        if self._balance_timer:
+            self._balance_timer.cancel()
+        self._balance_timer = None
+
+        self.lease_store.leave(self.owner, time.time())
+        for shard in list(self.owned):
+            self._unload_shard(shard)
+
+    def balance(self):
+        """Renews the leases of the owned shards and rebalances them."""
+        now = time.time()
+        leases, owners = self.lease_store.state(now)
+        owners.add(self.owner)
+        fair = math.ceil(self.shards / len(owners))
+
+        held = sorted(shard for shard, owner in leases.items() if owner == self.owner)
+        extra = held[fair:]
+        if extra:
+            self.lease_store.release(self.owner, extra, now)
+
+        # workers try the free shards in different orders
+        free = sorted(
+            (shard for shard in range(self.shards) if shard not in leases),
+            key=lambda shard: stable_hash((self.owner, shard)),
+        )
+        wanted = held[:fair] + free[:max(fair - len(held), 0)]
+        acquired = self.lease_store.acquire(self.owner, wanted, self.ttl, now)
+        self._leased_until = now + self.ttl
+
+        for shard in self.owned - acquired.keys():
+            self._unload_shard(shard)
+        for shard, renewed_at in acquired.items():
+            if shard not in self.owned:
+                self._load_shard(shard, renewed_at)
+
+    def _fire(self):
+        # leases may expire while the loop is blocked, the shards taken
+        # over by the other workers mustn't be fired
+        if time.time() >= self._leased_until:
+            self.balance()
+        super()._fire()
+
+    def _rebalance(self):
+        self.balance()
+        self._balance_timer = self.loop.call_later(self.ttl / 3, self._rebalance)
+
+    def _load_shard(self, shard: int, renewed_at: t.Optional[float]):
+        """Adds the jobs of the acquired shard, the taken over ones are
+        due since its last renewal by the previous owner.
+        """
+        self.owned.add(shard)
+        for job_id, (func, schedule, params) in self.specs.get(shard, {}).items():
+            if renewed_at is not None:
+                params = dict(params, last_run=datetime.datetime.fromtimestamp(
+                    renewed_at, datetime.timezone.utc,
+                ))
+            super().add_job(func, schedule, job_id=job_id, **params)
+
+    def _unload_shard(self, shard: int):
+        self.owned.discard(shard)
+        for job_id in self.specs.get(shard, ()):
+            if job_id in self.jobs:
+                super().remove_job(job_id)
@@ -0,0 +1,184 @@
+"""Persistent stores of scheduled jobs.
+
+A store keeps every job with its validated schedule and the precomputed
+time of the next occurrence, indexed, so a restarted
+:class:`krolib.asyncio.Dispatcher` loads only the jobs due soon and
+pages the later ones in lazily, instead of evaluating all the stored
+schedules::
+
+    store = SQLiteJobStore('jobs.sqlite')
+    dispatcher = Dispatcher(store=store)
+    dispatcher.add_stored_job(send_report, schedule, job_id='report')
+    dispatcher.start()
+
+Functions of the stored jobs are referenced by their import paths, so
+they have to be defined at the module level.
+"""
+import collections
+import importlib
+import sqlite3
+import typing as t
+
+from krolib import serialization
+
+
+StoredJob = collections.namedtuple(
+    'StoredJob', [
+        'job_id',
+        'func',
+        'schedule',
+        'next_fire_at',
+        'last_run',
+        'misfire',
+        'misfire_grace',
+    ]
+)
+
+STORED_JOB_COLUMNS = ', '.join(StoredJob._fields)
+
+
+def func_reference(func: t.Callable) -> str:
+    """Returns import path of ``func`` as ``module:qualname``."""
+    qualname = getattr(func, '__qualname__', '')
+    if not qualname or '<' in qualname:
+        raise ValueError('Invalid job function, a module level function expected')
+    return '%s:%s' % (func.__module__, qualname)
+
+
+def resolve_func(reference: str) -> t.Callable:
+    """Imports the function referenced by :func:`func_reference`."""
+    module_name, _, qualname = reference.partition(':')
+    func = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        func = getattr(func, name)
+    return func
+
+
+class JobStore:
+    """Interface of the job stores. Jobs are :class:`StoredJob` with
+    unix timestamps of ``next_fire_at`` (``None`` if the schedule is
+    over) and ``last_run`` (of the last fire or the registration), and
+    the misfire options of :class:`krolib.asyncio.Job`.
+    """
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, job: StoredJob):
+        """Adds or replaces the job with the same ``job_id``."""
+        raise NotImplementedError
+
+    def get(self, job_id: t.Hashable) -> t.Optional[StoredJob]:
+        raise NotImplementedError
+
+    def remove(self, job_id: t.Hashable):
+        raise NotImplementedError
+
+    def update_many(self, updates: t.Iterable[t.Tuple[t.Hashable, t.Optional[float], float]]):
+        """Sets ``next_fire_at`` and ``last_run`` of the jobs by
+        ``(job_id, next_fire_at, last_run)`` tuples.
+        """
+        raise NotImplementedError
+
+    def due(
+        self,
+        until: float,
+        after: t.Optional[t.Tuple[float, t.Hashable]] = None,
+        limit: t.Optional[int] = None,
+    ) -> t.List[StoredJob]:
+        """Returns up to ``limit`` jobs with ``next_fire_at`` not later
+        than ``until``, ordered by ``(next_fire_at, job_id)`` and
+        following ``after`` key in this order, if any.
+        """
+        raise NotImplementedError
+
+
+class SQLiteJobStore(JobStore):
+    """Reference :class:`JobStore` in the SQLite ``table`` of ``database``
+    (a path or ``:memory:``), indexed by ``next_fire_at``.
+
+    Schedules are stored as bytes by ``serializer``, any object with
+    ``dumps`` and ``loads`` functions (the compact binary format of
+    :mod:`krolib.serialization` by default).
+    """
+
+    def __init__(
+        self,
+        database: str = ':memory:',
+        table: str = 'krolib_jobs',
+        serializer=serialization,
+    ):
+        if not table.isidentifier():
+            raise ValueError('Invalid table name, an identifier expected')
+
+        self.table = table
+        self.serializer = serializer
+        self.connection = sqlite3.connect(database)
+        with self.connection:
+            # no type affinity, ids are kept as they're
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS %s ('
+                'job_id PRIMARY KEY, '
+                'func TEXT NOT NULL, '
+                'schedule BLOB NOT NULL, '
+                'next_fire_at REAL, '
+                'last_run REAL NOT NULL, '
+                'misfire TEXT NOT NULL, '
+                'misfire_grace REAL)' % table
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS %s_next_fire_at '
+                'ON %s (next_fire_at, job_id)' % (table, table)
+            )
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM %s' % self.table).fetchone()[0]
+
+    def _stored_job(self, row: tuple) -> StoredJob:
+        return StoredJob(*row[:2], self.serializer.loads(row[2]), *row[3:])
+
+    def add(self, job: StoredJob):
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO %s (%s) VALUES (?, ?, ?, ?, ?, ?, ?)' % (
+                    self.table, STORED_JOB_COLUMNS,
+                ),
+                job._replace(schedule=self.serializer.dumps(job.schedule)),
+            )
+
+    def get(self, job_id: t.Hashable) -> t.Optional[StoredJob]:
+        row = self.connection.execute(
+            'SELECT %s FROM %s WHERE job_id = ?' % (STORED_JOB_COLUMNS, self.table),
+            (job_id,),
+        ).fetchone()
+        return self._stored_job(row) if row else None
+
+    def remove(self, job_id: t.Hashable):
+        with self.connection:
+            self.connection.execute('DELETE FROM %s WHERE job_id = ?' % self.table, (job_id,))
+
+    def update_many(self, updates: t.Iterable[t.Tuple[t.Hashable, t.Optional[float], float]]):
+        with self.connection:
+            self.connection.executemany(
+                'UPDATE %s SET next_fire_at = ?, last_run = ? WHERE job_id = ?' % self.table,
+                ((next_fire_at, last_run, job_id) for job_id, next_fire_at, last_run in updates),
+            )
+
+    def due(
+        self,
+        until: float,
+        after: t.Optional[t.Tuple[float, t.Hashable]] = None,
+        limit: t.Optional[int] = None,
+    ) -> t.List[StoredJob]:
+        query = 'SELECT %s FROM %s WHERE next_fire_at <= ?' % (STORED_JOB_COLUMNS, self.table)
+        params = [until]
+        if after is not None:
+            query += ' AND (next_fire_at, job_id) > (?, ?)'
+            params.extend(after)
+        query += ' ORDER BY next_fire_at, job_id'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+
+        rows = self.connection.execute(query, params).fetchall()
+        return [self._stored_job(row) for row in rows]
@@ -145,6 +145,30 @@ MonthUnits = collections.namedtuple(
     DECEMBER=12,
 )
 
+OverlapPolicies = collections.namedtuple(
+    'OverlapPolicies', [
+        'SKIP',
+        'QUEUE',
+        'CANCEL',
+    ]
+)(
+    SKIP='skip',
+    QUEUE='queue',
+    CANCEL='cancel',
+)
+
+MisfirePolicies = collections.namedtuple(
+    'MisfirePolicies', [
+        'SKIP',
+        'COALESCE',
+        'REPLAY',
+    ]
+)(
+    SKIP='skip',
+    COALESCE='coalesce',
+    REPLAY='replay',
+)
+
 GettersSchema = v.Schema([
     {
         v.Required('getter'): object,
@@ -222,3 +246,163 @@ ScheduleSchema = v.Schema({
     },
     'timezone': v.Maybe(v.All(str, v.In(pytz.all_timezones_set)))
 })
+
+
+# plain copies of the enum values for the trusted validation
+TIME_UNITS = frozenset(TimeUnits)
+PERIODICAL_UNITS = frozenset(PeriodicalUnits)
+RELATIVE_PERIODICAL_UNITS = frozenset((PeriodicalUnits.MONTHLY, PeriodicalUnits.YEARLY))
+RELATIVE_UNITS = frozenset(RelativeUnits)
+RELATIVE_INDEX_UNITS = frozenset(RelativeIndexUnits)
+# membership tests of the pytz lazy set are slow
+TIMEZONES = frozenset(pytz.all_timezones)
+
+PERIODICAL_RANGES = {
+    'every': (1, None),
+    'month': (1, 12),
+    'day': (1, 31),
+    'hour': (0, 23),
+    'minute': (0, 59),
+    'second': (0, 59),
+}
+PERIODICAL_UNITS_MAP = {
+    'repeats': PERIODICAL_UNITS,
+    'relative_day': RELATIVE_UNITS,
+    'relative_day_index': RELATIVE_INDEX_UNITS,
+}
+RELATIVE_PERIODICAL_UNITS_MAP = dict(PERIODICAL_UNITS_MAP, repeats=RELATIVE_PERIODICAL_UNITS)
+PERIODICAL_KEYS = frozenset(PERIODICAL_RANGES).union(PERIODICAL_UNITS_MAP, ('weekday',))
+RELATIVE_PERIODICAL_KEYS = frozenset(PERIODICAL_KEYS - {'month', 'day', 'weekday'})
+RELATIVE_REQUIRED_KEYS = frozenset(('relative_day', 'relative_day_index'))
+TIMESHIFT_KEYS = {'delay', 'time_units'}
+
+
+def in_range(value, bounds) -> bool:
+    if value is None:
+        return True
+    if not isinstance(value, int):
+        return False
+    low, high = bounds
+    return value >= low and (high is None or value <= high)
+
+
+def in_units(value, units) -> bool:
+    return value is None or isinstance(value, str) and value in units
+
+
+def fast_start_section(section):
+    if type(section) is not dict:
+        return None
+
+    result = {}
+    for key, value in section.items():
+        if key == 'on':
+            if value is not None and not isinstance(value, datetime.datetime):
+                return None
+        elif key == 'relative_timeshift':
+            if type(value) is not dict or value.keys() != TIMESHIFT_KEYS:
+                return None
+            delay = value['delay']
+            # booleans and strings are coerced to int by the schema
+            if delay is not None and (type(delay) is not int or delay < 1):
+                return None
+            if not in_units(value['time_units'], TIME_UNITS):
+                return None
+            value = dict(value)
+        else:
+            return None
+        result[key] = value
+    return result
+
+
+def fast_stop_section(section):
+    if type(section) is not dict or 'never' not in section:
+        return None
+
+    for key, value in section.items():
+        if key == 'never':
+            # other values are coerced to bool by the schema
+            if value is not None and type(value) is not bool:
+                return None
+        elif key == 'on':
+            if value is not None and not isinstance(value, datetime.datetime):
+                return None
+        elif key != 'after_num_repeats' or not in_range(value, (1, None)):
+            return None
+    return dict(section)
+
+
+def fast_periodical_section(section, relative):
+    if type(section) is not dict or 'repeats' not in section:
+        return None
+
+    units_map = RELATIVE_PERIODICAL_UNITS_MAP if relative else PERIODICAL_UNITS_MAP
+    result = {}
+    for key, value in section.items():
+        if relative and key not in RELATIVE_PERIODICAL_KEYS:
+            return None
+        if value is None:
+            if key not in PERIODICAL_KEYS or relative and key in RELATIVE_REQUIRED_KEYS:
+                return None
+        elif key in PERIODICAL_RANGES:
+            low, high = PERIODICAL_RANGES[key]
+            if not isinstance(value, int) or value < low or high is not None and value > high:
+                return None
+        elif key == 'weekday':
+            if type(value) is not list:
+                return None
+            for weekday in value:
+                if not isinstance(weekday, int) or weekday < 0 or weekday > 6:
+                    return None
+            # the schema returns a copy of the list
+            value = list(value)
+        else:
+            units = units_map.get(key)
+            if units is None or not isinstance(value, str) or value not in units:
+                return None
+        result[key] = value
+
+    if relative and not RELATIVE_REQUIRED_KEYS.issubset(result):
+        return None
+    result.setdefault('every', 1)
+    return result
+
+
+def fast_validated_schedule(schedule):
+    """Returns the same dict as ``RelativeScheduleSchema`` or
+    ``ScheduleSchema`` (chosen the same way as
+    :func:`krolib.parser.validated_schedule` does) returns for
+    ``schedule`` which doesn't need any value coercion, much faster
+    than the schemas.
+
+    Returns ``None`` for anything else, these schedules have to be
+    validated by the schemas to get the same result or error.
+    """
+    if type(schedule) is not dict:
+        return None
+
+    periodical = schedule.get('periodical')
+    if periodical is not None and type(periodical) is not dict:
+        return None
+    relative = bool(
+        periodical and periodical.get('relative_day') and periodical.get('relative_day_index')
+    )
+
+    result = {}
+    for key, value in schedule.items():
+        if key == 'start':
+            value = fast_start_section(value)
+        elif key == 'stop':
+            value = fast_stop_section(value)
+        elif key == 'periodical':
+            value = fast_periodical_section(value, relative)
+        elif key == 'timezone':
+            if not in_units(value, TIMEZONES):
+                return None
+        else:
+            return None
+
+        if value is None and key != 'timezone':
+            return None
+        result[key] = value
+    return result
@@ -0,0 +1,290 @@
+import heapq
+import datetime
+import itertools
+import threading
+import time
+import typing as t
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait as wait_futures
+
+from krolib.asyncio import CLOCK_RESOLUTION, Job, LatenessStats, RunCounters
+from krolib.cache import ScheduleCache
+from krolib.parser import CompiledSchedule
+from krolib.structs import OverlapPolicies, MisfirePolicies
+
+
+# running threads can't be cancelled
+THREAD_OVERLAP_POLICIES = (OverlapPolicies.SKIP, OverlapPolicies.QUEUE)
+
+
+class ThreadJob(Job):
+    """:class:`krolib.asyncio.Job` of the regular ``func`` called by
+    ``executor``. Runs bookkeeping is guarded by ``lock`` of the
+    :class:`Scheduler`, done callbacks come from the executor threads.
+
+    Only ``skip`` and ``queue`` overlap policies are supported.
+    """
+
+    __slots__ = ('executor', 'lock')
+
+    def __init__(
+        self,
+        job_id: t.Hashable,
+        func: t.Callable,
+        schedule: CompiledSchedule,
+        executor: Executor,
+        lock: threading.RLock,
+        **params,
+    ):
+        if params.get('overlap', OverlapPolicies.SKIP) not in THREAD_OVERLAP_POLICIES:
+            raise ValueError('Invalid overlap policy, one of %s expected' % (
+                ', '.join('"%s"' % x for x in THREAD_OVERLAP_POLICIES)
+            ))
+
+        super().__init__(job_id, func, schedule, **params)
+        self.executor = executor
+        self.lock = lock
+
+    def run(self) -> t.Optional[Future]:
+        with self.lock:
+            return super().run()
+
+    def start(self) -> Future:
+        future = self.executor.submit(self.call)
+        self.tasks.add(future)
+        self.counters.incr('started')
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, future: Future):
+        with self.lock:
+            super().done(future)
+
+    def call(self):
+        return self.func(*self.args, **self.kwargs)
+
+
+class Scheduler:
+    """Runs scheduled callables in the ``executor`` threads (a new
+    :class:`ThreadPoolExecutor` with ``max_workers`` by default), for
+    the services without an event loop.
+
+    All jobs are kept in one min-heap keyed by their next fire time, a
+    single timer thread sleeps on a condition until the earliest one is
+    due or the heap is changed. Measured fire lateness and runs counters
+    are available as :attr:`lateness` and :attr:`counters`::
+
+        scheduler = Scheduler(max_workers=4)
+
+        @scheduler.scheduled({
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': 1,
+            },
+        })
+        def some_function():
+            print('PING')
+
+        scheduler.start()
+        ...
+        scheduler.shutdown()
+
+    Jobs options are the same as of :meth:`krolib.asyncio.Dispatcher.add_job`,
+    except ``cancel`` overlap policy. :meth:`shutdown` stops the timer
+    and waits for the active runs, the queued ones can be cancelled.
+    """
+
+    def __init__(
+        self,
+        executor: t.Optional[Executor] = None,
+        max_workers: t.Optional[int] = None,
+        cache: t.Optional[ScheduleCache] = None,
+    ):
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers, thread_name_prefix='krolib',
+        )
+        self.jobs = {}
+        # finished and removed jobs which still have runs, for shutdown
+        self._retired = set()
+        self.cache = ScheduleCache() if cache is None else cache
+        self.lateness = LatenessStats()
+        self.counters = RunCounters()
+        self._own_executor = executor is None
+        self._lock = threading.RLock()
+        self._condition = threading.Condition(self._lock)
+        self._heap = []
+        self._counter = itertools.count()
+        self._job_ids = itertools.count()
+        self._thread = None
+        self._running = False
+
+    def __enter__(self) -> 'Scheduler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def add_job(
+        self,
+        func: t.Callable,
+        schedule: t.Union[dict, CompiledSchedule],
+        args: tuple = (),
+        kwargs: t.Optional[dict] = None,
+        job_id: t.Optional[t.Hashable] = None,
+        getters: t.Optional[t.List[dict]] = None,
+        max_instances: t.Optional[int] = None,
+        overlap: str = OverlapPolicies.SKIP,
+        max_queued: t.Optional[int] = None,
+        misfire: str = MisfirePolicies.REPLAY,
+        misfire_grace: t.Optional[float] = None,
+        last_run: t.Optional[datetime.datetime] = None,
+    ) -> ThreadJob:
+        with self._condition:
+            if not isinstance(schedule, CompiledSchedule):
+                schedule = self.cache.compile(schedule, getters=getters)
+
+            if job_id is None:
+                job_id = next(self._job_ids)
+            if job_id in self.jobs:
+                raise KeyError('Job %r is already registered' % (job_id,))
+
+            job = ThreadJob(
+                job_id,
+                func,
+                schedule,
+                self.executor,
+                self._lock,
+                args=args,
+                kwargs=kwargs,
+                max_instances=max_instances,
+                overlap=overlap,
+                max_queued=max_queued,
+                counters=RunCounters(parent=self.counters),
+                misfire=misfire,
+                misfire_grace=misfire_grace,
+                last_run=last_run,
+            )
+            # the job of the schedule which is over isn't registered
+            if job.advance():
+                self.jobs[job_id] = job
+                self._push(job)
+                if self._heap[0][2] is job:
+                    self._condition.notify()
+            return job
+
+    def remove_job(self, job_id: t.Hashable) -> ThreadJob:
+        with self._condition:
+            job = self.jobs.pop(job_id)
+            # removed jobs are dropped from the heap lazily
+            job.active = False
+            self._retire(job)
+            return job
+
+    def scheduled(
+        self,
+        schedule: t.Union[dict, CompiledSchedule],
+        **params,
+    ) -> t.Callable:
+        """Decorator form of :meth:`add_job`."""
+        def wrapper(func):
+            self.add_job(func, schedule, **params)
+            return func
+        return wrapper
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._run, name='krolib-scheduler', daemon=True,
+            )
+            self._thread.start()
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """Stops the timer thread. Waits for the active runs if ``wait``,
+        including the runs queued by the ``queue`` overlap policy, which
+        are started as the active ones finish. Otherwise, or if
+        ``cancel_pending``, the queued runs are dropped and counted as
+        cancelled, as well as the ones not started by the executor yet
+        if ``cancel_pending``. The executor created by the scheduler is
+        shut down.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+        with self._lock:
+            for job in self._all_jobs():
+                if cancel_pending or not wait:
+                    for _ in range(job.pending):
+                        job.counters.incr('cancelled')
+                    job.pending = 0
+                if cancel_pending:
+                    for future in list(job.tasks):
+                        if future.cancel():
+                            job.counters.incr('cancelled')
+
+        if wait:
+            self._drain()
+        if self._own_executor:
+            self.executor.shutdown(wait=wait)
+
+    def _drain(self):
+        """Waits until the jobs have neither active nor queued runs."""
+        while True:
+            with self._lock:
+                futures = [future for job in self._all_jobs() for future in job.tasks]
+            if not futures:
+                return
+            wait_futures(futures)
+
+    def _retire(self, job: ThreadJob):
+        self._retired = {x for x in self._retired if x.tasks}
+        if job.tasks:
+            self._retired.add(job)
+
+    def _all_jobs(self) -> t.List[ThreadJob]:
+        return list(self.jobs.values()) + list(self._retired)
+
+    def _push(self, job: ThreadJob):
+        heapq.heappush(self._heap, (job.next_dt.timestamp(), next(self._counter), job))
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+                while self._heap and not self._heap[0][2].active:
+                    heapq.heappop(self._heap)
+
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                now = time.time()
+                delay = self._heap[0][0] - now
+                if delay > CLOCK_RESOLUTION:
+                    self._condition.wait(delay)
+                    continue
+
+                self._fire(now)
+
+    def _fire(self, now: float):
+        while self._heap and self._heap[0][0] <= now + CLOCK_RESOLUTION:
+            timestamp, _, job = heapq.heappop(self._heap)
+            if not job.active:
+                continue
+
+            self.lateness.add(max(now - timestamp, 0.0))
+            if job.fire(now):
+                self._push(job)
+            else:
+                self.jobs.pop(job.id, None)
+                self._retire(job)
@@ -1,4 +1,8 @@
+import math
+import time
+import bisect
 import datetime
+import functools
 import typing as t
 
 import pytz
@@ -9,6 +13,9 @@ from tzlocal import get_localzone
 
 epoch = datetime.datetime.utcfromtimestamp(0)
 
+# tzinfo objects and offset tables of the most used timezones
+TIMEZONE_CACHE_SIZE = 512
+
 
 def is_weekday(dt: datetime.datetime):
     return dt.weekday() < 5
@@ -18,23 +25,107 @@ def is_weekend(dt: datetime.datetime):
     return dt.weekday() >= 5
 
 
-def just_now(tz: str = 'UTC'):
+class OffsetTable:
+    """UTC offsets of a pytz timezone: ``transitions`` are unix timestamps
+    where the offset changes, ``offsets`` (in seconds) and ``tzinfos``
+    are the ones in effect since the corresponding transition.
+    """
+
+    __slots__ = ('transitions', 'offsets', 'tzinfos', 'fixed_tzinfos')
+
+    def __init__(
+        self,
+        transitions: t.List[int],
+        offsets: t.List[int],
+        tzinfos: t.List[datetime.tzinfo],
+    ):
+        self.transitions = transitions
+        self.offsets = offsets
+        self.tzinfos = tzinfos
+        # conversion with the builtin fixed offset timezones is done in C
+        self.fixed_tzinfos = [
+            datetime.timezone(datetime.timedelta(seconds=offset)) for offset in offsets
+        ]
+
+    def index(self, timestamp: int) -> int:
+        if len(self.transitions) == 1:
+            return 0
+        return max(bisect.bisect_right(self.transitions, timestamp) - 1, 0)
+
+    def offset(self, timestamp: int) -> int:
+        return self.offsets[self.index(timestamp)]
+
+    def localize(self, timestamp: int) -> datetime.datetime:
+        """Same as ``datetime.fromtimestamp(timestamp, tz)``."""
+        index = self.index(timestamp)
+        local_dt = datetime.datetime.fromtimestamp(timestamp, self.fixed_tzinfos[index])
+        return local_dt.replace(tzinfo=self.tzinfos[index])
+
+
+@functools.lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def cached_timezone(name: str) -> datetime.tzinfo:
+    return pytz.timezone(name)
+
+
+@functools.lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def zone_offset_table(name: str) -> OffsetTable:
+    tz = cached_timezone(name)
+    transition_times = getattr(tz, '_utc_transition_times', None)
+    if not transition_times:
+        offset = tz.utcoffset(epoch)
+        return OffsetTable([0], [int(offset.total_seconds())], [tz])
+
+    return OffsetTable(
+        [int((dt - epoch).total_seconds()) for dt in transition_times],
+        [int(info[0].total_seconds()) for info in tz._transition_info],
+        [tz._tzinfos[info] for info in tz._transition_info],
+    )
+
+
+def resolve_timezone(tz: t.Union[str, datetime.tzinfo]) -> datetime.tzinfo:
+    if isinstance(tz, datetime.tzinfo):
+        return tz
+    return cached_timezone(tz)
+
+
+def offset_table(tz: t.Union[str, datetime.tzinfo]) -> t.Optional[OffsetTable]:
+    """Returns cached :class:`OffsetTable` of the pytz timezone ``tz``
+    (name or tzinfo) or ``None`` for other tzinfo implementations.
+    """
+    zone = tz if isinstance(tz, str) else getattr(tz, 'zone', None)
+    if not zone:
+        return None
+    return zone_offset_table(zone)
+
+
+def localize_epoch(timestamp: int, tz: t.Union[str, datetime.tzinfo] = 'UTC'):
+    """Returns unix ``timestamp`` as an aware datetime in ``tz``, looked
+    up in the offset table of the timezone instead of pytz conversion.
+    """
+    table = offset_table(tz)
+    if table is None:
+        return datetime.datetime.fromtimestamp(timestamp, resolve_timezone(tz))
+    return table.localize(timestamp)
+
+
+def just_now(tz: t.Union[str, datetime.tzinfo] = 'UTC'):
     if not tz:
         now = datetime.datetime.utcnow()
-    else:
-        now = datetime.datetime.now(tz=pytz.timezone(tz))
+        return now.replace(microsecond=0)
 
-    return now.replace(microsecond=0)
+    return localize_epoch(int(time.time()), tz)
 
 
-def normalize_datetime(dt: datetime.datetime, tz: str = 'UTC'):
-    local_tz = pytz.timezone(tz)
+def normalize_datetime(dt: datetime.datetime, tz: t.Union[str, datetime.tzinfo] = 'UTC'):
+    local_tz = resolve_timezone(tz)
     if not dt.tzinfo:
         dt = local_tz.localize(dt)
-    else:
-        dt = dt.astimezone(local_tz)
+        return dt.replace(microsecond=0)
 
-    return dt.replace(microsecond=0)
+    table = None if local_tz is pytz.utc else offset_table(local_tz)
+    if table is None:
+        return dt.astimezone(local_tz).replace(microsecond=0)
+    return table.localize(math.floor(dt.timestamp()))
 
 
 def normalize_isoformat(dt: str, tz: str = 'UTC'):
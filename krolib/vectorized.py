@@ -0,0 +1,71 @@
+"""Expansion of schedules into NumPy arrays.
+
+Requires ``numpy``, which can be installed with the ``numpy`` extra::
+
+    $ pip install krolib[numpy]
+"""
+import datetime
+import itertools
+import typing as t
+
+import numpy as np
+
+from .parser import (
+    CompiledSchedule,
+    compile_schedule,
+    progression_bounds,
+)
+
+
+def expand_epochs(
+    schedule: t.Union[dict, CompiledSchedule],
+    start_dt: datetime.datetime,
+    end_dt: datetime.datetime,
+    getters: t.Optional[t.List[dict]] = None,
+) -> np.ndarray:
+    """Returns ``int64`` array of unix timestamps of all the schedule
+    occurrences later than ``start_dt`` and not later than ``end_dt``.
+
+    Fixed-length rules (weekly and shorter, without relative days) are
+    expanded in one vectorized step from their per-period pattern,
+    any other rules fall back to :meth:`CompiledSchedule.occurrences`.
+    """
+    if not isinstance(schedule, CompiledSchedule):
+        schedule = compile_schedule(schedule, getters=getters)
+
+    start = schedule.normalized_now(start_dt)
+    end = schedule.normalized_now(end_dt)
+
+    progression = schedule.progression(start)
+    if progression is None:
+        occurrences = itertools.takewhile(lambda dt: dt <= end, schedule.occurrences(start))
+        return np.fromiter(
+            (int(dt.timestamp()) for dt in occurrences if dt > start),
+            dtype=np.int64,
+        )
+
+    rrule_params, period, phases = progression
+    if not phases:
+        return np.empty(0, dtype=np.int64)
+
+    epoch = int(rrule_params['dtstart'].timestamp())
+    first, last = progression_bounds(rrule_params, period, phases, start, end)
+    if last <= first:
+        return np.empty(0, dtype=np.int64)
+
+    cycles, phase = np.divmod(np.arange(first, last, dtype=np.int64), len(phases))
+    return epoch + cycles * period + np.asarray(phases, dtype=np.int64)[phase]
+
+
+def expand_schedule(
+    schedule: t.Union[dict, CompiledSchedule],
+    start_dt: datetime.datetime,
+    end_dt: datetime.datetime,
+    getters: t.Optional[t.List[dict]] = None,
+) -> np.ndarray:
+    """Same as :func:`expand_epochs` but returns ``datetime64[s]`` array
+    (UTC based, as NumPy datetimes are timezone naive)::
+
+        occurrences = expand_schedule(schedule, just_now(), just_now() + month)
+    """
+    return expand_epochs(schedule, start_dt, end_dt, getters=getters).astype('datetime64[s]')
@@ -79,6 +79,9 @@ setup(
         'tzlocal>=1.3',
         'voluptuous==0.11.5',
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     tests_require=[
         'pytest==5.0.1',
         'pytest-asyncio==0.10.0',
@@ -1,13 +1,25 @@
 import asyncio
+import time
+import datetime
+
 import pytest
 from voluptuous import Invalid as SchemaInvalid
 
-from krolib.asyncio import scheduler
-from krolib.structs import TimeUnits, PeriodicalUnits
+from krolib.asyncio import aschedule, scheduler, Dispatcher, Job
+from krolib.parser import compile_schedule
+from krolib.stores import SQLiteJobStore
+from krolib.structs import TimeUnits, PeriodicalUnits, OverlapPolicies, MisfirePolicies
 
 
 pytestmark = pytest.mark.asyncio
 
+# stored jobs are referenced by import paths
+STORED_CALLS = []
+
+
+async def stored_coroutine():
+    STORED_CALLS.append(time.time())
+
 
 async def test_scheduler(event_loop):
 
@@ -87,3 +99,638 @@ async def test_concurrent_scheduler(event_loop):
 
     # concurrent execution
     await asyncio.gather(some_coroutine(), another_coroutine())
+
+
+async def test_dispatcher(event_loop):
+    dispatcher = Dispatcher()
+    calls = []
+
+    @dispatcher.scheduled({
+        'start': {
+            'relative_timeshift': {
+                'delay': 1,
+                'time_units': TimeUnits.SECONDS,
+            }
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+        'stop': {
+            'never': False,
+            'after_num_repeats': 2
+        }
+    })
+    async def some_coroutine():
+        calls.append('PING')
+
+    async def another_coroutine(value):
+        calls.append(value)
+
+    dispatcher.add_job(another_coroutine, {
+        'start': {
+            'relative_timeshift': {
+                'delay': 1,
+                'time_units': TimeUnits.SECONDS,
+            }
+        },
+    }, args=('PONG',), job_id='pong')
+
+    assert set(dispatcher.jobs) == {0, 'pong'}
+    dispatcher.start()
+    await asyncio.sleep(2.5)
+    dispatcher.stop()
+
+    assert sorted(calls) == ['PING', 'PING', 'PONG']
+    assert not dispatcher.jobs
+
+
+async def test_dispatcher_single_timer(event_loop):
+    dispatcher = Dispatcher()
+    calls = []
+
+    async def some_coroutine(num):
+        calls.append(num)
+
+    for num in range(1000):
+        dispatcher.add_job(some_coroutine, {
+            'periodical': {
+                'repeats': PeriodicalUnits.SECONDLY,
+                'every': 1,
+            },
+            'stop': {
+                'never': False,
+                'after_num_repeats': 2
+            }
+        }, args=(num,))
+
+    dispatcher.start()
+    assert len(event_loop._scheduled) == 1
+
+    dispatcher.remove_job(0)
+    await asyncio.sleep(1.2)
+    dispatcher.stop()
+
+    assert sorted(calls) == list(range(1, 1000))
+    assert not event_loop._scheduled or all(x.cancelled() for x in event_loop._scheduled)
+
+
+async def test_dispatcher_schedule_over(event_loop):
+    dispatcher = Dispatcher()
+
+    async def some_coroutine():
+        pass
+
+    start_on = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
+    job = dispatcher.add_job(
+        some_coroutine,
+        {
+            'start': {
+                'on': start_on,
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.HOURLY,
+                'every': 1,
+            },
+            'stop': {
+                'never': False,
+                'on': start_on + datetime.timedelta(hours=2),
+            },
+        },
+        last_run=datetime.datetime.now(datetime.timezone.utc),
+    )
+    assert job.next_dt is None
+    assert not dispatcher.jobs
+
+
+async def test_dispatcher_wrong_struct():
+    dispatcher = Dispatcher()
+
+    async def some_coroutine():
+        return 'PING'
+
+    with pytest.raises(SchemaInvalid):
+        dispatcher.add_job(some_coroutine, {'stop': []})
+
+
+async def test_scheduler_lateness(event_loop):
+    fired = []
+
+    @scheduler({
+        'start': {
+            'relative_timeshift': {
+                'delay': 1,
+                'time_units': TimeUnits.SECONDS,
+            }
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+        'stop': {
+            'never': False,
+            'after_num_repeats': 2
+        }
+    })
+    async def some_coroutine():
+        fired.append(time.time())
+
+    await some_coroutine()
+    await asyncio.sleep(0)
+
+    assert some_coroutine.lateness.count == 2
+    # loose bounds of the wall clock, see test_dispatcher_lateness_clock
+    assert some_coroutine.lateness.max < 0.3
+    # fired at the second boundaries
+    assert all(min(x % 1, 1 - x % 1) < 0.3 for x in fired)
+
+
+async def test_dispatcher_lateness(event_loop):
+    dispatcher = Dispatcher()
+    fired = []
+
+    @dispatcher.scheduled({
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    })
+    async def some_coroutine():
+        fired.append(time.time())
+
+    dispatcher.start()
+    await asyncio.sleep(2.1)
+    dispatcher.stop()
+
+    assert dispatcher.lateness.count == len(fired) >= 2
+    assert dispatcher.lateness.max < 0.3
+    assert all(min(x % 1, 1 - x % 1) < 0.3 for x in fired)
+
+
+async def test_dispatcher_lateness_clock(event_loop, monkeypatch):
+    dispatcher = Dispatcher()
+    fired = []
+
+    @dispatcher.scheduled({
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    })
+    async def some_coroutine():
+        fired.append(time.time())
+
+    first = dispatcher.jobs[0].next_dt.timestamp()
+    # fired by the injected clock instead of the loop timer
+    for now in [first + 0.25, first + 1, first + 2.5]:
+        monkeypatch.setattr(time, 'time', lambda: now)
+        dispatcher._fire()
+        await asyncio.sleep(0)
+
+    assert fired == [first + 0.25, first + 1, first + 2.5]
+    assert dispatcher.lateness.count == 3
+    assert dispatcher.lateness.max == pytest.approx(0.5)
+    assert dispatcher.lateness.total == pytest.approx(0.75)
+
+
+def make_job(func, **params):
+    schedule = compile_schedule({
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    })
+    return Job('job', func, schedule, **params)
+
+
+async def test_job_overlap_skip(event_loop):
+    release = asyncio.Event()
+
+    async def some_coroutine():
+        await release.wait()
+
+    job = make_job(some_coroutine, max_instances=2)
+    for _ in range(5):
+        job.run()
+
+    assert len(job.tasks) == 2
+    assert job.counters.started == 2
+    assert job.counters.skipped == 3
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert not job.tasks
+
+
+async def test_job_overlap_queue(event_loop):
+    release = asyncio.Event()
+    calls = []
+
+    async def some_coroutine():
+        calls.append('PING')
+        await release.wait()
+
+    job = make_job(
+        some_coroutine,
+        max_instances=1,
+        overlap=OverlapPolicies.QUEUE,
+        max_queued=2,
+    )
+    for _ in range(5):
+        job.run()
+
+    assert (job.counters.started, job.counters.queued, job.counters.skipped) == (1, 2, 2)
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert calls == ['PING', 'PING', 'PING']
+    assert job.counters.started == 3
+    assert not job.tasks and not job.pending
+
+
+async def test_job_overlap_cancel(event_loop):
+    cancelled = []
+
+    async def some_coroutine():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append('PING')
+            raise
+
+    job = make_job(some_coroutine, max_instances=1, overlap=OverlapPolicies.CANCEL)
+    for _ in range(3):
+        job.run()
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+
+    assert cancelled == ['PING', 'PING']
+    assert len(job.tasks) == 1
+    assert (job.counters.started, job.counters.cancelled) == (3, 2)
+
+    for task in job.tasks:
+        task.cancel()
+    await asyncio.sleep(0.01)
+
+
+async def test_job_invalid_overlap():
+    async def some_coroutine():
+        pass
+
+    with pytest.raises(ValueError):
+        make_job(some_coroutine, overlap='invalid')
+
+
+async def test_dispatcher_max_concurrency(event_loop):
+    dispatcher = Dispatcher(max_concurrency=2)
+    running = []
+    max_running = []
+
+    async def some_coroutine():
+        running.append(1)
+        max_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+
+    jobs = [dispatcher.add_job(some_coroutine, {}) for _ in range(5)]
+    for job in jobs:
+        job.run()
+    await asyncio.sleep(0.1)
+
+    assert max(max_running) == 2
+    assert len(max_running) == 5
+    assert dispatcher.counters.started == 5
+
+
+def make_restored_job(func, **params):
+    schedule = compile_schedule({
+        'periodical': {
+            'repeats': PeriodicalUnits.HOURLY,
+            'every': 1,
+        },
+    })
+    last_run = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        hours=6, minutes=30,
+    )
+    job = Job('job', func, schedule, last_run=last_run, **params)
+    job.advance()
+    return job
+
+
+@pytest.mark.parametrize('params, runs', [
+    ({'misfire': MisfirePolicies.REPLAY}, 6),
+    ({'misfire': MisfirePolicies.REPLAY, 'misfire_grace': 8000}, 2),
+    ({'misfire': MisfirePolicies.COALESCE, 'misfire_grace': 60}, 1),
+    ({'misfire': MisfirePolicies.SKIP, 'misfire_grace': 60}, 0),
+    ({'misfire': MisfirePolicies.SKIP}, 0),
+    ({'misfire': MisfirePolicies.COALESCE}, 1),
+])
+async def test_job_misfire(event_loop, params, runs):
+    async def some_coroutine():
+        pass
+
+    job = make_restored_job(some_coroutine, **params)
+    now = time.time()
+    next_dt = job.fire(now)
+    await asyncio.sleep(0.01)
+
+    assert job.counters.started == runs
+    assert 0 < next_dt.timestamp() - now <= 3600
+
+
+async def test_job_skip_on_time(event_loop):
+    async def some_coroutine():
+        pass
+
+    job = make_restored_job(some_coroutine, misfire=MisfirePolicies.SKIP)
+    job.fire(time.time())
+    # the next occurrence fired slightly late
+    job.fire(job.next_dt.timestamp() + 0.3)
+    await asyncio.sleep(0.01)
+
+    assert job.counters.started == 1
+
+
+async def test_job_invalid_misfire():
+    async def some_coroutine():
+        pass
+
+    with pytest.raises(ValueError):
+        make_job(some_coroutine, misfire='invalid')
+
+
+async def test_dispatcher_misfire_last_run(event_loop):
+    dispatcher = Dispatcher()
+    calls = []
+
+    async def some_coroutine():
+        calls.append(time.time())
+
+    dispatcher.add_job(
+        some_coroutine,
+        {
+            'periodical': {
+                'repeats': PeriodicalUnits.SECONDLY,
+                'every': 1,
+            },
+        },
+        misfire=MisfirePolicies.COALESCE,
+        last_run=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=6),
+    )
+    dispatcher.start()
+    await asyncio.sleep(0.1)
+    dispatcher.stop()
+
+    assert len(calls) == 1
+
+
+async def test_dispatcher_fan_out(event_loop):
+    dispatcher = Dispatcher()
+    calls = []
+
+    async def some_coroutine(num):
+        calls.append(num)
+
+    last_run = datetime.datetime.now(datetime.timezone.utc)
+    schedule = {
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    }
+    jobs = [
+        dispatcher.add_job(some_coroutine, schedule, args=(num,), last_run=last_run)
+        for num in range(100)
+    ]
+    # the same schedule with other misfire options or anchor
+    coalesced = dispatcher.add_job(
+        some_coroutine, schedule, args=(100,),
+        misfire=MisfirePolicies.COALESCE, last_run=last_run,
+    )
+    shifted = dispatcher.add_job(
+        some_coroutine, schedule, args=(101,),
+        last_run=last_run - datetime.timedelta(seconds=10),
+    )
+
+    assert len({job.group for job in jobs}) == 1
+    assert coalesced.group is not jobs[0].group
+    assert shifted.group is not jobs[0].group
+    assert len(dispatcher._heap) == 3
+    assert dispatcher.cache.info().misses == 1
+
+    dispatcher.remove_job(jobs[0].id)
+    dispatcher.start()
+    await asyncio.sleep(2.1)
+    dispatcher.stop()
+
+    assert 0 not in calls
+    assert len({calls.count(num) for num in range(1, 101)}) == 1
+    assert calls.count(1) >= 2
+    # the missed occurrences since last_run are replayed
+    assert calls.count(101) >= calls.count(1) + 9
+
+
+async def test_dispatcher_fan_out_later_job(event_loop):
+    dispatcher = Dispatcher()
+    calls = []
+
+    async def some_coroutine(num):
+        calls.append(num)
+
+    start_on = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    schedule = {
+        'start': {
+            'on': start_on + datetime.timedelta(seconds=1),
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    }
+    first = dispatcher.add_job(some_coroutine, schedule, args=(0,))
+    dispatcher.start()
+    await asyncio.sleep(start_on.timestamp() + 1.5 - time.time())
+
+    # joins the group only if its next occurrence is the same
+    second = dispatcher.add_job(some_coroutine, schedule, args=(1,))
+    assert second.group is first.group
+    assert second.next_dt == first.next_dt
+
+    await asyncio.sleep(1)
+    dispatcher.stop()
+    assert calls.count(0) == calls.count(1) + 1
+
+
+async def test_dispatcher_store_restart(event_loop):
+    STORED_CALLS.clear()
+    store = SQLiteJobStore()
+    dispatcher = Dispatcher(store=store)
+
+    start_on = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    start_on += datetime.timedelta(seconds=1)
+    schedule = {
+        'start': {
+            'on': start_on,
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    }
+    # nothing is loaded before the start
+    assert dispatcher.add_stored_job(stored_coroutine, schedule, job_id='secondly') is None
+    dispatcher.add_stored_job(
+        stored_coroutine,
+        dict(schedule, start={'on': start_on + datetime.timedelta(days=1)}),
+        job_id='daily',
+    )
+    with pytest.raises(KeyError):
+        dispatcher.add_stored_job(stored_coroutine, schedule, job_id='daily')
+
+    dispatcher.start()
+    assert set(dispatcher.jobs) == {'secondly'}
+    await asyncio.sleep(start_on.timestamp() + 1.5 - time.time())
+    dispatcher.stop()
+
+    assert len(STORED_CALLS) == 2
+    stored = store.get('secondly')
+    assert stored.next_fire_at == start_on.timestamp() + 2
+    assert stored.last_run == start_on.timestamp() + 1
+
+    restarted = Dispatcher(store=store)
+    restarted.start()
+    await asyncio.sleep(1)
+    restarted.stop()
+
+    assert len(STORED_CALLS) == 3
+    assert restarted.remove_job('daily') is None
+    assert len(store) == 1
+
+
+async def test_dispatcher_store_paging(event_loop):
+    STORED_CALLS.clear()
+    store = SQLiteJobStore()
+    dispatcher = Dispatcher(store=store, horizon=2, page_size=2)
+
+    start_on = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    start_on += datetime.timedelta(seconds=1)
+    for num in range(5):
+        dispatcher.add_stored_job(
+            stored_coroutine,
+            {
+                'start': {
+                    'on': start_on + datetime.timedelta(seconds=0 if num < 3 else 2),
+                },
+                'periodical': {
+                    'repeats': PeriodicalUnits.SECONDLY,
+                    'every': 1,
+                },
+                'stop': {
+                    'never': False,
+                    'after_num_repeats': 1,
+                },
+            },
+            job_id=num,
+        )
+
+    # pages are loaded until the horizon
+    dispatcher.start()
+    assert set(dispatcher.jobs) == {0, 1, 2}
+    await asyncio.sleep(start_on.timestamp() + 2.5 - time.time())
+    dispatcher.stop()
+
+    assert len(STORED_CALLS) == 5
+    assert not dispatcher.jobs
+    assert len(store) == 0
+
+
+async def test_dispatcher_store_wrong_params():
+    async def local_coroutine():
+        pass
+
+    schedule = {
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    }
+    with pytest.raises(ValueError):
+        Dispatcher().add_stored_job(stored_coroutine, schedule, job_id=1)
+    with pytest.raises(ValueError):
+        Dispatcher(store=SQLiteJobStore()).add_stored_job(local_coroutine, schedule, job_id=1)
+    with pytest.raises(ValueError):
+        Dispatcher(store=SQLiteJobStore(), horizon=0)
+
+
+async def test_aschedule(event_loop):
+    schedule = {
+        'start': {
+            'relative_timeshift': {
+                'delay': 1,
+                'time_units': TimeUnits.SECONDS,
+            }
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+        'stop': {
+            'never': False,
+            'after_num_repeats': 2
+        }
+    }
+    fired = []
+    async for fire_dt in aschedule(schedule):
+        fired.append((fire_dt, time.time()))
+
+    assert len(fired) == 2
+    assert fired[1][0] - fired[0][0] == datetime.timedelta(seconds=1)
+    # generated right at the deadlines
+    assert all(0 <= ts - fire_dt.timestamp() < 0.1 for fire_dt, ts in fired)
+
+
+async def test_aschedule_batching(event_loop):
+    schedule = {
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    }
+    fires = aschedule(schedule)
+    first_dt = await fires.__anext__()
+    # slow consumer, the missed occurrences are due at once
+    await asyncio.sleep(2.1)
+    started = time.time()
+    batch = [await fires.__anext__() for _ in range(2)]
+    assert time.time() - started < 0.1
+    assert batch == [first_dt + datetime.timedelta(seconds=x) for x in (1, 2)]
+    await fires.aclose()
+
+
+async def test_aschedule_cancel(event_loop):
+    fired = []
+
+    async def consume():
+        async for fire_dt in aschedule({
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': 1,
+            },
+        }):
+            fired.append(fire_dt)
+
+    task = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.1)
+    assert len(event_loop._scheduled) == 1
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not fired
+    assert all(x.cancelled() for x in event_loop._scheduled)
+
+
+async def test_aschedule_wrong_struct():
+    with pytest.raises(SchemaInvalid):
+        async for _ in aschedule({'stop': []}):
+            pass
@@ -0,0 +1,122 @@
+import datetime
+
+import pytest
+import pytz
+from voluptuous import Invalid as SchemaInvalid
+
+from krolib.cache import ScheduleCache, schedule_hash
+from krolib.structs import PeriodicalUnits
+
+
+NOW = datetime.datetime(2019, 6, 1, 12, 30, tzinfo=pytz.UTC)
+
+
+def make_schedule(hour=10, start_on=datetime.datetime(2019, 1, 1, 10), timezone='Europe/Kiev'):
+    return {
+        'start': {
+            'on': start_on,
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.DAILY,
+            'every': 1,
+            'hour': hour,
+        },
+        'stop': {
+            'never': True,
+        },
+        'timezone': timezone,
+    }
+
+
+@pytest.mark.unit
+class TestScheduleHash:
+
+    def test_key_order(self):
+        schedule = make_schedule()
+        reordered = {key: schedule[key] for key in reversed(list(schedule))}
+        reordered['periodical'] = dict(reversed(list(schedule['periodical'].items())))
+        assert schedule_hash(reordered) == schedule_hash(schedule)
+
+    def test_equivalent_datetimes(self):
+        naive = datetime.datetime(2019, 1, 1, 10)
+        kiev = pytz.timezone('Europe/Kiev').localize(naive)
+        utc = kiev.astimezone(pytz.UTC)
+        microseconds = naive.replace(microsecond=500)
+        hashes = {
+            schedule_hash(make_schedule(start_on=start_on))
+            for start_on in [naive, kiev, utc, microseconds]
+        }
+        assert len(hashes) == 1
+
+    @pytest.mark.parametrize('other', [
+        make_schedule(hour=11),
+        make_schedule(start_on=datetime.datetime(2019, 1, 1, 11)),
+        make_schedule(timezone='UTC'),
+        dict(make_schedule(), periodical={'repeats': PeriodicalUnits.DAILY, 'every': 1}),
+        dict(make_schedule(), stop={'never': 1}),
+    ])
+    def test_different_schedules(self, other):
+        assert schedule_hash(other) != schedule_hash(make_schedule())
+
+    def test_type_sensitive(self):
+        schedule = {'periodical': {'repeats': PeriodicalUnits.DAILY, 'every': 1}}
+        assert schedule_hash(schedule) != schedule_hash({
+            'periodical': {'repeats': PeriodicalUnits.DAILY, 'every': '1'},
+        })
+        assert schedule_hash(schedule) != schedule_hash({
+            'periodical': {'repeats': PeriodicalUnits.DAILY, 'every': True},
+        })
+
+    def test_invalid_timezone(self):
+        schedule = make_schedule(timezone='Invalid/Zone')
+        assert schedule_hash(schedule) == schedule_hash(dict(schedule))
+
+
+@pytest.mark.unit
+class TestScheduleCache:
+
+    def test_compile(self):
+        cache = ScheduleCache()
+        compiled = cache.compile(make_schedule())
+        assert cache.compile(make_schedule()) is compiled
+        assert cache.compile(make_schedule(hour=11)) is not compiled
+        assert compiled.delta(NOW) == cache.compile(make_schedule()).delta(NOW)
+        assert cache.info() == (2, 2, 0, cache.maxsize, 2)
+        assert make_schedule() in cache
+        assert len(cache) == 2
+
+    def test_lru_eviction(self):
+        cache = ScheduleCache(maxsize=2)
+        cache.compile(make_schedule(hour=1))
+        cache.compile(make_schedule(hour=2))
+        cache.compile(make_schedule(hour=1))
+        cache.compile(make_schedule(hour=3))
+        assert make_schedule(hour=1) in cache
+        assert make_schedule(hour=2) not in cache
+        assert cache.info() == (1, 3, 1, 2, 2)
+
+    def test_getters_not_cached(self):
+        cache = ScheduleCache()
+        getters = [{'getter': lambda value, **params: value + 1, 'params': {
+            'path': ['periodical', 'hour'],
+        }}]
+        compiled = cache.compile(make_schedule(), getters=getters)
+        assert compiled.schedule['periodical']['hour'] == 11
+        assert len(cache) == 0
+        assert cache.info().misses == 0
+
+    def test_invalid_schedule(self):
+        cache = ScheduleCache(trusted=True)
+        with pytest.raises(SchemaInvalid):
+            cache.compile(make_schedule(hour=24))
+        assert len(cache) == 0
+
+    def test_clear(self):
+        cache = ScheduleCache()
+        cache.compile(make_schedule())
+        cache.clear()
+        assert cache.info() == (0, 0, 0, cache.maxsize, 0)
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            ScheduleCache(maxsize=0)
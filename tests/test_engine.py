@@ -0,0 +1,143 @@
+"""The parser test suite run against :mod:`krolib.engine`."""
+import datetime
+import random
+
+import pytest
+import pytz
+
+from krolib import engine
+from krolib.parser import compile_schedule
+from krolib.structs import PeriodicalUnits, WeekdayUnits
+
+from tests import test_parser
+
+
+@pytest.fixture(autouse=True)
+def epoch_engine(monkeypatch):
+    monkeypatch.setattr(test_parser, 'schedule_parser', engine.schedule_parser)
+    monkeypatch.setattr(test_parser, 'schedule_delta', engine.schedule_delta)
+
+
+class TestStartTimeshiftDelay(test_parser.TestStartTimeshiftDelay):
+    pass
+
+
+class TestStartDateDelay(test_parser.TestStartDateDelay):
+    pass
+
+
+class TestPeriodicalSchedule(test_parser.TestPeriodicalSchedule):
+    pass
+
+
+class TestRelativeSchedule(test_parser.TestRelativeSchedule):
+    pass
+
+
+class TestMixedSchedule(test_parser.TestMixedSchedule):
+    pass
+
+
+class TestScheduleDelta(test_parser.TestScheduleDelta):
+    pass
+
+
+class TestSeekToNow(test_parser.TestSeekToNow):
+    pass
+
+
+class TestCompiledSchedule(test_parser.TestCompiledSchedule):
+    pass
+
+
+class TestScheduleDeltaMany(test_parser.TestScheduleDeltaMany):
+    pass
+
+
+def random_schedule(rnd):
+    repeats = rnd.choice([
+        PeriodicalUnits.WEEKLY,
+        PeriodicalUnits.DAILY,
+        PeriodicalUnits.HOURLY,
+        PeriodicalUnits.MINUTELY,
+        PeriodicalUnits.SECONDLY,
+    ])
+    periodical = {
+        'repeats': repeats,
+        'every': rnd.choice([1, 2, 3, 7]),
+    }
+    if repeats == PeriodicalUnits.WEEKLY and rnd.random() < 0.5:
+        periodical['weekday'] = rnd.sample(list(WeekdayUnits), 2)
+    if repeats in {PeriodicalUnits.WEEKLY, PeriodicalUnits.DAILY} and rnd.random() < 0.5:
+        periodical['hour'] = rnd.randrange(24)
+    if repeats != PeriodicalUnits.SECONDLY and rnd.random() < 0.5:
+        periodical['second'] = rnd.randrange(60)
+
+    schedule = {
+        'periodical': periodical,
+        'timezone': rnd.choice(['UTC', 'Europe/Kiev', 'America/New_York']),
+    }
+    if rnd.random() < 0.7:
+        schedule['start'] = {
+            'on': datetime.datetime(2018, 1, 1) + datetime.timedelta(
+                seconds=rnd.randrange(86400 * 365),
+            ),
+        }
+    if rnd.random() < 0.3:
+        schedule['stop'] = {
+            'never': False,
+            'after_num_repeats': rnd.randrange(1, 50),
+        }
+    return schedule
+
+
+@pytest.mark.unit
+def test_random_schedules_eq_parser():
+    rnd = random.Random(14)
+    for _ in range(300):
+        schedule = random_schedule(rnd)
+        now = datetime.datetime(2018, 3, 1, tzinfo=pytz.UTC) + datetime.timedelta(
+            seconds=rnd.randrange(86400 * 365),
+        )
+        compiled = compile_schedule(schedule)
+        expected = list(zip(range(5), compiled.iter_from(now)))
+        epoch_compiled = engine.compile_epoch_schedule(compiled)
+        results = list(zip(range(5), epoch_compiled.iter_from(now)))
+        assert results == expected
+        assert [dt.tzinfo for _, dt in results] == [dt.tzinfo for _, dt in expected]
+        assert epoch_compiled.delta(now) == compiled.delta(now)
+
+
+@pytest.mark.unit
+def test_next_epochs():
+    schedules = [
+        {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.HOURLY,
+                'every': 1,
+            },
+        },
+        {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+            },
+        },
+        {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+        },
+    ]
+    now_epoch = int(datetime.datetime(2018, 5, 1, 10, 30, tzinfo=pytz.UTC).timestamp())
+    assert engine.next_epochs(schedules, now_epoch) == [
+        now_epoch + 1800,
+        int(datetime.datetime(2018, 6, 1, tzinfo=pytz.UTC).timestamp()),
+        None,
+    ]
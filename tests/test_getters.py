@@ -0,0 +1,230 @@
+import asyncio
+import time
+import datetime
+
+import pytest
+from toolz.dicttoolz import assoc_in
+
+from krolib import getters as getters_module
+from krolib.asyncio import avalidated_schedules
+from krolib.getters import BatchGetter, GetterCache, assoc_copied
+from krolib.parser import validated_schedule, validated_schedules
+from krolib.structs import TimeUnits, PeriodicalUnits
+
+
+DELAY_PATH = ['start', 'relative_timeshift', 'delay']
+EVERY_PATH = ['periodical', 'every']
+
+
+def make_schedule(delay=1, every=1):
+    return {
+        'start': {
+            'on': datetime.datetime(2019, 1, 1),
+            'relative_timeshift': {
+                'delay': delay,
+                'time_units': TimeUnits.DAYS,
+            },
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.DAILY,
+            'every': every,
+        },
+    }
+
+
+def payload_getter(value, **params):
+    return params['source'][value]
+
+
+@pytest.mark.unit
+class TestGetters:
+
+    def test_assoc_copied(self):
+        schedule = make_schedule()
+        updates = [
+            (('start', 'relative_timeshift', 'delay'), 2),
+            (('start', 'on'), datetime.datetime(2019, 2, 1)),
+            (('periodical', 'every'), 3),
+            (('periodical',), {'repeats': PeriodicalUnits.HOURLY}),
+            (('periodical', 'every'), 2),
+            (('stop', 'never'), True),
+        ]
+        expected = schedule
+        result = schedule
+        copies = {}
+        for path, value in updates:
+            expected = assoc_in(expected, path, value)
+            result = assoc_copied(result, copies, path, value)
+
+        assert result == expected
+        assert schedule == make_schedule()
+        # untouched values are shared
+        assert result['start']['relative_timeshift']['time_units'] is TimeUnits.DAYS
+        assert result['periodical'] == {'repeats': PeriodicalUnits.HOURLY, 'every': 2}
+        assert updates[3][1] == {'repeats': PeriodicalUnits.HOURLY}
+
+    def test_nested_getters(self):
+        def periodical_getter(value, **params):
+            return {'repeats': PeriodicalUnits.HOURLY, 'every': 2}
+
+        getters = [
+            {'getter': periodical_getter, 'params': {'path': ['periodical']}},
+            # sees the replaced section
+            {'getter': lambda value, **params: value * 5, 'params': {'path': EVERY_PATH}},
+            {'getter': lambda value, **params: value, 'params': {'path': ['start']}},
+        ]
+        expected = make_schedule()
+        expected['periodical'] = {'repeats': PeriodicalUnits.HOURLY, 'every': 10}
+        schedule = make_schedule()
+        result = validated_schedule(schedule, getters=getters)
+        assert result == validated_schedule(expected)
+        assert schedule == make_schedule()
+
+    def test_validated_schedule(self):
+        source = {1: 5, 2: 7}
+        getters = [
+            {'getter': payload_getter, 'params': {'path': DELAY_PATH, 'source': source}},
+            {'getter': payload_getter, 'params': {'path': EVERY_PATH, 'source': source}},
+            # sees the result of the first getter
+            {'getter': lambda value, **params: value * 10, 'params': {'path': DELAY_PATH}},
+            {'getter': payload_getter, 'params': {'path': ['stop', 'on'], 'source': source}},
+        ]
+        schedule = make_schedule(delay=1, every=2)
+        validated = validated_schedule(schedule, getters=getters)
+        assert validated['start']['relative_timeshift']['delay'] == 50
+        assert validated['periodical']['every'] == 7
+        assert 'stop' not in validated
+        assert schedule == make_schedule(delay=1, every=2)
+
+    def test_batch_getter(self):
+        calls = []
+
+        @BatchGetter
+        def delays_getter(values, **params):
+            calls.append(values)
+            return [x * params['factor'] for x in values]
+
+        getters = [{'getter': delays_getter, 'params': {'path': DELAY_PATH, 'factor': 3}}]
+        schedules = [make_schedule(delay=x) for x in range(1, 6)]
+        schedules[2]['start']['relative_timeshift']['delay'] = None
+
+        validated = validated_schedules(schedules, getters=getters)
+        assert calls == [[1, 2, 4, 5]]
+        assert [x['start']['relative_timeshift']['delay'] for x in validated] == [
+            3, 6, None, 12, 15,
+        ]
+        assert validated_schedule(make_schedule(delay=2), getters=getters) == validated[1]
+
+    def test_getter_cache(self, monkeypatch):
+        calls = []
+
+        def counting_getter(value, **params):
+            calls.append(value)
+            return value + 1
+
+        getters = [{'getter': counting_getter, 'params': {'path': DELAY_PATH, 'source': {}}}]
+        cache = GetterCache(60)
+        schedules = [make_schedule(delay=x % 2 + 1) for x in range(10)]
+
+        validated = validated_schedules(schedules, getters=getters, getter_cache=cache)
+        assert calls == [1, 2]
+        assert [x['start']['relative_timeshift']['delay'] for x in validated] == [2, 3] * 5
+
+        validated_schedule(make_schedule(delay=1), getters=getters, getter_cache=cache)
+        assert calls == [1, 2]
+        assert len(cache) == 2
+
+        now = time.monotonic()
+        monkeypatch.setattr(getters_module.time, 'monotonic', lambda: now + 61)
+        validated_schedule(make_schedule(delay=1), getters=getters, getter_cache=cache)
+        assert calls == [1, 2, 1]
+
+    def test_getter_cache_params_frozen_once(self, monkeypatch):
+        params = {'path': DELAY_PATH, 'source': {'nested': [1, 2]}}
+        frozen_params = []
+        frozen = getters_module.frozen
+
+        def counting_frozen(value):
+            if value == params:
+                frozen_params.append(value)
+            return frozen(value)
+
+        monkeypatch.setattr(getters_module, 'frozen', counting_frozen)
+        getters = [{'getter': lambda value, **params: value, 'params': params}]
+        schedules = [make_schedule(delay=x) for x in range(1, 11)]
+        validated_schedules(schedules, getters, getter_cache=GetterCache(60))
+        assert len(frozen_params) == 1
+
+    def test_getter_cache_unhashable(self):
+        calls = []
+
+        def counting_getter(value, **params):
+            calls.append(value)
+            return value
+
+        getters = [{'getter': counting_getter, 'params': {
+            'path': DELAY_PATH,
+            'source': object.__new__(type('Unhashable', (), {'__hash__': None})),
+        }}]
+        cache = GetterCache(60)
+        validated_schedules([make_schedule(), make_schedule()], getters, getter_cache=cache)
+        assert calls == [1, 1]
+        assert len(cache) == 0
+
+    def test_getter_cache_size(self):
+        cache = GetterCache(60, maxsize=2)
+        for num in range(3):
+            cache.set(num, num)
+        assert list(cache.entries) == [1, 2]
+
+        with pytest.raises(ValueError):
+            GetterCache(0)
+        with pytest.raises(ValueError):
+            GetterCache(60, maxsize=0)
+
+
+@pytest.mark.asyncio
+async def test_async_getters():
+    async def delay_getter(value, **params):
+        await asyncio.sleep(0.1)
+        return value + 1
+
+    @BatchGetter
+    async def every_getter(values, **params):
+        await asyncio.sleep(0.1)
+        return [x * 2 for x in values]
+
+    getters = [
+        {'getter': delay_getter, 'params': {'path': DELAY_PATH}},
+        {'getter': every_getter, 'params': {'path': EVERY_PATH}},
+        {'getter': lambda value, **params: value * 10, 'params': {'path': EVERY_PATH}},
+    ]
+    schedules = [make_schedule(delay=x, every=x) for x in range(1, 11)]
+
+    started = time.monotonic()
+    validated = await avalidated_schedules(schedules, getters=getters)
+    # all the calls of the independent paths are awaited concurrently
+    assert time.monotonic() - started < 0.18
+    assert [x['start']['relative_timeshift']['delay'] for x in validated] == list(range(2, 12))
+    assert [x['periodical']['every'] for x in validated] == [x * 20 for x in range(1, 11)]
+    assert validated == validated_schedules(schedules, getters=[
+        {'getter': lambda value, **params: value + 1, 'params': {'path': DELAY_PATH}},
+        {'getter': lambda value, **params: value * 20, 'params': {'path': EVERY_PATH}},
+    ])
+
+
+@pytest.mark.asyncio
+async def test_async_getter_cache():
+    calls = []
+
+    async def counting_getter(value, **params):
+        calls.append(value)
+        return value
+
+    getters = [{'getter': counting_getter, 'params': {'path': DELAY_PATH}}]
+    cache = GetterCache(60)
+    schedules = [make_schedule(delay=x % 3 + 1) for x in range(9)]
+    await avalidated_schedules(schedules, getters, getter_cache=cache)
+    await avalidated_schedules(schedules, getters, getter_cache=cache)
+    assert calls == [1, 2, 3]
+    assert (cache.hits, cache.misses) == (9, 9)
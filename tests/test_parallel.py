@@ -0,0 +1,90 @@
+import array
+import datetime
+
+import pytest
+import pytz
+
+from krolib.parallel import _expand_chunk_epochs, expand_many
+from krolib.parser import compile_schedule, occurrences_between
+from krolib.structs import PeriodicalUnits
+
+
+START = datetime.datetime(2019, 3, 20, 12, 30, tzinfo=pytz.UTC)
+END = START + datetime.timedelta(days=30)
+
+
+def make_schedules(number):
+    repeats = [PeriodicalUnits.HOURLY, PeriodicalUnits.DAILY, PeriodicalUnits.MONTHLY]
+    timezones = ['UTC', 'Europe/Kiev', 'America/New_York']
+    return [
+        {
+            'start': {
+                'on': datetime.datetime(2019, 1, 1) + datetime.timedelta(minutes=num),
+            },
+            'periodical': {
+                'repeats': repeats[num % 3],
+                'every': num % 4 + 1,
+            },
+            'timezone': timezones[num % 3],
+        }
+        for num in range(number)
+    ]
+
+
+def expected_epochs(schedule):
+    return [int(dt.timestamp()) for dt in occurrences_between(schedule, START, END)]
+
+
+@pytest.mark.unit
+class TestExpandEpochs:
+
+    def test_same_occurrences(self):
+        for schedule in make_schedules(12):
+            epochs = _expand_chunk_epochs(schedule, START, END)
+            assert isinstance(epochs, array.array)
+            assert list(epochs) == expected_epochs(schedule)
+
+    def test_unanchored(self):
+        schedule = {
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'every': 1,
+                'weekday': [1, 3],
+                'hour': 10,
+            },
+            'timezone': 'Europe/Kiev',
+        }
+        assert list(_expand_chunk_epochs(schedule, START, END)) == expected_epochs(schedule)
+
+    def test_naive_bounds(self):
+        schedule = make_schedules(2)[1]
+        start = datetime.datetime(2019, 3, 20)
+        end = datetime.datetime(2019, 3, 21)
+        assert list(_expand_chunk_epochs(schedule, start, end)) == [
+            int(dt.timestamp()) for dt in occurrences_between(schedule, start, end)
+        ]
+
+
+@pytest.mark.unit
+class TestExpandMany:
+
+    def test_in_process(self):
+        schedules = make_schedules(10)
+        results = list(expand_many(schedules, START, END, workers=1, chunk_size=3))
+        assert [list(x) for x in results] == [expected_epochs(x) for x in schedules]
+
+    def test_workers(self):
+        schedules = make_schedules(30)
+        # compiled ones are sent validated
+        schedules[5] = compile_schedule(schedules[5])
+        results = list(expand_many(iter(schedules), START, END, workers=2, chunk_size=4))
+        assert [list(x) for x in results] == [expected_epochs(x) for x in make_schedules(30)]
+
+    def test_early_close(self):
+        results = expand_many(make_schedules(30), START, END, workers=2, chunk_size=2)
+        assert list(next(results)) == expected_epochs(make_schedules(1)[0])
+        results.close()
+
+    def test_wrong_params(self):
+        with pytest.raises(ValueError):
+            list(expand_many(make_schedules(1), START, END, chunk_size=0))
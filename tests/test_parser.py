@@ -1,4 +1,5 @@
 import datetime
+import itertools
 
 import pytest
 import pytz
@@ -8,13 +9,23 @@ from dateutil.relativedelta import relativedelta
 from toolz.dicttoolz import dissoc
 
 from krolib.utils import (
+    is_weekday,
+    is_weekend,
     just_now,
     normalize_datetime,
     normalize_isoformat,
 )
 from krolib.parser import (
+    compile_schedule,
+    validated_schedule,
     schedule_parser,
     schedule_delta,
+    schedule_delta_many,
+    previous_before,
+    occurrences_between,
+    count_between,
+    merge_schedules,
+    relative_days_table,
 )
 from krolib.structs import (
     PeriodicalUnits,
@@ -23,6 +34,8 @@ from krolib.structs import (
     RelativeIndexUnits,
     WeekdayUnits,
     MonthUnits,
+    MisfirePolicies,
+    fast_validated_schedule,
 )
 
 
@@ -456,6 +469,46 @@ class TestRelativeSchedule:
             datetime.datetime(2018, 3, 31, 0, 0, tzinfo=pytz.UTC),
         ]
 
+    def test_relative_anchored_in_past(self):
+        now = datetime.datetime(2019, 6, 10, tzinfo=pytz.UTC)
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+                'relative_day': RelativeUnits.FRIDAY,
+                'relative_day_index': RelativeIndexUnits.LAST,
+            },
+        }
+        schedule_gen = schedule_parser(schedule, now_dt=now)
+        results = [next(schedule_gen) for _ in range(2)]
+        assert results == [
+            datetime.datetime(2019, 6, 28, 0, 0, tzinfo=pytz.UTC),
+            datetime.datetime(2019, 7, 26, 0, 0, tzinfo=pytz.UTC),
+        ]
+        assert schedule_delta(schedule, now_dt=now) == (18 * 86400, results[0])
+
+    def test_relative_anchored_every_two_years(self):
+        now = datetime.datetime(2019, 6, 10, tzinfo=pytz.UTC)
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2010, 3, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.YEARLY,
+                'every': 2,
+                'relative_day': RelativeUnits.WEEKDAY,
+                'relative_day_index': RelativeIndexUnits.LAST,
+            },
+        }
+        schedule_gen = schedule_parser(schedule, now_dt=now)
+        assert [next(schedule_gen) for _ in range(2)] == [
+            datetime.datetime(2020, 12, 31, 0, 0, tzinfo=pytz.UTC),
+            datetime.datetime(2022, 12, 30, 0, 0, tzinfo=pytz.UTC),
+        ]
+
     def test_yearly_with_stop_periodical(self):
         now = just_now()
         next_year = now + relativedelta(years=+1)
@@ -706,3 +759,812 @@ class TestScheduleDelta:
         }
         delta, _ = schedule_delta(schedule)
         assert delta == 0
+
+
+@pytest.mark.unit
+class TestSeekToNow:
+
+    def test_old_secondly_periodical(self):
+        now = datetime.datetime(2019, 3, 5, 17, 0, 0, tzinfo=pytz.UTC)
+        schedule = {
+            'start': {
+                'on': now - datetime.timedelta(days=365),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.SECONDLY,
+                'every': 7,
+            },
+        }
+        schedule_gen = schedule_parser(schedule, now_dt=now)
+        results = [next(schedule_gen) for _ in range(2)]
+        assert results == [
+            datetime.datetime(2019, 3, 5, 17, 0, 1, tzinfo=pytz.UTC),
+            datetime.datetime(2019, 3, 5, 17, 0, 8, tzinfo=pytz.UTC),
+        ]
+
+    def test_old_weekly_with_repeats(self):
+        start_on = datetime.datetime(2018, 5, 1, tzinfo=pytz.UTC)
+        schedule = {
+            'start': {
+                'on': start_on,
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'every': 1,
+                'weekday': [WeekdayUnits.MONDAY, WeekdayUnits.TUESDAY],
+            },
+            'stop': {
+                'never': False,
+                'after_num_repeats': 5,
+            }
+        }
+        now = datetime.datetime(2018, 5, 14, 12, tzinfo=pytz.UTC)
+        results = list(schedule_parser(schedule, now_dt=now))
+        assert results == [
+            datetime.datetime(2018, 5, 15, 0, 0, tzinfo=pytz.UTC),
+        ]
+
+        now = datetime.datetime(2018, 5, 15, 12, tzinfo=pytz.UTC)
+        assert list(schedule_parser(schedule, now_dt=now)) == []
+
+    def test_old_daily_with_stop(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2010, 1, 1, 12, 0),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.DAILY,
+                'every': 3,
+                'hour': 8,
+            },
+            'stop': {
+                'never': False,
+                'on': datetime.datetime(2019, 1, 7, 8, 0),
+            },
+            'timezone': 'Europe/Kiev',
+        }
+        now = normalize_isoformat('2019-01-01T00:00:00', tz='Europe/Kiev')
+        results = list(schedule_parser(schedule, now_dt=now))
+        assert results == [
+            normalize_isoformat('2019-01-02T08:00:00', tz='Europe/Kiev'),
+            normalize_isoformat('2019-01-05T08:00:00', tz='Europe/Kiev'),
+        ]
+
+    def test_old_monthly_last_day(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2001, 1, 31, 10, 0),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+            },
+        }
+        now = datetime.datetime(2019, 2, 1, tzinfo=pytz.UTC)
+        schedule_gen = schedule_parser(schedule, now_dt=now)
+        results = [next(schedule_gen) for _ in range(2)]
+        assert results == [
+            datetime.datetime(2019, 3, 31, 10, 0, tzinfo=pytz.UTC),
+            datetime.datetime(2019, 5, 31, 10, 0, tzinfo=pytz.UTC),
+        ]
+
+
+@pytest.mark.unit
+class TestCompiledSchedule:
+
+    def test_iter_from_eq_parser(self):
+        now = datetime.datetime(2018, 5, 1, tzinfo=pytz.UTC)
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'every': 2,
+                'weekday': [WeekdayUnits.MONDAY, WeekdayUnits.FRIDAY],
+                'hour': 10,
+            },
+            'timezone': 'Europe/Kiev',
+        }
+        compiled = compile_schedule(schedule)
+        schedule_gen = schedule_parser(schedule, now_dt=now)
+        compiled_gen = compiled.iter_from(now)
+        assert [next(compiled_gen) for _ in range(5)] == [next(schedule_gen) for _ in range(5)]
+
+    def test_next_after(self):
+        compiled = compile_schedule({
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.HOURLY,
+                'every': 1,
+            },
+            'stop': {
+                'never': False,
+                'on': datetime.datetime(2018, 1, 2),
+            },
+        })
+        now = datetime.datetime(2018, 1, 1, 10, 30, tzinfo=pytz.UTC)
+        assert compiled.next_after(now) == datetime.datetime(2018, 1, 1, 11, tzinfo=pytz.UTC)
+        assert compiled.next_after(now + datetime.timedelta(days=1)) is None
+
+    def test_next_after_single_run(self):
+        now = just_now()
+        compiled = compile_schedule({
+            'start': {
+                'on': now - datetime.timedelta(days=1),
+            },
+        })
+        assert compiled.next_after(now) is None
+        assert compiled.next_after(now - datetime.timedelta(days=2)) == (
+            now - datetime.timedelta(days=1)
+        )
+
+    def test_delta_eq_schedule_delta(self):
+        now = datetime.datetime(2018, 5, 1, 12, 0, 10, tzinfo=pytz.UTC)
+        schedule = {
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': 1,
+                'second': 30,
+            },
+            'timezone': 'Asia/Jakarta',
+        }
+        compiled = compile_schedule(schedule)
+        assert compiled.delta(now) == schedule_delta(schedule, now_dt=now)
+        assert compiled.delta(now)[0] == 20
+
+    def test_slots(self):
+        compiled = compile_schedule({})
+        with pytest.raises(AttributeError):
+            compiled.something = 1
+
+    def test_invalid_schedule(self):
+        with pytest.raises(SchemaInvalid):
+            compile_schedule({'stop': []})
+
+
+@pytest.mark.unit
+class TestDueOccurrences:
+    schedule = {
+        'start': {
+            'on': datetime.datetime(2018, 1, 1),
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.HOURLY,
+            'every': 1,
+        },
+    }
+    since = datetime.datetime(2018, 6, 1, 0, 30, tzinfo=pytz.UTC)
+    now = datetime.datetime(2018, 6, 1, 6, 30, tzinfo=pytz.UTC)
+
+    def test_replay(self):
+        compiled = compile_schedule(self.schedule)
+        due = list(compiled.due_occurrences(self.since, self.now, MisfirePolicies.REPLAY))
+        assert due == [
+            datetime.datetime(2018, 6, 1, hour, tzinfo=pytz.UTC) for hour in range(1, 7)
+        ]
+
+    def test_replay_grace(self):
+        compiled = compile_schedule(self.schedule)
+        due = list(compiled.due_occurrences(
+            self.since, self.now, MisfirePolicies.REPLAY, misfire_grace=8000,
+        ))
+        assert due == [
+            datetime.datetime(2018, 6, 1, 5, tzinfo=pytz.UTC),
+            datetime.datetime(2018, 6, 1, 6, tzinfo=pytz.UTC),
+        ]
+
+    def test_coalesce(self):
+        compiled = compile_schedule(self.schedule)
+        due = list(compiled.due_occurrences(
+            self.since, self.now, MisfirePolicies.COALESCE, misfire_grace=60,
+        ))
+        assert due == [datetime.datetime(2018, 6, 1, 6, tzinfo=pytz.UTC)]
+
+    def test_skip(self):
+        compiled = compile_schedule(self.schedule)
+        assert not list(compiled.due_occurrences(
+            self.since, self.now, MisfirePolicies.SKIP, misfire_grace=60,
+        ))
+        due = list(compiled.due_occurrences(
+            self.since, self.now, MisfirePolicies.SKIP, misfire_grace=1800,
+        ))
+        assert due == [datetime.datetime(2018, 6, 1, 6, tzinfo=pytz.UTC)]
+
+    def test_skip_no_grace(self):
+        compiled = compile_schedule(self.schedule)
+        assert not list(compiled.due_occurrences(self.since, self.now, MisfirePolicies.SKIP))
+        # fired on time
+        since = datetime.datetime(2018, 6, 1, 5, 30, tzinfo=pytz.UTC)
+        now = datetime.datetime(2018, 6, 1, 6, 0, 0, 300000, tzinfo=pytz.UTC)
+        due = list(compiled.due_occurrences(since, now, MisfirePolicies.SKIP))
+        assert due == [datetime.datetime(2018, 6, 1, 6, tzinfo=pytz.UTC)]
+        # the earlier ones were missed
+        assert not list(compiled.due_occurrences(self.since, now, MisfirePolicies.SKIP))
+
+    def test_nothing_due(self):
+        compiled = compile_schedule(self.schedule)
+        now = self.since + datetime.timedelta(minutes=10)
+        for misfire in MisfirePolicies:
+            assert not list(compiled.due_occurrences(self.since, now, misfire))
+
+    def test_calendar_rule(self):
+        compiled = compile_schedule({
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+                'day': 15,
+            },
+            'stop': {
+                'never': False,
+                'after_num_repeats': 4,
+            },
+        })
+        since = datetime.datetime(2018, 1, 1, tzinfo=pytz.UTC)
+        now = datetime.datetime(2019, 1, 1, tzinfo=pytz.UTC)
+        assert list(compiled.due_occurrences(since, now, MisfirePolicies.COALESCE)) == [
+            datetime.datetime(2018, 4, 15, tzinfo=pytz.UTC),
+        ]
+        assert len(list(compiled.due_occurrences(since, now))) == 4
+
+    def test_invalid_policy(self):
+        compiled = compile_schedule(self.schedule)
+        with pytest.raises(ValueError):
+            compiled.due_occurrences(self.since, self.now, 'invalid')
+
+    def test_anchored(self):
+        compiled = compile_schedule({
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': 10,
+            },
+        })
+        anchor = datetime.datetime(2018, 1, 1, 0, 0, 7, tzinfo=pytz.UTC)
+        anchored = compiled.anchored(anchor)
+        assert anchored.anchored() is anchored
+        assert anchored.next_after(anchor + datetime.timedelta(hours=1)) == datetime.datetime(
+            2018, 1, 1, 1, 10, 7, tzinfo=pytz.UTC,
+        )
+
+
+@pytest.mark.unit
+class TestPreviousBefore:
+
+    def test_fixed_length_rule(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'every': 2,
+                'weekday': [WeekdayUnits.MONDAY, WeekdayUnits.FRIDAY],
+                'hour': 10,
+            },
+            'timezone': 'Europe/Kiev',
+        }
+        now = datetime.datetime(2018, 5, 1, tzinfo=pytz.UTC)
+        compiled = compile_schedule(schedule)
+        forward = []
+        for dt in compiled.iter_from(datetime.datetime(2018, 3, 1)):
+            if dt >= now:
+                break
+            forward.append(dt)
+
+        reverse = list(compiled.iter_before(now))
+        assert reverse[:len(forward)] == forward[::-1]
+        assert len(reverse) == len(set(reverse))
+        assert previous_before(schedule, now) == forward[-1]
+
+    def test_strictly_earlier(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.HOURLY,
+                'every': 1,
+            },
+        }
+        now = datetime.datetime(2018, 1, 1, 5, tzinfo=pytz.UTC)
+        assert previous_before(schedule, now) == datetime.datetime(
+            2018, 1, 1, 4, tzinfo=pytz.UTC,
+        )
+        assert previous_before(schedule, datetime.datetime(2018, 1, 1, tzinfo=pytz.UTC)) is None
+
+    def test_calendar_rule(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+                'day': 31,
+            },
+        }
+        compiled = compile_schedule(schedule)
+        now = datetime.datetime(2018, 5, 1, tzinfo=pytz.UTC)
+        assert list(compiled.iter_before(now))[:3] == [
+            datetime.datetime(2018, 3, 31, tzinfo=pytz.UTC),
+            datetime.datetime(2018, 1, 31, tzinfo=pytz.UTC),
+            datetime.datetime(2017, 12, 31, tzinfo=pytz.UTC),
+        ]
+        assert len(list(compiled.iter_before(now))) == 7 * 3 + 2
+
+    def test_stop_on(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.YEARLY,
+                'every': 1,
+            },
+            'stop': {
+                'never': False,
+                'on': datetime.datetime(2016, 6, 1),
+            },
+        }
+        now = datetime.datetime(2018, 5, 1, tzinfo=pytz.UTC)
+        assert previous_before(schedule, now) == datetime.datetime(2016, 1, 1, tzinfo=pytz.UTC)
+
+    def test_count_limited(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+            },
+            'stop': {
+                'never': False,
+                'after_num_repeats': 5,
+            },
+        }
+        now = datetime.datetime(2018, 5, 1, tzinfo=pytz.UTC)
+        assert previous_before(schedule, now) == datetime.datetime(2015, 5, 1, tzinfo=pytz.UTC)
+
+    def test_relative_day(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+                'relative_day': RelativeUnits.FRIDAY,
+                'relative_day_index': RelativeIndexUnits.LAST,
+                'hour': 10,
+            },
+        }
+        compiled = compile_schedule(schedule)
+        now = datetime.datetime(2018, 5, 1, tzinfo=pytz.UTC)
+        assert list(compiled.iter_before(now))[:2] == [
+            datetime.datetime(2018, 4, 27, 10, tzinfo=pytz.UTC),
+            datetime.datetime(2018, 3, 30, 10, tzinfo=pytz.UTC),
+        ]
+
+    def test_single_run(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+        }
+        assert previous_before(schedule, datetime.datetime(2018, 5, 1)) == datetime.datetime(
+            2018, 1, 1, tzinfo=pytz.UTC,
+        )
+        assert previous_before(schedule, datetime.datetime(2017, 5, 1)) is None
+
+
+@pytest.mark.unit
+class TestOccurrencesBetween:
+    start = datetime.datetime(2019, 1, 1, tzinfo=pytz.UTC)
+    end = datetime.datetime(2020, 1, 1, tzinfo=pytz.UTC)
+
+    def test_occurrences_between(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'every': 1,
+                'weekday': [WeekdayUnits.TUESDAY],
+            },
+        }
+        occurrences = list(occurrences_between(schedule, self.start, self.end))
+        assert occurrences[0] == datetime.datetime(2019, 1, 8, tzinfo=pytz.UTC)
+        assert occurrences[-1] == datetime.datetime(2019, 12, 31, tzinfo=pytz.UTC)
+        assert len(occurrences) == count_between(schedule, self.start, self.end) == 52
+
+    def test_count_secondly(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.SECONDLY,
+                'every': 1,
+            },
+        }
+        assert count_between(schedule, self.start, self.end) == 365 * 86400
+
+    def test_count_limited(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2018, 12, 31, 23),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': 30,
+            },
+            'stop': {
+                'never': False,
+                'after_num_repeats': 10,
+            },
+        }
+        assert count_between(schedule, self.start, self.end) == 7
+
+    def test_count_calendar_rule(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(1990, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+                'day': 31,
+            },
+            'stop': {
+                'never': False,
+                'on': datetime.datetime(2050, 1, 1),
+            },
+        }
+        compiled = compile_schedule(schedule)
+        start = datetime.datetime(1995, 3, 31, tzinfo=pytz.UTC)
+        end = datetime.datetime(2060, 1, 1, tzinfo=pytz.UTC)
+        assert compiled.count_between(start, end) == (
+            sum(1 for _ in compiled.occurrences_between(start, end))
+        )
+        assert compiled.count_between(self.start, self.end) == 7
+        assert compiled.count_between(self.end, self.start) == 0
+
+    def test_count_relative_day(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2015, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+                'relative_day': RelativeUnits.FRIDAY,
+                'relative_day_index': RelativeIndexUnits.LAST,
+            },
+        }
+        assert count_between(schedule, self.start, self.end) == 12
+
+
+@pytest.mark.unit
+class TestMergeSchedules:
+    start = datetime.datetime(2019, 1, 1, tzinfo=pytz.UTC)
+    end = datetime.datetime(2019, 2, 1, tzinfo=pytz.UTC)
+    schedules = {
+        'daily': {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.DAILY,
+                'every': 1,
+                'hour': 9,
+            },
+            'timezone': 'Europe/Kiev',
+        },
+        'weekly': {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'every': 1,
+                'weekday': [WeekdayUnits.MONDAY, WeekdayUnits.THURSDAY],
+                'hour': 7,
+            },
+        },
+        'monthly': compile_schedule({
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'relative_day': RelativeUnits.WEEKDAY,
+                'relative_day_index': RelativeIndexUnits.LAST,
+                'hour': 7,
+            },
+        }),
+    }
+
+    def test_merge_schedules(self):
+        expected = sorted((
+            (dt, schedule_id)
+            for schedule_id, schedule in self.schedules.items()
+            for dt in (
+                schedule.occurrences_between(self.start, self.end)
+                if not isinstance(schedule, dict) else
+                occurrences_between(schedule, self.start, self.end)
+            )
+        ), key=lambda x: x[0])
+        merged = list(merge_schedules(self.schedules, self.start, self.end))
+        assert merged == expected
+        assert len(merged) == 31 + 9 + 1
+        # 7:00 UTC on thursday, the last weekday of the month, is also 9:00 in Kiev
+        assert merged[-3:] == [
+            (datetime.datetime(2019, 1, 31, 7, tzinfo=pytz.UTC), 'daily'),
+            (datetime.datetime(2019, 1, 31, 7, tzinfo=pytz.UTC), 'weekly'),
+            (datetime.datetime(2019, 1, 31, 7, tzinfo=pytz.UTC), 'monthly'),
+        ]
+
+    def test_lazy_merge(self):
+        schedules = {
+            num: {
+                'start': {
+                    'on': datetime.datetime(2015, 1, 1, 0, 0, num + 1),
+                },
+                'periodical': {
+                    'repeats': PeriodicalUnits.MINUTELY,
+                    'every': 1,
+                },
+            }
+            for num in range(3)
+        }
+        end = datetime.datetime(2119, 1, 1, tzinfo=pytz.UTC)
+        merged = merge_schedules(schedules, self.start, end)
+        assert [schedule_id for _, schedule_id in itertools.islice(merged, 7)] == [
+            0, 1, 2, 0, 1, 2, 0,
+        ]
+        assert next(merged) == (datetime.datetime(2019, 1, 1, 0, 2, 2, tzinfo=pytz.UTC), 1)
+
+    def test_invalid_schedule(self):
+        with pytest.raises(SchemaInvalid):
+            merge_schedules({'invalid': {'stop': []}}, self.start, self.end)
+
+
+@pytest.mark.unit
+class TestRelativeDaysTable:
+
+    @pytest.mark.parametrize('year', [2018, 2020])
+    def test_eq_day_scan(self, year):
+        day_types = {
+            RelativeUnits.DAY: lambda dt: True,
+            RelativeUnits.WEEKDAY: is_weekday,
+            RelativeUnits.WEEKEND: is_weekend,
+        }
+        for weekday, relative_day in enumerate([
+            RelativeUnits.MONDAY,
+            RelativeUnits.TUESDAY,
+            RelativeUnits.WEDNESDAY,
+            RelativeUnits.THURSDAY,
+            RelativeUnits.FRIDAY,
+            RelativeUnits.SATURDAY,
+            RelativeUnits.SUNDAY,
+        ]):
+            day_types[relative_day] = lambda dt, weekday=weekday: dt.weekday() == weekday
+
+        for month in range(1, 13):
+            table = relative_days_table(year, month)
+            month_days = [
+                datetime.date(year, month, 1) + datetime.timedelta(days=x) for x in range(31)
+            ]
+            month_days = [dt for dt in month_days if dt.month == month]
+            for relative_day, is_day_type in day_types.items():
+                days = [dt.day for dt in month_days if is_day_type(dt)]
+                assert table[relative_day, RelativeIndexUnits.FIRST] == days[0]
+                assert table[relative_day, RelativeIndexUnits.SECOND] == days[1]
+                assert table[relative_day, RelativeIndexUnits.THIRD] == days[2]
+                assert table[relative_day, RelativeIndexUnits.FOURTH] == days[3]
+                assert table[relative_day, RelativeIndexUnits.LAST] == days[-1]
+
+
+@pytest.mark.unit
+class TestTrustedValidation:
+    start_on = datetime.datetime(2019, 1, 1, 10, 30)
+
+    valid_schedules = [
+        {'start': {'on': start_on}},
+        {'start': {'on': None, 'relative_timeshift': {'delay': None, 'time_units': None}}},
+        {
+            'start': {'relative_timeshift': {'delay': 3, 'time_units': TimeUnits.HOURS}},
+            'stop': {'never': True},
+            'timezone': 'Asia/Jakarta',
+        },
+        {
+            'start': {'on': start_on},
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'weekday': [WeekdayUnits.MONDAY, WeekdayUnits.FRIDAY],
+                'hour': 10,
+                'minute': 0,
+                'second': None,
+            },
+            'stop': {'never': False, 'after_num_repeats': 10},
+            'timezone': 'Europe/Kiev',
+        },
+        {
+            'periodical': {
+                'repeats': PeriodicalUnits.YEARLY,
+                'every': 2,
+                'month': MonthUnits.DECEMBER,
+                'day': 31,
+                'relative_day': None,
+                'relative_day_index': RelativeIndexUnits.LAST,
+            },
+            'stop': {'never': None, 'on': start_on},
+        },
+        {
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'relative_day': RelativeUnits.WEEKDAY,
+                'relative_day_index': RelativeIndexUnits.LAST,
+                'hour': 18,
+            },
+            'timezone': None,
+        },
+    ]
+
+    coerced_schedules = [
+        {'start': {'relative_timeshift': {'delay': '3', 'time_units': TimeUnits.DAYS}}},
+        {'stop': {'never': 'yes'}},
+        {'stop': {'never': 0}},
+    ]
+
+    invalid_schedules = [
+        {'start': {'relative_timeshift': {'delay': 'x', 'time_units': TimeUnits.DAYS}}},
+        {'start': {'relative_timeshift': {'delay': 1, 'time_units': 'invalid'}}},
+        {'start': {'relative_timeshift': {'delay': 1}}},
+        {'start': {'on': '2019-01-01'}},
+        {'stop': {'on': start_on}},
+        {'stop': {'never': False, 'after_num_repeats': 0}},
+        {'periodical': {'every': 1}},
+        {'periodical': {'repeats': 'invalid'}},
+        {'periodical': {'repeats': PeriodicalUnits.DAILY, 'hour': 24}},
+        {'periodical': {'repeats': PeriodicalUnits.DAILY, 'hour': 1.0}},
+        {'periodical': {'repeats': PeriodicalUnits.WEEKLY, 'weekday': [7]}},
+        {'periodical': {'repeats': PeriodicalUnits.WEEKLY, 'weekday': (1,)}},
+        {
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'relative_day': RelativeUnits.DAY,
+                'relative_day_index': RelativeIndexUnits.FIRST,
+            },
+        },
+        {
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'day': 1,
+                'relative_day': RelativeUnits.DAY,
+                'relative_day_index': RelativeIndexUnits.FIRST,
+            },
+        },
+        {'timezone': 'Invalid/Zone'},
+        {'unknown': 1},
+        [],
+    ]
+
+    @pytest.mark.parametrize('schedule', valid_schedules + coerced_schedules)
+    def test_same_result(self, schedule):
+        expected = validated_schedule(schedule)
+        result = validated_schedule(schedule, trusted=True)
+        assert result == expected
+        assert [type(x) for x in result.values()] == [type(x) for x in expected.values()]
+
+    @pytest.mark.parametrize('schedule', valid_schedules)
+    def test_fast_validation(self, schedule):
+        result = fast_validated_schedule(schedule)
+        assert result == validated_schedule(schedule)
+        for key, value in schedule.items():
+            if isinstance(value, dict):
+                assert result[key] is not value
+
+    @pytest.mark.parametrize('schedule', coerced_schedules + invalid_schedules)
+    def test_schemas_fallback(self, schedule):
+        assert fast_validated_schedule(schedule) is None
+
+    @pytest.mark.parametrize('schedule', invalid_schedules)
+    def test_same_error(self, schedule):
+        with pytest.raises(SchemaInvalid) as expected:
+            validated_schedule(schedule)
+        with pytest.raises(SchemaInvalid) as error:
+            validated_schedule(schedule, trusted=True)
+        assert str(error.value) == str(expected.value)
+
+    def test_compile_trusted(self):
+        schedule = self.valid_schedules[3]
+        now = datetime.datetime(2019, 1, 2, tzinfo=pytz.UTC)
+        assert (
+            compile_schedule(schedule, trusted=True).delta(now) ==
+            compile_schedule(schedule).delta(now)
+        )
+
+
+@pytest.mark.unit
+class TestScheduleDeltaMany:
+
+    def test_eq_schedule_delta(self):
+        now = datetime.datetime(2019, 3, 5, 17, 0, 30, tzinfo=pytz.UTC)
+        schedules = [
+            {
+                'start': {
+                    'on': datetime.datetime(2019, 1, 1, 10, 15),
+                },
+                'periodical': {
+                    'repeats': PeriodicalUnits.HOURLY,
+                    'every': 1,
+                },
+                'timezone': 'Europe/Kiev',
+            },
+            {
+                'start': {
+                    'on': datetime.datetime(2019, 3, 1),
+                },
+                'periodical': {
+                    'repeats': PeriodicalUnits.DAILY,
+                    'every': 1,
+                },
+                'stop': {
+                    'never': False,
+                    'after_num_repeats': 3,
+                },
+            },
+            {
+                'periodical': {
+                    'repeats': PeriodicalUnits.MONTHLY,
+                    'relative_day': RelativeUnits.FRIDAY,
+                    'relative_day_index': RelativeIndexUnits.LAST,
+                },
+                'timezone': 'Asia/Jakarta',
+            },
+            {
+                'start': {
+                    'relative_timeshift': {
+                        'delay': 1,
+                        'time_units': TimeUnits.HOURS,
+                    }
+                },
+            },
+        ]
+        expected = [schedule_delta(s, now_dt=now) for s in schedules]
+        assert schedule_delta_many(schedules, now_dt=now) == expected
+        assert schedule_delta_many(schedules, now_dt=now, trusted=True) == expected
+        compiled = [compile_schedule(s) for s in schedules]
+        assert schedule_delta_many(compiled, now_dt=now) == expected
+        assert [x for x, _ in expected] == [900 - 30, 0, 1987200, 3600]
+
+    def test_naive_now(self):
+        # localized in the timezone of each schedule
+        now = datetime.datetime(2021, 6, 1, 12, 30)
+        schedules = [
+            {
+                'start': {
+                    'on': datetime.datetime(2021, 1, 1),
+                },
+                'periodical': {
+                    'repeats': PeriodicalUnits.HOURLY,
+                    'every': 1,
+                },
+                'timezone': timezone,
+            }
+            for timezone in ['UTC', 'America/New_York', 'Asia/Jakarta']
+        ]
+        expected = [schedule_delta(s, now_dt=now) for s in schedules]
+        assert schedule_delta_many(schedules, now_dt=now) == expected
+        assert [x for x, _ in expected] == [1800] * 3
+        for schedule, (_, next_dt) in zip(schedules, expected):
+            local_now = pytz.timezone(schedule['timezone']).localize(now)
+            assert next_dt - local_now == datetime.timedelta(minutes=30)
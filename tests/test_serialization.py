@@ -0,0 +1,163 @@
+import datetime
+
+import pytest
+import pytz
+from dateutil import tz
+from voluptuous import Invalid as SchemaInvalid
+
+from krolib.parser import compile_schedule, validated_schedule
+from krolib.serialization import dumps, loads
+from krolib.structs import (
+    TimeUnits,
+    PeriodicalUnits,
+    RelativeUnits,
+    RelativeIndexUnits,
+)
+
+
+KIEV = pytz.timezone('Europe/Kiev')
+NEW_YORK = pytz.timezone('America/New_York')
+
+
+def assert_same(value, expected):
+    assert type(value) is type(expected)
+    if isinstance(expected, dict):
+        assert list(value) == list(expected) or set(value) == set(expected)
+        for key in expected:
+            assert_same(value[key], expected[key])
+    elif isinstance(expected, datetime.datetime):
+        assert value.replace(tzinfo=None) == expected.replace(tzinfo=None)
+        assert value.tzinfo is expected.tzinfo or (
+            type(value.tzinfo) is datetime.timezone and value.tzinfo == expected.tzinfo
+        )
+    else:
+        assert value == expected
+
+
+@pytest.mark.unit
+class TestSerialization:
+
+    @pytest.mark.parametrize('schedule', [
+        {},
+        {
+            'start': {
+                'on': datetime.datetime(2019, 1, 1, 10, 30, 15, 123456),
+                'relative_timeshift': {
+                    'delay': 2,
+                    'time_units': TimeUnits.MONTHS,
+                },
+            },
+            'stop': {
+                'never': False,
+                'after_num_repeats': 100000,
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'every': 2,
+                'weekday': [4, 1, 1],
+                'hour': 23,
+                'minute': 0,
+                'second': 59,
+            },
+            'timezone': 'America/Argentina/ComodRivadavia',
+        },
+        {
+            'stop': {
+                'never': None,
+                'on': None,
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.YEARLY,
+                'every': None,
+                'relative_day': RelativeUnits.WEEKEND,
+                'relative_day_index': RelativeIndexUnits.LAST,
+                'hour': None,
+            },
+            'timezone': None,
+        },
+        {
+            'start': {
+                'relative_timeshift': {
+                    'delay': None,
+                    'time_units': None,
+                },
+            },
+            'periodical': {
+                'repeats': None,
+                'month': 12,
+                'day': 31,
+                'weekday': [],
+            },
+        },
+    ])
+    def test_round_trip(self, schedule):
+        validated = validated_schedule(schedule)
+        assert_same(loads(dumps(schedule)), validated)
+        assert_same(loads(dumps(compile_schedule(schedule))), validated)
+
+    @pytest.mark.parametrize('dt', [
+        datetime.datetime(1, 1, 1),
+        datetime.datetime(9999, 12, 31, 23, 59, 59, 999999, tzinfo=pytz.utc),
+        datetime.datetime(2019, 6, 1, tzinfo=datetime.timezone.utc),
+        datetime.datetime(2019, 6, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=-3))),
+        KIEV.localize(datetime.datetime(2019, 6, 1, 12, 30)),
+        # ambiguous ones keep their offsets
+        NEW_YORK.localize(datetime.datetime(2019, 11, 3, 1, 30), is_dst=True),
+        NEW_YORK.localize(datetime.datetime(2019, 11, 3, 1, 30), is_dst=False),
+        # not localized, with the LMT offset
+        datetime.datetime(2019, 6, 1, tzinfo=KIEV),
+        pytz.timezone('EST').localize(datetime.datetime(2019, 6, 1)),
+    ])
+    def test_datetimes(self, dt):
+        schedule = {
+            'start': {
+                'on': dt,
+            },
+            'stop': {
+                'never': False,
+                'on': dt,
+            },
+        }
+        assert_same(loads(dumps(schedule)), schedule)
+
+    def test_anchored(self):
+        compiled = compile_schedule({
+            'periodical': {
+                'repeats': PeriodicalUnits.HOURLY,
+                'every': 1,
+            },
+            'timezone': 'Europe/Kiev',
+        }).anchored()
+        loaded = compile_schedule(loads(dumps(compiled)), trusted=True)
+        assert loaded.schedule == compiled.schedule
+        assert loaded.delta() == compiled.delta()
+
+    def test_compact(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2019, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.DAILY,
+                'every': 1,
+            },
+            'timezone': 'Europe/Kiev',
+        }
+        assert len(dumps(schedule)) < 48
+
+    def test_wrong_schedule(self):
+        with pytest.raises(SchemaInvalid):
+            dumps({'periodical': {'repeats': 'never'}})
+        with pytest.raises(ValueError):
+            dumps({'start': {'on': datetime.datetime(2019, 1, 1, tzinfo=tz.gettz('UTC'))}})
+        with pytest.raises(ValueError):
+            dumps({'periodical': {'repeats': PeriodicalUnits.DAILY, 'every': 2 ** 40}})
+
+    def test_wrong_data(self):
+        data = dumps({'periodical': {'repeats': PeriodicalUnits.DAILY}, 'timezone': 'UTC'})
+        with pytest.raises(ValueError):
+            loads(b'KS\x02' + data[3:])
+        with pytest.raises(ValueError):
+            loads(data[:-2])
+        with pytest.raises(ValueError):
+            loads(b'')
@@ -0,0 +1,203 @@
+import asyncio
+import collections
+import datetime
+import os.path
+import time
+
+import pytest
+
+from krolib.sharding import HashRing, ShardedDispatcher, SQLiteLeaseStore, stable_hash
+from krolib.structs import PeriodicalUnits
+
+
+SCHEDULE = {
+    'start': {
+        'on': datetime.datetime(2019, 1, 1, tzinfo=datetime.timezone.utc),
+    },
+    'periodical': {
+        'repeats': PeriodicalUnits.HOURLY,
+        'every': 1,
+    },
+}
+
+
+async def some_coroutine():
+    pass
+
+
+def make_dispatcher(lease_store, owner, jobs=40, **params):
+    dispatcher = ShardedDispatcher(lease_store, owner=owner, shards=8, **params)
+    for num in range(jobs):
+        dispatcher.add_job(some_coroutine, SCHEDULE, job_id=num)
+    return dispatcher
+
+
+@pytest.mark.unit
+class TestHashRing:
+
+    def test_stable_hash(self):
+        assert stable_hash('job') == stable_hash('job')
+        assert stable_hash('job') != stable_hash('another')
+        assert 0 <= stable_hash(('job', 1)) < 2 ** 64
+
+    def test_distribution(self):
+        ring = HashRing(range(8))
+        counts = collections.Counter(ring.node(num) for num in range(8000))
+        assert set(counts) == set(range(8))
+        assert min(counts.values()) > 500
+
+    def test_consistency(self):
+        ring = HashRing(range(8))
+        smaller = HashRing(range(7))
+        for num in range(1000):
+            node = ring.node(num)
+            # only the keys of the removed node are moved
+            if node != 7:
+                assert smaller.node(num) == node
+
+    def test_wrong_nodes(self):
+        with pytest.raises(ValueError):
+            HashRing([])
+
+
+@pytest.mark.unit
+class TestSQLiteLeaseStore:
+
+    def test_acquire(self):
+        store = SQLiteLeaseStore()
+        assert store.acquire('a', [0, 1], 10.0, 100.0) == {0: None, 1: None}
+        assert store.acquire('b', [1, 2], 10.0, 101.0) == {2: None}
+        # renewed by the owner
+        assert store.acquire('a', [0, 1], 10.0, 105.0) == {0: 100.0, 1: 100.0}
+        assert store.state(106.0) == ({0: 'a', 1: 'a', 2: 'b'}, {'a', 'b'})
+
+    def test_expiration(self):
+        store = SQLiteLeaseStore()
+        store.acquire('a', [0, 1], 10.0, 100.0)
+        assert store.state(110.0) == ({}, set())
+        assert store.acquire('b', [0], 10.0, 110.0) == {0: 100.0}
+
+    def test_release(self):
+        store = SQLiteLeaseStore()
+        store.acquire('a', [0, 1], 10.0, 100.0)
+        store.release('b', [0, 1], 102.0)
+        assert store.state(103.0)[0] == {0: 'a', 1: 'a'}
+
+        store.release('a', [0], 102.0)
+        assert store.state(103.0)[0] == {1: 'a'}
+        assert store.acquire('b', [0], 10.0, 103.0) == {0: 102.0}
+
+        store.leave('a', 104.0)
+        assert store.state(105.0) == ({0: 'b'}, {'b'})
+
+    def test_shared_database(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'leases.sqlite')
+        SQLiteLeaseStore(path).acquire('a', [0], 10.0, time.time())
+        assert SQLiteLeaseStore(path).acquire('b', [0], 10.0, time.time()) == {}
+
+    def test_wrong_table(self):
+        with pytest.raises(ValueError):
+            SQLiteLeaseStore(table='leases; DROP TABLE leases')
+
+
+@pytest.mark.unit
+class TestShardedDispatcher:
+
+    def test_single_worker(self):
+        dispatcher = make_dispatcher(SQLiteLeaseStore(), 'a')
+        assert not dispatcher.jobs
+
+        dispatcher.balance()
+        assert dispatcher.owned == set(range(8))
+        assert set(dispatcher.jobs) == set(range(40))
+
+        dispatcher.remove_job(0)
+        assert 0 not in dispatcher.jobs
+        with pytest.raises(KeyError):
+            dispatcher.remove_job(0)
+
+    def test_rebalance(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'leases.sqlite')
+        first = make_dispatcher(SQLiteLeaseStore(path), 'a')
+        second = make_dispatcher(SQLiteLeaseStore(path), 'b')
+
+        first.balance()
+        second.balance()
+        assert not second.owned
+
+        # the first one releases the shards over the fair share
+        first.balance()
+        second.balance()
+        assert len(first.owned) == len(second.owned) == 4
+        assert not first.jobs.keys() & second.jobs.keys()
+        assert first.jobs.keys() | second.jobs.keys() == set(range(40))
+
+        first.stop()
+        assert not first.jobs
+        second.balance()
+        assert set(second.jobs) == set(range(40))
+
+    def test_takeover(self):
+        lease_store = SQLiteLeaseStore()
+        dead = make_dispatcher(lease_store, 'a', ttl=0.3)
+        alive = make_dispatcher(lease_store, 'b', ttl=0.3)
+        dead.balance()
+        renewed_at = time.time()
+
+        time.sleep(0.4)
+        alive.balance()
+        assert set(alive.jobs) == set(range(40))
+        # due since the last renewal of the dead one, in whole seconds
+        assert 0 <= renewed_at - alive.jobs[0].last_dt.timestamp() < 1
+
+    def test_job_ids(self):
+        dispatcher = ShardedDispatcher(SQLiteLeaseStore())
+        dispatcher.add_job(some_coroutine, SCHEDULE)
+        assert 'tests.test_sharding:some_coroutine' in dispatcher.specs[
+            dispatcher.ring.node('tests.test_sharding:some_coroutine')
+        ]
+        with pytest.raises(KeyError):
+            dispatcher.add_job(some_coroutine, SCHEDULE)
+
+    def test_wrong_params(self):
+        with pytest.raises(ValueError):
+            ShardedDispatcher(SQLiteLeaseStore(), shards=0)
+        with pytest.raises(ValueError):
+            ShardedDispatcher(SQLiteLeaseStore(), ttl=0)
+
+
+@pytest.mark.asyncio
+async def test_sharded_dispatch(event_loop, tmpdir):
+    path = os.path.join(str(tmpdir), 'leases.sqlite')
+    calls = collections.Counter()
+
+    async def count(num):
+        calls[num] += 1
+
+    start_on = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    schedule = {
+        'start': {
+            'on': start_on + datetime.timedelta(seconds=2),
+        },
+        'periodical': {
+            'repeats': PeriodicalUnits.SECONDLY,
+            'every': 1,
+        },
+    }
+    dispatchers = []
+    for owner in ['a', 'b']:
+        dispatcher = ShardedDispatcher(SQLiteLeaseStore(path), owner=owner, shards=8, ttl=0.3)
+        for num in range(20):
+            dispatcher.add_job(count, schedule, args=(num,), job_id=num)
+        dispatcher.start()
+        dispatchers.append(dispatcher)
+
+    # shards are balanced before the first occurrence
+    await asyncio.sleep(start_on.timestamp() + 3.5 - time.time())
+    assert [len(x.owned) for x in dispatchers] == [4, 4]
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+
+    # every occurrence is run by one of the workers
+    assert set(calls) == set(range(20))
+    assert set(calls.values()) == {2}
@@ -0,0 +1,119 @@
+import datetime
+import os.path
+
+import pytest
+
+from krolib.parser import compile_schedule
+from krolib.stores import StoredJob, SQLiteJobStore, func_reference, resolve_func
+from krolib.structs import PeriodicalUnits, MisfirePolicies
+
+
+SCHEDULE = compile_schedule({
+    'start': {
+        'on': datetime.datetime(2019, 1, 1, tzinfo=datetime.timezone.utc),
+    },
+    'periodical': {
+        'repeats': PeriodicalUnits.HOURLY,
+        'every': 1,
+    },
+}).schedule
+
+
+def stored_job(job_id, next_fire_at):
+    return StoredJob(
+        job_id,
+        'tests.test_stores:stored_job',
+        SCHEDULE,
+        next_fire_at,
+        0.0,
+        MisfirePolicies.REPLAY,
+        None,
+    )
+
+
+@pytest.mark.unit
+class TestFuncReference:
+
+    def test_module_function(self):
+        reference = func_reference(compile_schedule)
+        assert reference == 'krolib.parser:compile_schedule'
+        assert resolve_func(reference) is compile_schedule
+
+    def test_method(self):
+        reference = func_reference(SQLiteJobStore.due)
+        assert reference == 'krolib.stores:SQLiteJobStore.due'
+        assert resolve_func(reference) is SQLiteJobStore.due
+
+    def test_local_function(self):
+        def local():
+            pass
+
+        with pytest.raises(ValueError):
+            func_reference(local)
+        with pytest.raises(ValueError):
+            func_reference(lambda: None)
+
+
+@pytest.mark.unit
+class TestSQLiteJobStore:
+
+    def test_add_get_remove(self):
+        store = SQLiteJobStore()
+        job = stored_job('a', 100.0)
+        store.add(job)
+        assert len(store) == 1
+        assert store.get('a') == job
+        assert store.get('b') is None
+
+        # replaced by id
+        store.add(job._replace(next_fire_at=200.0))
+        assert len(store) == 1
+        assert store.get('a').next_fire_at == 200.0
+
+        store.remove('a')
+        assert len(store) == 0
+        assert store.get('a') is None
+
+    def test_job_ids(self):
+        store = SQLiteJobStore()
+        store.add(stored_job(1, 100.0))
+        store.add(stored_job('1', 100.0))
+        assert len(store) == 2
+        assert store.get(1).job_id == 1
+        assert store.get('1').job_id == '1'
+
+    def test_update_many(self):
+        store = SQLiteJobStore()
+        store.add(stored_job('a', 100.0))
+        store.add(stored_job('b', 100.0))
+        store.update_many([('a', 300.0, 200.0), ('b', None, 250.0)])
+
+        assert store.get('a')[3:5] == (300.0, 200.0)
+        assert store.get('b')[3:5] == (None, 250.0)
+        # finished jobs are never due
+        assert [x.job_id for x in store.due(1000.0)] == ['a']
+
+    def test_due_paging(self):
+        store = SQLiteJobStore()
+        for num, next_fire_at in enumerate([300.0, 100.0, 200.0, 100.0, 500.0]):
+            store.add(stored_job(num, next_fire_at))
+
+        assert [x.job_id for x in store.due(300.0)] == [1, 3, 2, 0]
+
+        rows = store.due(300.0, limit=2)
+        assert [x.job_id for x in rows] == [1, 3]
+        rows = store.due(300.0, after=(rows[-1].next_fire_at, rows[-1].job_id), limit=2)
+        assert [x.job_id for x in rows] == [2, 0]
+        rows = store.due(300.0, after=(rows[-1].next_fire_at, rows[-1].job_id), limit=2)
+        assert rows == []
+
+    def test_persistence(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'jobs.sqlite')
+        SQLiteJobStore(path).add(stored_job('a', 100.0))
+
+        store = SQLiteJobStore(path)
+        assert store.get('a') == stored_job('a', 100.0)
+
+    def test_wrong_table(self):
+        with pytest.raises(ValueError):
+            SQLiteJobStore(table='jobs; DROP TABLE jobs')
@@ -0,0 +1,286 @@
+import datetime
+import threading
+import time
+
+import pytest
+from voluptuous import Invalid as SchemaInvalid
+
+from krolib.threading import Scheduler, ThreadJob
+from krolib.parser import compile_schedule
+from krolib.structs import TimeUnits, PeriodicalUnits, OverlapPolicies, MisfirePolicies
+
+
+SECONDLY_SCHEDULE = {
+    'start': {
+        'relative_timeshift': {
+            'delay': 1,
+            'time_units': TimeUnits.SECONDS,
+        }
+    },
+    'periodical': {
+        'repeats': PeriodicalUnits.SECONDLY,
+        'every': 1,
+    },
+    'stop': {
+        'never': False,
+        'after_num_repeats': 2
+    }
+}
+
+
+@pytest.mark.unit
+class TestScheduler:
+
+    def test_scheduler(self):
+        calls = []
+        with Scheduler(max_workers=2) as scheduler:
+            @scheduler.scheduled(SECONDLY_SCHEDULE)
+            def some_function():
+                calls.append(time.time())
+
+            scheduler.add_job(calls.append, {
+                'start': {
+                    'relative_timeshift': {
+                        'delay': 1,
+                        'time_units': TimeUnits.SECONDS,
+                    }
+                },
+            }, args=('PONG',), job_id='pong')
+            assert set(scheduler.jobs) == {0, 'pong'}
+            time.sleep(2.5)
+
+        assert calls.count('PONG') == 1
+        fired = [x for x in calls if x != 'PONG']
+        assert len(fired) == 2
+        # loose bounds of the wall clock, see test_lateness for the numbers
+        assert all(min(x % 1, 1 - x % 1) < 0.3 for x in fired)
+        assert not scheduler.jobs
+        assert scheduler.lateness.count == 3
+        assert scheduler.lateness.max < 0.3
+        assert scheduler.counters.started == 3
+
+    def test_lateness(self):
+        calls = []
+        scheduler = Scheduler(max_workers=1)
+        job = scheduler.add_job(calls.append, SECONDLY_SCHEDULE, args=('PING',))
+        first = job.next_dt.timestamp()
+        with scheduler._lock:
+            # fired by the injected clock instead of the timer thread
+            scheduler._fire(first + 0.25)
+            scheduler._fire(first + 1)
+        scheduler.shutdown()
+
+        assert calls == ['PING', 'PING']
+        assert scheduler.lateness.count == 2
+        assert scheduler.lateness.max == pytest.approx(0.25)
+        assert scheduler.lateness.last == 0.0
+        assert not scheduler.jobs
+
+    def test_remove_job(self):
+        calls = []
+        with Scheduler() as scheduler:
+            for num in range(100):
+                scheduler.add_job(calls.append, SECONDLY_SCHEDULE, args=(num,))
+            scheduler.remove_job(0)
+            time.sleep(2.5)
+
+        assert sorted(calls) == sorted(list(range(1, 100)) * 2)
+
+    def test_wakeup_on_earlier_job(self):
+        calls = []
+        with Scheduler() as scheduler:
+            scheduler.add_job(calls.append, {
+                'periodical': {
+                    'repeats': PeriodicalUnits.HOURLY,
+                    'every': 1,
+                },
+            }, args=('hourly',))
+            time.sleep(0.1)
+            scheduler.add_job(calls.append, {
+                'start': {
+                    'relative_timeshift': {
+                        'delay': 1,
+                        'time_units': TimeUnits.SECONDS,
+                    }
+                },
+            }, args=('once',))
+            time.sleep(1.5)
+
+        assert calls == ['once']
+
+    def test_graceful_shutdown(self):
+        calls = []
+        started = threading.Event()
+
+        def slow_function():
+            started.set()
+            time.sleep(0.5)
+            calls.append('done')
+
+        scheduler = Scheduler()
+        scheduler.add_job(slow_function, SECONDLY_SCHEDULE)
+        scheduler.start()
+        assert started.wait(2)
+        scheduler.shutdown()
+
+        assert calls == ['done']
+        assert not scheduler.running
+
+    def test_shutdown_cancel_pending(self):
+        calls = []
+        started = threading.Event()
+
+        def slow_function(num):
+            started.set()
+            time.sleep(0.5)
+            calls.append(num)
+
+        scheduler = Scheduler(max_workers=1)
+        for num in range(3):
+            scheduler.add_job(slow_function, SECONDLY_SCHEDULE, args=(num,))
+        scheduler.start()
+        assert started.wait(2)
+        scheduler.shutdown(cancel_pending=True)
+
+        assert len(calls) == 1
+        assert scheduler.counters.cancelled == 2
+
+    def test_overlap_queue(self):
+        calls = []
+
+        def slow_function():
+            calls.append(time.time())
+            time.sleep(1.2)
+
+        with Scheduler() as scheduler:
+            job = scheduler.add_job(
+                slow_function,
+                SECONDLY_SCHEDULE,
+                max_instances=1,
+                overlap=OverlapPolicies.QUEUE,
+            )
+            time.sleep(2.5)
+            assert job.counters.queued == 1
+
+        assert len(calls) == 2
+        assert calls[1] - calls[0] >= 1.2
+
+    @pytest.mark.parametrize('wait, cancel_pending, runs', [
+        (True, False, 2),
+        (True, True, 1),
+        (False, False, 1),
+    ])
+    def test_shutdown_queued(self, wait, cancel_pending, runs):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_function():
+            calls.append(time.time())
+            started.set()
+            assert release.wait(2)
+
+        scheduler = Scheduler()
+        job = scheduler.add_job(
+            slow_function,
+            SECONDLY_SCHEDULE,
+            max_instances=1,
+            overlap=OverlapPolicies.QUEUE,
+            max_queued=1,
+        )
+        first = job.next_dt.timestamp()
+        with scheduler._lock:
+            # both occurrences fired by the injected clock, the second one is queued
+            scheduler._fire(first)
+            scheduler._fire(first + 1)
+        assert started.wait(2)
+        assert job.pending == 1
+
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        scheduler.shutdown(wait=wait, cancel_pending=cancel_pending)
+        if not wait:
+            release.set()
+            scheduler.executor.shutdown()
+        timer.join()
+
+        assert len(calls) == runs
+        assert job.pending == 0
+        assert job.counters.cancelled == 2 - runs
+
+    def test_misfire_last_run(self):
+        calls = []
+        with Scheduler() as scheduler:
+            scheduler.add_job(
+                calls.append,
+                {
+                    'periodical': {
+                        'repeats': PeriodicalUnits.SECONDLY,
+                        'every': 1,
+                    },
+                },
+                args=('PING',),
+                misfire=MisfirePolicies.COALESCE,
+                last_run=(
+                    datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=6)
+                ),
+            )
+            time.sleep(0.1)
+
+        assert calls == ['PING']
+
+    def test_idle_timer(self):
+        scheduler = Scheduler()
+        scheduler.add_job(print, {
+            'periodical': {
+                'repeats': PeriodicalUnits.DAILY,
+                'every': 1,
+            },
+        })
+        scheduler.start()
+        time.sleep(0.2)
+        started = time.perf_counter()
+        scheduler.shutdown()
+        assert time.perf_counter() - started < 0.1
+        assert scheduler.lateness.count == 0
+
+    def test_invalid_overlap(self):
+        with pytest.raises(ValueError):
+            ThreadJob(
+                'job',
+                print,
+                compile_schedule(SECONDLY_SCHEDULE),
+                executor=None,
+                lock=threading.RLock(),
+                overlap=OverlapPolicies.CANCEL,
+            )
+
+    def test_schedule_over(self):
+        start_on = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)
+        scheduler = Scheduler()
+        job = scheduler.add_job(
+            print,
+            {
+                'start': {
+                    'on': start_on,
+                },
+                'periodical': {
+                    'repeats': PeriodicalUnits.HOURLY,
+                    'every': 1,
+                },
+                'stop': {
+                    'never': False,
+                    'on': start_on + datetime.timedelta(hours=2),
+                },
+            },
+            last_run=datetime.datetime.now(datetime.timezone.utc),
+        )
+        assert job.next_dt is None
+        assert not scheduler.jobs
+        scheduler.shutdown()
+
+    def test_wrong_struct(self):
+        scheduler = Scheduler()
+        with pytest.raises(SchemaInvalid):
+            scheduler.add_job(print, {'stop': []})
+        scheduler.shutdown()
@@ -0,0 +1,67 @@
+import datetime
+
+import pytest
+import pytz
+
+from krolib.utils import (
+    just_now,
+    localize_epoch,
+    normalize_datetime,
+    offset_table,
+    resolve_timezone,
+)
+
+
+ZONES = ['UTC', 'Europe/Kiev', 'America/New_York', 'Australia/Lord_Howe', 'Asia/Kolkata']
+
+
+@pytest.mark.unit
+class TestOffsetTable:
+
+    @pytest.mark.parametrize('zone', ZONES)
+    def test_localize_eq_pytz(self, zone):
+        tz = pytz.timezone(zone)
+        table = offset_table(zone)
+        timestamps = list(range(1520000000, 1560000000, 86400 * 3 + 7))
+        for transition in table.transitions[-200:-150]:
+            timestamps.extend([transition - 1, transition, transition + 1])
+
+        for timestamp in timestamps:
+            expected = datetime.datetime.fromtimestamp(timestamp, tz)
+            localized = localize_epoch(timestamp, zone)
+            assert localized == expected
+            assert localized.tzinfo is expected.tzinfo
+            assert table.offset(timestamp) == expected.utcoffset().total_seconds()
+
+    def test_non_pytz_timezone(self):
+        tz = datetime.timezone(datetime.timedelta(hours=3))
+        assert offset_table(tz) is None
+        assert localize_epoch(0, tz) == datetime.datetime(1970, 1, 1, 3, tzinfo=tz)
+
+    def test_resolve_timezone_cached(self):
+        assert resolve_timezone('Europe/Kiev') is resolve_timezone('Europe/Kiev')
+        assert resolve_timezone(pytz.UTC) is pytz.UTC
+
+
+@pytest.mark.unit
+class TestNormalizeDatetime:
+
+    @pytest.mark.parametrize('zone', ZONES)
+    def test_eq_astimezone(self, zone):
+        dt = datetime.datetime(2019, 3, 31, 0, 59, 59, 999999, tzinfo=pytz.UTC)
+        for hours in range(-30, 30):
+            aware_dt = dt + datetime.timedelta(hours=hours)
+            expected = aware_dt.astimezone(pytz.timezone(zone)).replace(microsecond=0)
+            normalized = normalize_datetime(aware_dt, zone)
+            assert normalized == expected
+            assert normalized.tzinfo is expected.tzinfo
+
+    def test_naive(self):
+        dt = normalize_datetime(datetime.datetime(2019, 7, 1, 12, 0, 0, 500), 'Europe/Kiev')
+        assert dt.isoformat() == '2019-07-01T12:00:00+03:00'
+
+    def test_just_now(self):
+        now = just_now('America/New_York')
+        assert now.microsecond == 0
+        assert now.tzinfo.zone == 'America/New_York'
+        assert abs((now - datetime.datetime.now(pytz.UTC)).total_seconds()) < 2
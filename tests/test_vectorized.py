@@ -0,0 +1,121 @@
+import datetime
+import itertools
+
+import pytest
+import pytz
+
+from krolib.parser import compile_schedule
+from krolib.structs import (
+    PeriodicalUnits,
+    RelativeUnits,
+    RelativeIndexUnits,
+    WeekdayUnits,
+)
+
+np = pytest.importorskip('numpy')
+from krolib.vectorized import expand_epochs, expand_schedule  # noqa: E402
+
+
+def expected_epochs(schedule, start, end):
+    occurrences = compile_schedule(schedule).iter_from(start)
+    return [
+        int(dt.timestamp())
+        for dt in itertools.takewhile(lambda dt: dt <= end, occurrences)
+        if dt > start
+    ]
+
+
+@pytest.mark.unit
+class TestExpandSchedule:
+
+    @pytest.mark.parametrize('schedule', [
+        {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1, 10, 30, 15),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MINUTELY,
+                'every': 7,
+            },
+            'stop': {
+                'never': False,
+                'after_num_repeats': 10000,
+            },
+            'timezone': 'Europe/Kiev',
+        },
+        {
+            'start': {
+                'on': datetime.datetime(2018, 1, 3),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.WEEKLY,
+                'every': 2,
+                'weekday': [WeekdayUnits.MONDAY, WeekdayUnits.SATURDAY],
+                'hour': 8,
+            },
+            'stop': {
+                'never': False,
+                'on': datetime.datetime(2018, 2, 20),
+            },
+        },
+        {
+            'start': {
+                'on': datetime.datetime(2018, 1, 31, 9),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'every': 1,
+            },
+        },
+        {
+            'periodical': {
+                'repeats': PeriodicalUnits.MONTHLY,
+                'relative_day': RelativeUnits.WEEKEND,
+                'relative_day_index': RelativeIndexUnits.FIRST,
+            },
+        },
+        {
+            'periodical': {
+                'repeats': PeriodicalUnits.HOURLY,
+                'every': 3,
+                'minute': 20,
+            },
+            'timezone': 'Asia/Jakarta',
+        },
+    ])
+    def test_eq_parser(self, schedule):
+        start = datetime.datetime(2018, 1, 10, 12, tzinfo=pytz.UTC)
+        end = datetime.datetime(2018, 3, 1, tzinfo=pytz.UTC)
+        result = expand_epochs(schedule, start, end)
+        assert result.dtype == np.int64
+        assert result.tolist() == expected_epochs(schedule, start, end)
+
+    def test_datetime64(self):
+        schedule = {
+            'start': {
+                'on': datetime.datetime(2018, 1, 1),
+            },
+            'periodical': {
+                'repeats': PeriodicalUnits.DAILY,
+                'every': 1,
+                'hour': 12,
+            },
+            'timezone': 'Europe/Kiev',
+        }
+        start = datetime.datetime(2018, 1, 10, tzinfo=pytz.UTC)
+        end = datetime.datetime(2018, 1, 12, tzinfo=pytz.UTC)
+        result = expand_schedule(schedule, start, end)
+        assert result.tolist() == [
+            datetime.datetime(2018, 1, 10, 10),
+            datetime.datetime(2018, 1, 11, 10),
+        ]
+
+    def test_empty_window(self):
+        schedule = {
+            'periodical': {
+                'repeats': PeriodicalUnits.SECONDLY,
+                'every': 1,
+            },
+        }
+        now = datetime.datetime(2018, 1, 10, tzinfo=pytz.UTC)
+        assert len(expand_epochs(schedule, now, now)) == 0